@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import select, literal, union_all
+from sqlalchemy.orm import Session
+
+from app.loading import order_options, archived_order_options
+from app.lookups import get_by_ids
+from app.models.models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+orders_table = Order.__table__
+order_items_table = OrderItem.__table__
+orders_archive_table = ArchivedOrder.__table__
+order_items_archive_table = ArchivedOrderItem.__table__
+
+def archive_orders(db: Session, before: datetime, batch_size: int = 500) -> int:
+    """Move orders created before the cutoff into the archive tables.
+
+    Each batch is copied and deleted in its own short transaction so the
+    write lock is only held for one batch at a time.
+    """
+    archived = 0
+    while True:
+        order_ids = db.execute(
+            select(orders_table.c.id)
+            .where(orders_table.c.created_at < before)
+            .order_by(orders_table.c.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not order_ids:
+            break
+
+        # Copy the batch into cold storage
+        db.execute(orders_archive_table.insert().from_select(
+            ["id", "customer_id", "created_at", "total", "archived_at"],
+            select(
+                orders_table.c.id,
+                orders_table.c.customer_id,
+                orders_table.c.created_at,
+                orders_table.c.total,
+                literal(datetime.utcnow())
+            ).where(orders_table.c.id.in_(order_ids))
+        ))
+        db.execute(order_items_archive_table.insert().from_select(
+            ["id", "shop_item_id", "quantity", "order_id"],
+            select(
+                order_items_table.c.id,
+                order_items_table.c.shop_item_id,
+                order_items_table.c.quantity,
+                order_items_table.c.order_id
+            ).where(order_items_table.c.order_id.in_(order_ids))
+        ))
+
+        # Remove it from the hot tables
+        db.execute(order_items_table.delete().where(order_items_table.c.order_id.in_(order_ids)))
+        db.execute(orders_table.delete().where(orders_table.c.id.in_(order_ids)))
+        db.commit()
+        archived += len(order_ids)
+
+    return archived
+
+def customer_orders(db: Session, customer_id: int, skip: int = 0, limit: int = 100) -> List:
+    """One page of a customer's orders in ID order, hot and archived alike"""
+    page = db.execute(
+        union_all(
+            select(orders_table.c.id, literal(False).label("archived")).where(orders_table.c.customer_id == customer_id),
+            select(orders_archive_table.c.id, literal(True).label("archived")).where(orders_archive_table.c.customer_id == customer_id)
+        )
+        .order_by("id")
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    loaded = {
+        False: get_by_ids(db, Order, [id for id, archived in page if not archived], order_options()),
+        True: get_by_ids(db, ArchivedOrder, [id for id, archived in page if archived], archived_order_options())
+    }
+    # An order archived between the two reads is left out of this page
+    return [loaded[archived][id] for id, archived in page if id in loaded[archived]]
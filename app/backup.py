@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import statistics
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import config
+
+# Session.info key holding when the session's commit started
+_COMMIT_STARTED = "shop.commit_started"
+
+class CommitLatencyRecorder:
+    """Record how long this process's commits take while a copy runs.
+
+    Listens to session commits instead of probing the database, so it adds
+    no locking of its own. Commits made by other processes are not seen.
+    """
+
+    def __init__(self):
+        self.samples = []
+
+    def _before_commit(self, session: Session):
+        session.info[_COMMIT_STARTED] = time.perf_counter()
+
+    def _after_commit(self, session: Session):
+        started = session.info.pop(_COMMIT_STARTED, None)
+        if started is not None:
+            self.samples.append((time.perf_counter() - started) * 1000)
+
+    def __enter__(self):
+        event.listen(Session, "before_commit", self._before_commit)
+        event.listen(Session, "after_commit", self._after_commit)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Session, "before_commit", self._before_commit)
+        event.remove(Session, "after_commit", self._after_commit)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"samples": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(self.samples)
+        return {
+            "samples": len(ordered),
+            "p50_ms": round(statistics.median(ordered), 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max_ms": round(ordered[-1], 3)
+        }
+
+class _TooManyRestarts(Exception):
+    pass
+
+def default_destination(kind: str) -> str:
+    """Timestamped file name in the backup directory"""
+    timestamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(config.BACKUP_DIR, f"shop-{kind}-{timestamp}.db")
+
+def _prepare(destination: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    # Copy to a partial file first so a finished backup is never half written
+    partial = destination + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    return partial
+
+def backup_database(
+    source: str,
+    destination: Optional[str] = None,
+    pages: Optional[int] = None,
+    sleep: Optional[float] = None
+) -> dict:
+    """Copy a live database with the SQLite online backup API.
+
+    A WAL database is copied in one step: the copy reads a single snapshot
+    and commits go on meanwhile. With a rollback journal the copy advances
+    pages at a time and sleeps between steps, holding the source's read lock
+    only while a step runs, so writers keep going. A write from another
+    connection restarts it from the first page, and after
+    BACKUP_MAX_RESTARTS restarts it is redone in a single step, which cannot
+    be restarted but makes commits wait until it is done.
+    """
+    destination = destination or default_destination("backup")
+    pages = pages or config.BACKUP_PAGES_PER_STEP
+    sleep = config.BACKUP_SLEEP_SECONDS if sleep is None else sleep
+    partial = _prepare(destination)
+    progress = {"steps": 0, "restarts": 0, "remaining": None, "total": 0}
+
+    def on_step(status, remaining, total):
+        if progress["remaining"] is not None and remaining > progress["remaining"]:
+            progress["restarts"] += 1
+            if progress["restarts"] > config.BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        progress.update(steps=progress["steps"] + 1, remaining=remaining, total=total)
+        if remaining:
+            time.sleep(sleep)
+
+    source_connection = sqlite3.connect(source, timeout=30)
+    target_connection = sqlite3.connect(partial)
+    journal_mode = source_connection.execute("PRAGMA journal_mode").fetchone()[0]
+    single_step = False
+    started = time.perf_counter()
+    try:
+        with CommitLatencyRecorder() as recorder:
+            try:
+                source_connection.backup(target_connection, pages=-1 if journal_mode == "wal" else pages, progress=on_step)
+            except _TooManyRestarts:
+                single_step = True
+                source_connection.backup(target_connection, pages=-1)
+    finally:
+        target_connection.close()
+        source_connection.close()
+    duration_ms = (time.perf_counter() - started) * 1000
+    os.replace(partial, destination)
+
+    return {
+        "mode": "backup",
+        "journal_mode": journal_mode,
+        "path": destination,
+        "bytes": os.path.getsize(destination),
+        "pages": progress["total"],
+        "steps": progress["steps"],
+        "restarts": progress["restarts"],
+        "single_step": single_step,
+        "duration_ms": round(duration_ms, 3),
+        "commit_latency": recorder.summary()
+    }
+
+def vacuum_snapshot(source: str, destination: Optional[str] = None) -> dict:
+    """Write a compacted copy of a live database with VACUUM INTO.
+
+    The snapshot is defragmented and smaller than a page-for-page backup.
+    It is taken in one read transaction, which commits to a WAL database do
+    not wait for; with a rollback journal they wait until it finishes.
+    """
+    destination = destination or default_destination("snapshot")
+    partial = _prepare(destination)
+
+    source_connection = sqlite3.connect(source, timeout=30)
+    journal_mode = source_connection.execute("PRAGMA journal_mode").fetchone()[0]
+    started = time.perf_counter()
+    try:
+        with CommitLatencyRecorder() as recorder:
+            source_connection.execute("VACUUM INTO ?", (partial,))
+    finally:
+        source_connection.close()
+    duration_ms = (time.perf_counter() - started) * 1000
+    os.replace(partial, destination)
+
+    return {
+        "mode": "vacuum",
+        "journal_mode": journal_mode,
+        "path": destination,
+        "bytes": os.path.getsize(destination),
+        "source_bytes": os.path.getsize(source),
+        "duration_ms": round(duration_ms, 3),
+        "commit_latency": recorder.summary()
+    }
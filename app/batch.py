@@ -0,0 +1,137 @@
+"""Batch requests: several API calls in one round trip, see POST /batch.
+
+Each sub-request runs in turn through the whole application in-process, so
+it is routed, validated, guarded and serialized exactly as if it had been
+sent on its own, but without the HTTP round trip. All sub-requests use one
+session, passed to get_db through the ASGI scope (SHARED_SESSION), instead
+of opening one each.
+
+By default every sub-request commits or fails on its own, like separate
+calls; a failed one has its uncommitted work rolled back and the batch goes
+on. With "atomic": true the batch runs in a single write transaction:
+the endpoints' commits only release savepoints, the batch stops at the
+first sub-request answering 400 or above, and everything is rolled back.
+Reads inside an atomic batch see its uncommitted writes, so the read caches
+(facet counts, the catalog engine and the catalog snapshot) compute their
+answer for the batch alone instead of serving or filling the shared copy.
+Work that must only happen once writes are durable, such as publishing order
+events, goes through after_commit: an atomic batch holds it until the batch
+commits and drops it on rollback, when the IDs it names may be reused.
+"""
+import asyncio
+import json
+import logging
+
+from fastapi import Request
+from sqlalchemy.orm import Session
+
+from app.database import ATOMIC_BATCH, SHARED_SESSION, in_atomic_batch
+from app.query_guard import QueryBudgetExceeded
+from app.schemas import BatchOperation, BatchResult
+
+logger = logging.getLogger(__name__)
+
+# Routes a batch cannot call: itself, and the order event stream, which never ends
+EXCLUDED_PATHS = {"/batch", "/batch/", "/orders/events"}
+
+# Session.info key of the callbacks an atomic batch runs once it commits
+_AFTER_COMMIT = "shop.after_commit"
+
+# Headers of the batch request that do not apply to its sub-requests
+_BATCH_HEADERS = {b"content-length", b"content-type", b"accept", b"accept-encoding", b"idempotency-key"}
+
+def _sub_scope(request: Request, operation: BatchOperation, body: bytes, db: Session) -> dict:
+    path, _, query_string = operation.path.partition("?")
+    headers = {name: value for name, value in request.scope["headers"] if name not in _BATCH_HEADERS}
+    # Sub-responses are embedded in the batch response, so they come back as plain JSON
+    headers[b"accept"] = b"application/json"
+    headers[b"accept-encoding"] = b"identity"
+    if operation.body is not None:
+        headers[b"content-type"] = b"application/json"
+    headers[b"content-length"] = str(len(body)).encode()
+    for name, value in operation.headers.items():
+        headers[name.lower().encode("latin-1")] = value.encode("latin-1")
+
+    scope = {
+        key: request.scope[key]
+        for key in ("type", "asgi", "http_version", "scheme", "server", "client", "root_path")
+        if key in request.scope
+    }
+    scope.update({
+        "method": operation.method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "headers": list(headers.items()),
+        SHARED_SESSION: db,
+    })
+    return scope
+
+async def dispatch(request: Request, operation: BatchOperation, db: Session) -> BatchResult:
+    body = b"" if operation.body is None else json.dumps(operation.body).encode()
+    scope = _sub_scope(request, operation, body, db)
+    response = {"status": None, "content_type": b"", "chunks": []}
+    finished = asyncio.Event()
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Nothing else arrives; report the client gone only once the response is complete
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["content_type"] = dict(message.get("headers", [])).get(b"content-type", b"")
+        elif message["type"] == "http.response.body":
+            response["chunks"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await request.app(scope, receive, send)
+    except QueryBudgetExceeded:
+        raise
+    except Exception:
+        # The application has already answered 500 if it got that far
+        logger.exception("Batch sub-request %s %s failed", operation.method, operation.path)
+        if response["status"] is None:
+            response["status"] = 500
+
+    content = b"".join(response["chunks"])
+    if content and response["content_type"].startswith(b"application/json"):
+        return BatchResult(status=response["status"], body=json.loads(content))
+    return BatchResult(status=response["status"], body=content.decode(errors="replace") or None)
+
+def after_commit(db: Session, callback, *args):
+    """Run callback(*args) once db's writes are committed: now, or when the atomic batch db belongs to commits"""
+    if in_atomic_batch(db):
+        db.info.setdefault(_AFTER_COMMIT, []).append((callback, args))
+    else:
+        callback(*args)
+
+def begin_atomic(db: Session):
+    connection = db.get_bind().connect()
+    # Take the write lock up front so the batch cannot fail halfway on a busy database
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+    # Endpoints commit as usual; inside the batch's transaction that only releases a savepoint
+    session = Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint", info={ATOMIC_BATCH: True})
+    return connection, session
+
+def end_atomic(connection, session: Session, commit: bool):
+    callbacks = session.info.pop(_AFTER_COMMIT, [])
+    try:
+        session.close()
+        if commit:
+            connection.commit()
+        else:
+            connection.rollback()
+    finally:
+        connection.close()
+    if commit:
+        for callback, args in callbacks:
+            callback(*args)
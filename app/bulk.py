@@ -0,0 +1,146 @@
+from typing import List
+from sqlalchemy import select, func, literal, exists, true, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.changes import record_changes, record_changes_from_select, CATEGORY, CUSTOMER, ITEM, CREATE, UPDATE
+from app.models.models import Customer, ShopItem, ShopItemCategory, shop_item_category_association
+from app.schemas import CustomerCreate, CustomerBulkResult, ShopItemBulkUpdate, ShopItemBulkResult
+
+customers_table = Customer.__table__
+items_table = ShopItem.__table__
+categories_table = ShopItemCategory.__table__
+association = shop_item_category_association
+
+def _target_items(update: ShopItemBulkUpdate):
+    # IDs of the items selected by the request filters, leaving out deleted items
+    target = select(items_table.c.id).where(items_table.c.deleted_at.is_(None))
+    if update.item_ids is not None:
+        target = target.where(items_table.c.id.in_(update.item_ids))
+    if update.category_ids is not None:
+        target = target.where(exists().where(
+            association.c.shop_item_id == items_table.c.id,
+            association.c.category_id.in_(update.category_ids),
+            association.c.category_id.in_(select(categories_table.c.id).where(categories_table.c.deleted_at.is_(None)))
+        ))
+    return target
+
+def bulk_update_items(db: Session, update: ShopItemBulkUpdate) -> ShopItemBulkResult:
+    """Apply a price change and category reassignment to many items at once.
+
+    Every step is a single set-based statement over the selected items, all
+    in one transaction. The caller validates the request and commits.
+    """
+    target = _target_items(update)
+    matched = db.execute(select(func.count()).select_from(target.subquery())).scalar()
+
+    prices_updated = 0
+    if update.price_mode == "absolute":
+        prices_updated = db.execute(
+            items_table.update().where(items_table.c.id.in_(target)).values(price=update.price_value)
+        ).rowcount
+    elif update.price_mode == "percentage":
+        factor = 1 + update.price_value / 100
+        prices_updated = db.execute(
+            items_table.update().where(items_table.c.id.in_(target)).values(price=items_table.c.price * factor)
+        ).rowcount
+
+    # Log the item changes before category removal can shrink the selection
+    record_changes_from_select(db, ITEM, target, UPDATE)
+
+    categories_added = 0
+    for category_id in update.add_category_ids:
+        # SQLite needs a WHERE clause to parse INSERT ... SELECT ... ON CONFLICT
+        statement = insert(association).from_select(
+            ["shop_item_id", "category_id"],
+            select(target.subquery().c.id, literal(category_id)).where(true())
+        )
+        categories_added += db.execute(statement.on_conflict_do_nothing()).rowcount
+
+    categories_removed = 0
+    if update.remove_category_ids:
+        categories_removed = db.execute(
+            association.delete().where(
+                association.c.category_id.in_(update.remove_category_ids),
+                association.c.shop_item_id.in_(target)
+            )
+        ).rowcount
+
+    # Recount the touched categories with one grouped subquery each
+    changed_category_ids = set(update.add_category_ids) | set(update.remove_category_ids)
+    if changed_category_ids:
+        item_count = (
+            select(func.count())
+            .select_from(association.join(items_table, items_table.c.id == association.c.shop_item_id))
+            .where(association.c.category_id == categories_table.c.id, items_table.c.deleted_at.is_(None))
+            .scalar_subquery()
+        )
+        db.execute(
+            categories_table.update()
+            .where(categories_table.c.id.in_(changed_category_ids))
+            .values(item_count=item_count)
+        )
+        record_changes(db, CATEGORY, sorted(changed_category_ids), UPDATE)
+
+    return ShopItemBulkResult(
+        matched=matched,
+        prices_updated=prices_updated,
+        categories_added=categories_added,
+        categories_removed=categories_removed
+    )
+
+def bulk_upsert_customers(db: Session, customers: List[CustomerCreate], batch_size: int = 500) -> CustomerBulkResult:
+    """Insert or update customers keyed on email, one batch per transaction.
+
+    Each batch costs one SELECT to classify the rows and one
+    INSERT ... ON CONFLICT(email) DO UPDATE for the new and changed ones;
+    unchanged rows are not written at all.
+    """
+    # Later records for the same email win
+    by_email = {customer.email: customer for customer in customers}
+    records = list(by_email.values())
+
+    created = updated = unchanged = 0
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        existing = {
+            email: (name, surname)
+            for email, name, surname in db.execute(
+                select(customers_table.c.email, customers_table.c.name, customers_table.c.surname)
+                .where(customers_table.c.email.in_([customer.email for customer in batch]))
+            )
+        }
+
+        rows = []
+        for customer in batch:
+            current = existing.get(customer.email)
+            if current == (customer.name, customer.surname):
+                unchanged += 1
+            else:
+                rows.append(customer.model_dump())
+        if not rows:
+            continue
+
+        statement = insert(customers_table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=["email"],
+            set_={"name": statement.excluded.name, "surname": statement.excluded.surname},
+            # Skip rows that another writer already brought up to date
+            where=or_(
+                customers_table.c.name != statement.excluded.name,
+                customers_table.c.surname != statement.excluded.surname
+            )
+        ).returning(customers_table.c.id, customers_table.c.email)
+        written = db.execute(statement).all()
+
+        created_ids = [customer_id for customer_id, email in written if email not in existing]
+        updated_ids = [customer_id for customer_id, email in written if email in existing]
+        record_changes(db, CUSTOMER, created_ids, CREATE)
+        record_changes(db, CUSTOMER, updated_ids, UPDATE)
+        db.commit()
+
+        created += len(created_ids)
+        updated += len(updated_ids)
+        unchanged += len(rows) - len(written)
+
+    return CustomerBulkResult(created=created, updated=updated, unchanged=unchanged)
@@ -0,0 +1,270 @@
+"""In-process columnar catalog for filtering and sorting items.
+
+With SHOP_CATALOG_ENGINE=1 and NumPy installed, each worker keeps a snapshot
+of every item's ID, price and categories in NumPy arrays and answers item
+list filters (price range, categories) and sorts with vectorized operations;
+only the requested page of items is then loaded from the database. Without
+it, the same filters and sorts run as SQL.
+
+The snapshot catches up from the change log before answering: the items and
+categories routers record every item they change in the same transaction
+as the write, so a read reloads just those items. This also picks up writes
+made by other workers. Large batches of changes rebuild the snapshot.
+"""
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import config
+from app.changes import ITEM
+from app.database import in_atomic_batch
+from app.loading import item_options
+from app.lookups import get_by_ids
+from app.models.models import ChangeLogEntry, ShopItem, ShopItemCategory, shop_item_category_association
+
+# NumPy takes longer to import than the rest of the app, so it is only imported once the engine is used
+np = None
+_numpy_checked = False
+
+# Changed items reloaded one by one; beyond this the snapshot is rebuilt instead
+INCREMENTAL_REFRESH_LIMIT = 1000
+
+_engines: Dict[str, "CatalogEngine"] = {}
+_engines_lock = threading.Lock()
+
+def _import_numpy():
+    """The numpy module, imported on first call; None when it is not installed"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        np = numpy
+        _numpy_checked = True
+    return np
+
+def enabled() -> bool:
+    """Whether item lists are served from the columnar snapshot"""
+    return config.CATALOG_ENGINE and _import_numpy() is not None
+
+def invalidate():
+    """Drop every snapshot, e.g. after the database was replaced"""
+    with _engines_lock:
+        _engines.clear()
+
+def _live_links():
+    # Links to categories that are not deleted; deleting a category logs a change for each of its items
+    return (
+        select(shop_item_category_association.c.shop_item_id, shop_item_category_association.c.category_id)
+        .join(ShopItemCategory, ShopItemCategory.id == shop_item_category_association.c.category_id)
+        .where(ShopItemCategory.deleted_at.is_(None))
+    )
+
+def _read_items(db: Session, category_bits: Dict[int, int], item_ids: Optional[List[int]] = None):
+    # Columns for the given items, or all items; new categories get the next free bit
+    items = select(ShopItem.id, ShopItem.price).where(ShopItem.deleted_at.is_(None)).order_by(ShopItem.id)
+    links = _live_links()
+    if item_ids is not None:
+        items = items.where(ShopItem.id.in_(item_ids))
+        links = links.where(shop_item_category_association.c.shop_item_id.in_(item_ids))
+    rows = db.execute(items).all()
+    link_rows = db.execute(links).all()
+
+    ids = np.fromiter((id for id, price in rows), dtype=np.int64, count=len(rows))
+    prices = np.fromiter((np.nan if price is None else price for id, price in rows), dtype=np.float64, count=len(rows))
+    for item_id, category_id in link_rows:
+        category_bits.setdefault(category_id, len(category_bits))
+    categories = np.zeros((len(ids), len(category_bits) // 64 + 1), dtype=np.uint64)
+    if link_rows:
+        link_items = np.fromiter((item_id for item_id, category_id in link_rows), dtype=np.int64, count=len(link_rows))
+        bits = np.fromiter((category_bits[category_id] for item_id, category_id in link_rows), dtype=np.uint64, count=len(link_rows))
+        # Links of an item deleted between the two reads have no row to go to
+        positions = np.minimum(np.searchsorted(ids, link_items), max(len(ids) - 1, 0))
+        found = (ids[positions] == link_items) if len(ids) else np.zeros(len(link_items), dtype=bool)
+        np.bitwise_or.at(
+            categories,
+            (positions[found], (bits[found] // 64).astype(np.intp)),
+            np.left_shift(np.uint64(1), bits[found] % np.uint64(64))
+        )
+    return ids, prices, categories
+
+def _widen(categories, words: int):
+    # Bitsets grow a word at a time as categories are added
+    if categories.shape[1] == words:
+        return categories
+    return np.pad(categories, ((0, 0), (0, words - categories.shape[1])))
+
+class CatalogSnapshot:
+    """Item columns as of one change log position, sorted by item ID"""
+
+    def __init__(self, ids, prices, categories, category_bits: Dict[int, int], seq: int):
+        _import_numpy()
+        self.ids = ids
+        # NaN where an item has no price
+        self.prices = prices
+        # One row of 64-bit words per item, bit category_bits[category_id] set per category
+        self.categories = categories
+        self.category_bits = category_bits
+        self.seq = seq
+        self._orders = {}
+
+    def _order(self, sort: str):
+        # Positions of all items in sort order, computed once per snapshot
+        order = self._orders.get(sort)
+        if order is None:
+            # Same order as SQLite: no price sorts first ascending and last descending, ties by ID
+            key = np.where(np.isnan(self.prices), -np.inf, self.prices)
+            order = self._orders[sort] = np.argsort(key if sort == "price" else -key, kind="stable")
+        return order
+
+    @classmethod
+    def build(cls, db: Session, seq: int) -> "CatalogSnapshot":
+        category_bits = {}
+        ids, prices, categories = _read_items(db, category_bits)
+        return cls(ids, prices, categories, category_bits, seq)
+
+    def apply(self, db: Session, item_ids: List[int], seq: int) -> "CatalogSnapshot":
+        """A new snapshot with the given items reloaded (or dropped if deleted)"""
+        category_bits = dict(self.category_bits)
+        ids, prices, categories = _read_items(db, category_bits, item_ids)
+        keep = ~np.isin(self.ids, item_ids)
+        words = max(self.categories.shape[1], categories.shape[1])
+
+        merged_ids = np.concatenate([self.ids[keep], ids])
+        order = np.argsort(merged_ids, kind="stable")
+        return CatalogSnapshot(
+            merged_ids[order],
+            np.concatenate([self.prices[keep], prices])[order],
+            np.concatenate([_widen(self.categories[keep], words), _widen(categories, words)])[order],
+            category_bits,
+            seq
+        )
+
+    def search(
+        self,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        category_ids: Optional[Sequence[int]] = None,
+        sort: str = "id",
+        skip: int = 0,
+        limit: int = 100
+    ) -> Tuple[List[int], int]:
+        """IDs of one page of matching items in sort order, and the number of matches"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        # Comparisons with NaN are false, so items without a price never match a price range
+        if min_price is not None:
+            mask &= self.prices >= min_price
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if category_ids:
+            # Items in any of the categories
+            wanted = np.zeros(self.categories.shape[1], dtype=np.uint64)
+            for category_id in category_ids:
+                bit = self.category_bits.get(category_id)
+                if bit is not None:
+                    wanted[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+            mask &= (self.categories & wanted).any(axis=1)
+
+        if sort in ("price", "-price"):
+            # Filtering the presorted positions keeps their order without sorting the matches
+            order = self._order(sort)
+            matched = order[mask[order]]
+        else:
+            matched = np.flatnonzero(mask)
+            if sort == "-id":
+                matched = matched[::-1]
+        page = matched[max(skip, 0):max(skip, 0) + max(limit, 0)]
+        return self.ids[page].tolist(), len(matched)
+
+class CatalogEngine:
+    """The current snapshot for one database, refreshed from its change log"""
+
+    def __init__(self):
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def current(self, db: Session) -> CatalogSnapshot:
+        seq = db.execute(select(func.coalesce(func.max(ChangeLogEntry.seq), 0))).scalar_one()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.seq == seq:
+            return snapshot
+
+        with self._lock:
+            snapshot = self.snapshot
+            if snapshot is None or seq < snapshot.seq:
+                # First use, or the change log was reset
+                snapshot = CatalogSnapshot.build(db, seq)
+            elif seq > snapshot.seq:
+                changed = db.execute(
+                    select(ChangeLogEntry.entity_id)
+                    .where(
+                        ChangeLogEntry.seq > snapshot.seq,
+                        ChangeLogEntry.seq <= seq,
+                        ChangeLogEntry.entity_type == ITEM
+                    )
+                    .distinct()
+                ).scalars().all()
+                if len(changed) > INCREMENTAL_REFRESH_LIMIT:
+                    snapshot = CatalogSnapshot.build(db, seq)
+                elif changed:
+                    snapshot = snapshot.apply(db, changed, seq)
+                else:
+                    # No item changed, the columns (and their sort orders) are current as they are
+                    snapshot.seq = seq
+            self.snapshot = snapshot
+        return snapshot
+
+def catalog_engine(db: Session) -> CatalogEngine:
+    key = str(db.get_bind().engine.url)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = CatalogEngine()
+    return engine
+
+def _search_sql(db: Session, min_price, max_price, category_ids, sort: str, skip: int, limit: int, count: bool):
+    query = db.query(ShopItem).filter(ShopItem.deleted_at.is_(None))
+    if min_price is not None:
+        query = query.filter(ShopItem.price >= min_price)
+    if max_price is not None:
+        query = query.filter(ShopItem.price <= max_price)
+    if category_ids:
+        links = _live_links().subquery()
+        query = query.filter(ShopItem.id.in_(
+            select(links.c.shop_item_id).where(links.c.category_id.in_(category_ids))
+        ))
+    total = query.count() if count else None
+    order_by = {
+        "id": (ShopItem.id,),
+        "-id": (ShopItem.id.desc(),),
+        "price": (ShopItem.price, ShopItem.id),
+        "-price": (ShopItem.price.desc(), ShopItem.id),
+    }[sort]
+    items = query.options(*item_options()).order_by(*order_by).offset(skip).limit(limit).all()
+    return items, total
+
+def search_items(
+    db: Session,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    category_ids: Optional[Sequence[int]] = None,
+    sort: str = "id",
+    skip: int = 0,
+    limit: int = 100,
+    count: bool = False
+) -> Tuple[List[ShopItem], Optional[int]]:
+    """One page of items matching the filters, and the number of matches when count is set.
+
+    Served from the columnar snapshot when enabled, otherwise with SQL.
+    """
+    if not enabled() or in_atomic_batch(db):
+        # The snapshot is shared by every request, so uncommitted rows must not reach it
+        return _search_sql(db, min_price, max_price, category_ids, sort, skip, limit, count)
+
+    ids, total = catalog_engine(db).current(db).search(min_price, max_price, category_ids, sort, skip, limit)
+    items = get_by_ids(db, ShopItem, ids, item_options())
+    # An item deleted since the snapshot caught up is left out of the page
+    return [items[id] for id in ids if id in items], total if count else None
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""Prebuilt full-catalog document for GET /catalog/snapshot.
+
+The whole catalog (categories, and items with their category IDs) is
+serialized once into a JSON blob, along with gzip and, when the brotli
+package is installed, brotli variants. Requests get one of the prebuilt
+byte strings, so serving it costs one change log lookup and no
+serialization or compression.
+
+The snapshot is versioned by the change log: the items, categories and bulk
+routers record every item and category they change, and a snapshot's
+version is the change log position it was built at. A request that finds
+item or category changes newer than the snapshot starts a rebuild in a
+background thread, and every request is served the last finished version
+until it is done; only the first request, with nothing built yet, waits for
+a build. Stock is left out, and
+since orders record an item change for the stock they take, changed items
+are compared with the snapshot first and only a difference in the fields it
+holds triggers a rebuild.
+"""
+import gzip
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.changes import CATEGORY, ITEM
+from app.database import in_atomic_batch
+from app.models.models import ChangeLogEntry, ShopItem, ShopItemCategory, shop_item_category_association
+from app.negotiation import header_quality
+
+logger = logging.getLogger(__name__)
+
+GZIP_LEVEL = 9
+# Quality 11 is about a fifth smaller again but takes 50 times longer, too slow to rebuild after every catalog write
+BROTLI_QUALITY = 9
+
+# Changed items compared with the snapshot one by one; beyond this it is rebuilt instead
+INCREMENTAL_CHECK_LIMIT = 1000
+
+# Imported with the first snapshot rather than at startup; None when the package is not installed
+brotli = None
+_brotli_checked = False
+
+_snapshots: Dict[str, "SnapshotHolder"] = {}
+_snapshots_lock = threading.Lock()
+
+def invalidate():
+    """Drop every built snapshot, e.g. after the database was replaced"""
+    wait_for_rebuilds()
+    with _snapshots_lock:
+        _snapshots.clear()
+
+def wait_for_rebuilds(timeout: Optional[float] = None):
+    """Block until the background rebuilds running now have finished"""
+    with _snapshots_lock:
+        holders = list(_snapshots.values())
+    for holder in holders:
+        holder.wait(timeout)
+
+def _import_brotli():
+    """The brotli module, imported on first call; None when it is not installed"""
+    global brotli, _brotli_checked
+    if not _brotli_checked:
+        try:
+            import brotli as module
+        except ImportError:
+            module = None
+        brotli = module
+        _brotli_checked = True
+    return brotli
+
+class Snapshot:
+    """One version of the catalog document and its encodings"""
+
+    def __init__(self, version: int, body: bytes, compress: bool = True):
+        self.version = version
+        self.built_at = datetime.utcnow()
+        # Content-Encoding -> bytes; identity is the plain JSON
+        self.encodings = {"identity": body}
+        if not compress:
+            return
+        self.encodings["gzip"] = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        if _import_brotli() is not None:
+            self.encodings["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+
+    def etag(self, encoding: str) -> str:
+        # Each encoding is a different byte string, so it gets its own strong validator
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"catalog-{self.version}{suffix}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """Whether an If-None-Match header names this version in any encoding"""
+        etags = {self.etag(encoding) for encoding in self.encodings}
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") in etags:
+                return True
+        return False
+
+    def encoding_for(self, accept_encoding: str) -> str:
+        """The best encoding the client accepts; br, then gzip, on equal q values"""
+        best, best_quality = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            if encoding not in self.encodings:
+                continue
+            quality = header_quality(accept_encoding.lower(), (encoding, "*"))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+def _latest_seq(db: Session) -> int:
+    return db.execute(select(func.coalesce(func.max(ChangeLogEntry.seq), 0))).scalar_one()
+
+def _changed_entities(db: Session, after: int, seq: int):
+    """Distinct (entity_type, entity_id) of the item and category changes in (after, seq]"""
+    return db.execute(
+        select(ChangeLogEntry.entity_type, ChangeLogEntry.entity_id)
+        .where(
+            ChangeLogEntry.seq > after,
+            ChangeLogEntry.seq <= seq,
+            ChangeLogEntry.entity_type.in_((ITEM, CATEGORY))
+        )
+        .distinct()
+    ).all()
+
+def _item_rows(db: Session, item_ids: Optional[Iterable[int]] = None) -> Dict[int, Tuple]:
+    """The snapshot's fields of every live item, or of item_ids: id -> (title, description, price, category IDs)"""
+    links = (
+        select(shop_item_category_association.c.shop_item_id, shop_item_category_association.c.category_id)
+        .join(ShopItemCategory, ShopItemCategory.id == shop_item_category_association.c.category_id)
+        .where(ShopItemCategory.deleted_at.is_(None))
+        .order_by(shop_item_category_association.c.shop_item_id, shop_item_category_association.c.category_id)
+    )
+    items = select(ShopItem.id, ShopItem.title, ShopItem.description, ShopItem.price).where(ShopItem.deleted_at.is_(None)).order_by(ShopItem.id)
+    if item_ids is not None:
+        item_ids = list(item_ids)
+        links = links.where(shop_item_category_association.c.shop_item_id.in_(item_ids))
+        items = items.where(ShopItem.id.in_(item_ids))
+    category_ids = {}
+    for item_id, category_id in db.execute(links):
+        category_ids.setdefault(item_id, []).append(category_id)
+    return {
+        id: (title, description, price, tuple(category_ids.get(id, ())))
+        for id, title, description, price in db.execute(items)
+    }
+
+def build_document(db: Session, version: int, items: Optional[Dict[int, Tuple]] = None) -> bytes:
+    """Serialize every category and item (_item_rows, loaded if not given) into the snapshot's JSON"""
+    categories = [
+        {"id": id, "title": title, "description": description, "item_count": item_count}
+        for id, title, description, item_count in db.execute(
+            select(ShopItemCategory.id, ShopItemCategory.title, ShopItemCategory.description, ShopItemCategory.item_count)
+            .where(ShopItemCategory.deleted_at.is_(None))
+            .order_by(ShopItemCategory.id)
+        )
+    ]
+    if items is None:
+        items = _item_rows(db)
+    document = {
+        "version": version,
+        "categories": categories,
+        "items": [
+            {"id": id, "title": title, "description": description, "price": price, "category_ids": list(category_ids)}
+            for id, (title, description, price, category_ids) in items.items()
+        ]
+    }
+    return json.dumps(document, separators=(",", ":"), ensure_ascii=False).encode()
+
+class SnapshotHolder:
+    """The current snapshot for one database, rebuilt when the catalog changes"""
+
+    def __init__(self):
+        self.snapshot: Optional[Snapshot] = None
+        # The item fields the snapshot was built from, to tell stock-only changes apart
+        self.items: Dict[int, Tuple] = {}
+        # Change log position the snapshot was last checked against
+        self.checked_seq = -1
+        # Held while checking or building
+        self._lock = threading.Lock()
+        # The background rebuild, and whether a request asked for another pass since it last checked
+        self._thread: Optional[threading.Thread] = None
+        self._requested = False
+        self._thread_lock = threading.Lock()
+
+    def _changed(self, db: Session, seq: int) -> bool:
+        changes = _changed_entities(db, self.checked_seq, seq)
+        if not changes:
+            return False
+        if len(changes) > INCREMENTAL_CHECK_LIMIT or any(entity_type == CATEGORY for entity_type, entity_id in changes):
+            return True
+        item_ids = {entity_id for entity_type, entity_id in changes}
+        current = _item_rows(db, item_ids)
+        return any(current.get(item_id) != self.items.get(item_id) for item_id in item_ids)
+
+    def _rebuild(self, db: Session, seq: int) -> Snapshot:
+        items = _item_rows(db)
+        self.snapshot = Snapshot(seq, build_document(db, seq, items))
+        self.items = items
+        return self.snapshot
+
+    def _refresh(self, db: Session):
+        # Callers hold self._lock
+        seq = _latest_seq(db)
+        if seq == self.checked_seq and self.snapshot is not None:
+            return
+        if self.snapshot is None or seq < self.checked_seq or self._changed(db, seq):
+            # First use, a reset change log, or items or categories changed
+            self._rebuild(db, seq)
+        self.checked_seq = seq
+
+    def _run(self, engine):
+        while True:
+            with self._thread_lock:
+                if not self._requested:
+                    self._thread = None
+                    return
+                self._requested = False
+            try:
+                with self._lock, Session(bind=engine) as db:
+                    self._refresh(db)
+            except Exception:
+                # Keep serving the last finished version; the next request after a change tries again
+                logger.exception("Rebuilding the catalog snapshot failed")
+
+    def _request_refresh(self, db: Session):
+        with self._thread_lock:
+            self._requested = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(db.get_bind().engine,), name="catalog-snapshot", daemon=True)
+                self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def current(self, db: Session) -> Snapshot:
+        snapshot = self.snapshot
+        if snapshot is None:
+            # Nothing to serve yet, so the first request builds it
+            with self._lock:
+                if self.snapshot is None:
+                    self._refresh(db)
+                return self.snapshot
+        if self.checked_seq != _latest_seq(db):
+            self._request_refresh(db)
+        return snapshot
+
+def current_snapshot(db: Session) -> Snapshot:
+    if in_atomic_batch(db):
+        # Built for this request alone, so uncommitted rows never reach the shared snapshot
+        seq = _latest_seq(db)
+        return Snapshot(seq, build_document(db, seq), compress=False)
+    key = str(db.get_bind().engine.url)
+    with _snapshots_lock:
+        holder = _snapshots.get(key)
+        if holder is None:
+            holder = _snapshots[key] = SnapshotHolder()
+    return holder.current(db)
@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import select, literal
+from sqlalchemy.orm import Session, aliased
+
+from app.models.models import ChangeLogEntry
+
+CUSTOMER = "customer"
+CATEGORY = "category"
+ITEM = "item"
+ORDER = "order"
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+def record_change(db: Session, entity_type: str, entity_id: int, operation: str):
+    """Add a change log entry to the current transaction.
+
+    Callers record the change before committing, so the entry and the write
+    become visible together.
+    """
+    db.add(ChangeLogEntry(entity_type=entity_type, entity_id=entity_id, operation=operation))
+
+def record_changes(db: Session, entity_type: str, entity_ids: Iterable[int], operation: str):
+    """Add one change log entry per entity ID to the current transaction, with a single executemany"""
+    rows = [
+        {"entity_type": entity_type, "entity_id": entity_id, "operation": operation}
+        for entity_id in entity_ids
+    ]
+    if rows:
+        db.execute(ChangeLogEntry.__table__.insert(), rows)
+
+def record_changes_from_select(db: Session, entity_type: str, entity_ids, operation: str):
+    """Add one change log entry per ID returned by a select, without loading the IDs"""
+    change_log = ChangeLogEntry.__table__
+    id_column = entity_ids.subquery().c[0]
+    db.execute(change_log.insert().from_select(
+        ["entity_type", "entity_id", "operation", "changed_at"],
+        select(literal(entity_type), id_column, literal(operation), literal(datetime.utcnow()))
+    ))
+
+def read_changes(db: Session, since: int, limit: int):
+    """Return the changes with a sequence number greater than since, oldest first"""
+    return (
+        db.query(ChangeLogEntry)
+        .filter(ChangeLogEntry.seq > since)
+        .order_by(ChangeLogEntry.seq)
+        .limit(limit)
+        .all()
+    )
+
+def compact_changes(db: Session, before_seq: Optional[int] = None) -> int:
+    """Drop entries superseded by a newer entry for the same entity.
+
+    A consumer replaying the compacted log still ends up with the latest
+    state of every entity; it just skips the intermediate changes.
+    """
+    newer = aliased(ChangeLogEntry)
+    superseded = (
+        select(newer.seq)
+        .where(
+            newer.entity_type == ChangeLogEntry.entity_type,
+            newer.entity_id == ChangeLogEntry.entity_id,
+            newer.seq > ChangeLogEntry.seq
+        )
+        .exists()
+    )
+    query = db.query(ChangeLogEntry).filter(superseded)
+    if before_seq is not None:
+        query = query.filter(ChangeLogEntry.seq < before_seq)
+    removed = query.delete(synchronize_session=False)
+    db.commit()
+    return removed
@@ -0,0 +1,66 @@
+import os
+
+# Token expected in the X-Admin-Token header by admin endpoints; admin endpoints are disabled when unset
+ADMIN_TOKEN = os.environ.get("SHOP_ADMIN_TOKEN")
+
+# Fraction of requests profiled without the X-Profile header, 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.environ.get("SHOP_PROFILE_SAMPLE_RATE", "0"))
+
+# Number of recent request profiles kept in memory
+PROFILE_BUFFER_SIZE = int(os.environ.get("SHOP_PROFILE_BUFFER_SIZE", "50"))
+
+# Statements a request may issue before the query guard complains, unless its route has its own budget
+QUERY_BUDGET = int(os.environ.get("SHOP_QUERY_BUDGET", "30"))
+
+# Lazy loads of one relationship within a request that count as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("SHOP_N_PLUS_ONE_THRESHOLD", "5"))
+
+# Raise instead of logging a warning when a request breaks its budget (test mode)
+QUERY_GUARD_RAISE = os.environ.get("SHOP_QUERY_GUARD_RAISE", "0") == "1"
+
+# Directory backups and snapshots are written to when no path is given
+BACKUP_DIR = os.environ.get("SHOP_BACKUP_DIR", "backups")
+
+# Pages copied per online backup step, and the pause between steps that lets writers in
+BACKUP_PAGES_PER_STEP = int(os.environ.get("SHOP_BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_SLEEP_SECONDS = float(os.environ.get("SHOP_BACKUP_SLEEP_SECONDS", "0.005"))
+
+# Restarts caused by concurrent writes before a backup finishes in a single step instead
+BACKUP_MAX_RESTARTS = int(os.environ.get("SHOP_BACKUP_MAX_RESTARTS", "3"))
+
+# Serve item list filters and sorts from an in-memory columnar snapshot (needs NumPy), see app/catalog_engine.py
+CATALOG_ENGINE = os.environ.get("SHOP_CATALOG_ENGINE", "0") == "1"
+
+# Worker threads started by `python -m app.manage worker`, see app/jobs.py
+JOB_WORKERS = int(os.environ.get("SHOP_JOB_WORKERS", "4"))
+
+# Jobs of one kind handed to its handler at once, unless the kind sets its own batch size
+JOB_BATCH_SIZE = int(os.environ.get("SHOP_JOB_BATCH_SIZE", "100"))
+
+# Attempts before a job is marked failed; retry n waits JOB_RETRY_SECONDS * 2^(n-1)
+JOB_MAX_ATTEMPTS = int(os.environ.get("SHOP_JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_SECONDS = float(os.environ.get("SHOP_JOB_RETRY_SECONDS", "2"))
+
+# Idle workers check for due jobs this often
+JOB_POLL_SECONDS = float(os.environ.get("SHOP_JOB_POLL_SECONDS", "0.5"))
+
+# A running job not finished within this long is assumed lost with its worker and claimed again
+JOB_LEASE_SECONDS = float(os.environ.get("SHOP_JOB_LEASE_SECONDS", "300"))
+
+# Finished jobs are kept this long for metrics, then deleted
+JOB_RETENTION_SECONDS = float(os.environ.get("SHOP_JOB_RETENTION_SECONDS", "86400"))
+
+# Seconds clients and CDNs may reuse GET /catalog/snapshot without revalidating; versioned URLs are immutable
+CATALOG_SNAPSHOT_MAX_AGE = int(os.environ.get("SHOP_CATALOG_SNAPSHOT_MAX_AGE", "60"))
+
+# Seconds a write's Idempotency-Key is remembered and its response replayed, see app/idempotency.py
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("SHOP_IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# Seconds a duplicate request waits for the first request with its key before giving up with 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("SHOP_IDEMPOTENCY_WAIT_SECONDS", "30"))
+
+# Most sub-requests one POST /batch may carry, see app/batch.py
+BATCH_MAX_REQUESTS = int(os.environ.get("SHOP_BATCH_MAX_REQUESTS", "20"))
+
+# Rows the purge of a deleted item or category removes per transaction, see app/purge.py
+PURGE_CHUNK_SIZE = int(os.environ.get("SHOP_PURGE_CHUNK_SIZE", "1000"))
\ No newline at end of file
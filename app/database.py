@@ -1,6 +1,7 @@
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./shop.db"
 
@@ -11,9 +12,27 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+# ASGI scope key holding the session shared by the sub-requests of a batch, see app/batch.py
+SHARED_SESSION = "shop.session"
+
+# Session.info key marking the session of an atomic batch, whose writes stay uncommitted until the batch ends
+ATOMIC_BATCH = "shop.atomic_batch"
+
+def in_atomic_batch(db: Session) -> bool:
+    """Whether reads on db may see writes that are not committed yet, and so must not fill process-wide caches"""
+    return db.info.get(ATOMIC_BATCH, False)
+
+def request_session(request: Request, session_factory):
+    """Yield the batch's shared session for a sub-request, otherwise a new session closed afterwards"""
+    shared = request.scope.get(SHARED_SESSION)
+    if shared is not None:
+        yield shared
+        return
+    db = session_factory()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_db(request: Request):
+    yield from request_session(request, SessionLocal)
\ No newline at end of file
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Optional
+
+ORDER_CREATED = "order.created"
+ORDER_UPDATED = "order.updated"
+ORDER_DELETED = "order.deleted"
+
+class OrderEvent:
+    def __init__(self, id: int, type: str, order_id: int, customer_id: int, data: dict, previous_customer_id: Optional[int] = None):
+        self.id = id
+        self.type = type
+        self.order_id = order_id
+        self.customer_id = customer_id
+        # Set on updates; differs from customer_id when the order moved to another customer
+        self.previous_customer_id = previous_customer_id
+        self.data = data
+
+    def concerns(self, customer_id: int) -> bool:
+        """Whether the event is about one of customer_id's orders, before or after the change"""
+        return customer_id in (self.customer_id, self.previous_customer_id)
+
+    def encode(self) -> str:
+        """Render the event in Server-Sent Events wire format"""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+class Subscription:
+    """One subscriber's bounded queue of pending events.
+
+    A consumer that falls a full queue behind is cut off rather than letting
+    its backlog grow; it reconnects with Last-Event-ID and replays the
+    missed events from the broker history.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, customer_id: Optional[int], queue_size: int):
+        self.loop = loop
+        self.customer_id = customer_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def matches(self, event: OrderEvent) -> bool:
+        return self.customer_id is None or event.concerns(self.customer_id)
+
+    def deliver(self, event: OrderEvent):
+        # Runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self) -> Optional[OrderEvent]:
+        """Wait for the next event, or return None once the subscriber overflowed"""
+        if self.overflowed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+class OrderEventBroker:
+    """In-process pub/sub for order lifecycle events.
+
+    publish() is safe to call from the worker threads that run the sync
+    route handlers; events are handed to each subscriber's event loop with
+    call_soon_threadsafe, so publishing never blocks on slow consumers.
+    """
+
+    def __init__(self, history_size: int = 1000, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+
+    def publish(self, type: str, order_id: int, customer_id: int, data: Optional[dict] = None, previous_customer_id: Optional[int] = None) -> OrderEvent:
+        payload = {"order_id": order_id, "customer_id": customer_id}
+        if previous_customer_id is not None:
+            payload["previous_customer_id"] = previous_customer_id
+        payload.update(data or {})
+        with self._lock:
+            event = OrderEvent(self._next_id, type, order_id, customer_id, payload, previous_customer_id)
+            self._next_id += 1
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop is gone
+                self.unsubscribe(subscription)
+        return event
+
+    def history_since(self, last_event_id: int, customer_id: Optional[int] = None):
+        """Return retained events newer than last_event_id"""
+        with self._lock:
+            return [
+                event for event in self._history
+                if event.id > last_event_id and (customer_id is None or event.concerns(customer_id))
+            ]
+
+    def subscribe(self, customer_id: Optional[int] = None, last_event_id: Optional[int] = None) -> Subscription:
+        """Register a subscriber on the running loop, replaying missed events first"""
+        subscription = Subscription(asyncio.get_running_loop(), customer_id, self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event.id > last_event_id and subscription.matches(event):
+                        subscription.deliver(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+order_events = OrderEventBroker()
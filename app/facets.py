@@ -0,0 +1,69 @@
+import threading
+import time
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+from app.database import in_atomic_batch
+from app.models.models import ShopItem, ShopItemCategory
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKET_BOUNDS = [25, 50, 100, 250, 500, 1000]
+
+# Counts served from the cache may lag writes from other processes by at most this long
+FACET_TTL_SECONDS = 30.0
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _cached(db: Session, name: str, compute):
+    if in_atomic_batch(db):
+        return compute(db)
+    key = (str(db.get_bind().engine.url), name)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    value = compute(db)
+    with _cache_lock:
+        _cache[key] = (now + FACET_TTL_SECONDS, value)
+    return value
+
+def invalidate():
+    """Drop cached counts after a local write to items or categories"""
+    with _cache_lock:
+        _cache.clear()
+
+def _count_items(db: Session) -> int:
+    return db.query(func.count(ShopItem.id)).filter(ShopItem.deleted_at.is_(None)).scalar()
+
+def _count_price_buckets(db: Session):
+    # One grouped pass over shop_items for all buckets
+    bucket = case(
+        *[(ShopItem.price < bound, index) for index, bound in enumerate(PRICE_BUCKET_BOUNDS)],
+        else_=len(PRICE_BUCKET_BOUNDS)
+    )
+    counts = dict(db.query(bucket, func.count(ShopItem.id)).filter(ShopItem.deleted_at.is_(None)).group_by(bucket).all())
+
+    lower_bounds = [0] + PRICE_BUCKET_BOUNDS
+    upper_bounds = PRICE_BUCKET_BOUNDS + [None]
+    return [
+        {"min": lower, "max": upper, "count": counts.get(index, 0)}
+        for index, (lower, upper) in enumerate(zip(lower_bounds, upper_bounds))
+    ]
+
+def item_total(db: Session) -> int:
+    """Total number of shop items"""
+    return _cached(db, "total", _count_items)
+
+def item_facets(db: Session) -> dict:
+    """Per-category and per-price-bucket item counts"""
+    # Category counts come straight from the counters maintained by the items router
+    categories = [
+        {"category_id": category_id, "title": title, "count": count}
+        for category_id, title, count in db.query(
+            ShopItemCategory.id, ShopItemCategory.title, ShopItemCategory.item_count
+        ).filter(ShopItemCategory.deleted_at.is_(None)).order_by(ShopItemCategory.id)
+    ]
+    return {"categories": categories, "price": _cached(db, "price", _count_price_buckets)}
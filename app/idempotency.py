@@ -0,0 +1,187 @@
+"""Idempotency-Key support for write endpoints.
+
+A client that retries a write after a timeout sends the same
+`Idempotency-Key` header with each attempt. The first attempt claims the
+key by inserting it into the idempotency_keys table in the transaction of
+the write, and stores its response there before committing, so the key
+exists exactly when the write does. A retry finds the key and gets the
+stored response back without doing the work again; a retry with the same
+key and a different body is rejected with 422.
+
+Duplicates that arrive while the first request is still running wait for
+it: within a process on a per-key lock, across processes on SQLite's write
+lock, which the claim takes. If the first request fails, its claim rolls
+back with it and the next attempt runs normally.
+
+Keys are remembered for IDEMPOTENCY_TTL_SECONDS. Each stored response also
+deletes a few expired keys, so the table stays small without a cleanup job.
+
+Endpoints opt in with the `idempotency` dependency:
+
+    def create_thing(thing: ThingCreate, db: Session = Depends(get_db), idempotent: Idempotency = Depends(idempotency)):
+        replay = idempotent.begin(db, thing)
+        if replay is not None:
+            return replay
+        ...  # the write
+        idempotent.save_instance(db, Thing, db_thing)
+        db.commit()
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from fastapi import Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import config
+from app.models.models import IdempotencyKey
+from app.negotiation import NegotiatedResponse
+
+# Longest Idempotency-Key header accepted
+MAX_KEY_LENGTH = 255
+
+# Expired keys deleted with each stored response
+PURGE_BATCH = 100
+
+# Set on responses replayed from the key store
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Per-key locks held for the whole request, with the number of requests using each
+_locks: Dict[bytes, list] = {}
+_locks_lock = threading.Lock()
+
+def _digest(*parts: bytes) -> bytes:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.digest()[:16]
+
+def _encode(content) -> bytes:
+    return json.dumps(jsonable_encoder(content), separators=(",", ":"), sort_keys=True, ensure_ascii=False).encode()
+
+def _acquire(key: bytes) -> bool:
+    with _locks_lock:
+        entry = _locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    if entry[0].acquire(timeout=config.IDEMPOTENCY_WAIT_SECONDS):
+        return True
+    _forget(key)
+    return False
+
+def _release(key: bytes):
+    _locks[key][0].release()
+    _forget(key)
+
+def _forget(key: bytes):
+    with _locks_lock:
+        entry = _locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _locks[key]
+
+def _purge_expired(db: Session, now: datetime, keep: bytes):
+    expired = (
+        db.query(IdempotencyKey.key)
+        .filter(IdempotencyKey.expires_at <= now, IdempotencyKey.key != keep)
+        .order_by(IdempotencyKey.expires_at)
+        .limit(PURGE_BATCH)
+    )
+    db.query(IdempotencyKey).filter(IdempotencyKey.key.in_(expired.scalar_subquery())).delete(synchronize_session=False)
+
+class Idempotency:
+    """The Idempotency-Key of one write request; every method is a no-op without one"""
+
+    def __init__(self, key: Optional[bytes] = None):
+        # Digest of the method, path and header value
+        self.key = key
+        self._claim: Optional[IdempotencyKey] = None
+
+    def _replay(self, db: Session, request_hash: bytes, now: datetime) -> Optional[NegotiatedResponse]:
+        stored = (
+            db.query(IdempotencyKey)
+            .filter(IdempotencyKey.key == self.key, IdempotencyKey.expires_at > now)
+            .first()
+        )
+        if stored is None:
+            return None
+        if stored.request_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if stored.response is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key did not store its response")
+        return NegotiatedResponse(json.loads(stored.response), status_code=stored.status_code, headers={REPLAYED_HEADER: "true"})
+
+    def begin(self, db: Session, payload=None) -> Optional[NegotiatedResponse]:
+        """Claim the key in db's transaction, or return the stored response of an earlier request with it"""
+        if self.key is None:
+            return None
+        request_hash = _digest(_encode(payload))
+        now = datetime.utcnow()
+        replay = self._replay(db, request_hash, now)
+        if replay is not None:
+            return replay
+
+        # An expired claim of the same key is replaced
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.key == self.key, IdempotencyKey.expires_at <= now
+        ).delete(synchronize_session=False)
+        self._claim = IdempotencyKey(
+            key=self.key,
+            request_hash=request_hash,
+            expires_at=now + timedelta(seconds=config.IDEMPOTENCY_TTL_SECONDS)
+        )
+        db.add(self._claim)
+        try:
+            db.flush()
+        except IntegrityError:
+            # Another process committed the same key after the lookup
+            db.rollback()
+            self._claim = None
+            replay = self._replay(db, request_hash, now)
+            if replay is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+            return replay
+        return None
+
+    def save(self, db: Session, content, status_code: int = 200):
+        """Store the response content in db's transaction; the caller commits"""
+        if self._claim is None:
+            return
+        self._claim.status_code = status_code
+        self._claim.response = _encode(content)
+        _purge_expired(db, datetime.utcnow(), self.key)
+
+    def save_instance(self, db: Session, response_model, instance, options=()):
+        """Store instance serialized with response_model, as it reads once the transaction commits.
+
+        Returns the stored response, or None without a key.
+        """
+        if self._claim is None:
+            return None
+        db.flush()
+        # Reload through the response's eager loads, so counters updated with SQL are current
+        model = type(instance)
+        current = db.query(model).options(*options).populate_existing().filter(model.id == instance.id).one()
+        response = response_model.model_validate(current)
+        self.save(db, response)
+        return response
+
+def idempotency(request: Request, idempotency_key: Optional[str] = Header(None)):
+    """Dependency holding the request's key; waits while another request with the same key runs"""
+    if idempotency_key is None:
+        yield Idempotency()
+        return
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+    key = _digest(request.method.encode(), request.url.path.encode(), idempotency_key.encode())
+    if not _acquire(key):
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+    try:
+        yield Idempotency(key)
+    finally:
+        _release(key)
@@ -1,4 +1,5 @@
 from app.database import SessionLocal
+from app.migrations import recount
 from app.models.models import Customer, ShopItemCategory, ShopItem, Order, OrderItem
 
 def create_test_data():
@@ -76,6 +77,9 @@ def create_test_data():
         for order_item in order_items:
             db.add(order_item)
         
+        db.flush()
+        # Fill in order totals and the counters the routers maintain on writes
+        recount(db.connection())
         db.commit()
         print("Test data created successfully!")
         
@@ -0,0 +1,268 @@
+"""Durable background jobs stored in the jobs table.
+
+enqueue() adds a job to the caller's session, so it commits or rolls back
+together with the write that needs it. Work registered with @job_handler
+runs after the request has returned:
+
+- Workers (`python -m app.manage worker`) claim a batch of due jobs of one
+  kind and run the kind's handler on the whole batch. The handler's writes
+  and the jobs being marked done commit in one transaction.
+- When a batch fails, its jobs are run one at a time, so one bad job does
+  not hold back the others. A failing job is retried after JOB_RETRY_SECONDS,
+  doubling each time, and marked failed after its last attempt.
+- A kind's concurrency caps the batches of that kind running at once in
+  one worker process.
+- A job still running after JOB_LEASE_SECONDS is assumed lost with its
+  worker and claimed again.
+
+drain() runs every due job in the calling thread; tests use it instead of a
+worker pool.
+"""
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import config
+from app.models.models import Job
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Window the throughput and latency metrics are computed over
+METRICS_WINDOW_SECONDS = 60
+
+class JobKind:
+    def __init__(self, name: str, handler: Callable, batch_size: Optional[int], concurrency: int, max_attempts: Optional[int]):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+_kinds: Dict[str, JobKind] = {}
+
+def job_handler(name: str, batch_size: Optional[int] = None, concurrency: int = 1, max_attempts: Optional[int] = None):
+    """Register handler(db, payloads) to run queued jobs of one kind.
+
+    The handler gets the payloads of a batch of jobs and must not commit.
+    batch_size and max_attempts default to JOB_BATCH_SIZE and JOB_MAX_ATTEMPTS.
+    """
+    def register(handler):
+        _kinds[name] = JobKind(name, handler, batch_size, concurrency, max_attempts)
+        return handler
+    return register
+
+def enqueue(db: Session, kind: str, payload: dict, delay: float = 0.0):
+    """Add a job to the current transaction; it becomes visible to workers when the caller commits"""
+    now = datetime.utcnow()
+    db.add(Job(kind=kind, payload=payload, created_at=now, run_after=now + timedelta(seconds=delay)))
+
+def _claim(db: Session, kind: JobKind, now: datetime, max_attempts: int) -> List[tuple]:
+    lease_expired = and_(Job.status == RUNNING, Job.started_at < now - timedelta(seconds=config.JOB_LEASE_SECONDS))
+    # Jobs whose worker kept disappearing have used up their attempts
+    db.execute(
+        update(Job)
+        .where(Job.kind == kind.name, lease_expired, Job.attempts >= max_attempts)
+        .values(status=FAILED, finished_at=now, last_error="Lease expired on the last attempt")
+    )
+    due = (
+        select(Job.id)
+        .where(Job.kind == kind.name, or_(and_(Job.status == PENDING, Job.run_after <= now), lease_expired))
+        .order_by(Job.id)
+        .limit(kind.batch_size or config.JOB_BATCH_SIZE)
+    )
+    claimed = db.execute(
+        update(Job)
+        .where(Job.id.in_(due.scalar_subquery()))
+        .values(status=RUNNING, started_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.payload, Job.attempts)
+    ).all()
+    db.commit()
+    return sorted(claimed)
+
+class _LeaseLost(Exception):
+    pass
+
+def _run(db: Session, kind: JobKind, jobs: List[tuple], claimed_at: datetime, max_attempts: int) -> bool:
+    # Returns False when a batch of several jobs failed and nothing was recorded
+    ids = [id for id, payload, attempts in jobs]
+    # Only the worker that claimed the jobs at claimed_at may finish them
+    claimed = and_(Job.id.in_(ids), Job.status == RUNNING, Job.started_at == claimed_at)
+    try:
+        kind.handler(db, [payload for id, payload, attempts in jobs])
+        finished = db.execute(update(Job).where(claimed).values(status=DONE, finished_at=datetime.utcnow()))
+        if finished.rowcount != len(ids):
+            raise _LeaseLost()
+        db.commit()
+        return True
+    except _LeaseLost:
+        db.rollback()
+        logger.warning("Jobs %s of kind %s were claimed by another worker before they finished", ids, kind.name)
+        return True
+    except Exception as exc:
+        db.rollback()
+        if len(jobs) > 1:
+            return False
+        id, payload, attempts = jobs[0]
+        failed = attempts >= max_attempts
+        logger.warning("Job %s of kind %s failed (attempt %s of %s): %r", id, kind.name, attempts, max_attempts, exc)
+        db.execute(update(Job).where(claimed).values(
+            status=FAILED if failed else PENDING,
+            finished_at=datetime.utcnow() if failed else None,
+            run_after=claimed_at + timedelta(seconds=config.JOB_RETRY_SECONDS * 2 ** (attempts - 1)),
+            last_error=repr(exc)[:1000]
+        ))
+        db.commit()
+        return True
+
+class WorkerPool:
+    """Threads that claim and run due jobs until stopped"""
+
+    def __init__(self, session_factory, workers: Optional[int] = None, poll_seconds: Optional[float] = None):
+        self.session_factory = session_factory
+        self.workers = workers if workers is not None else config.JOB_WORKERS
+        self.poll_seconds = poll_seconds if poll_seconds is not None else config.JOB_POLL_SECONDS
+        # Batches of each kind running in this process, for the concurrency limits
+        self._running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._start_kind = itertools.count()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_prune = float("-inf")
+
+    def _acquire(self, kind: JobKind) -> bool:
+        with self._lock:
+            if self._running.get(kind.name, 0) >= kind.concurrency:
+                return False
+            self._running[kind.name] = self._running.get(kind.name, 0) + 1
+            return True
+
+    def _release(self, kind: JobKind):
+        with self._lock:
+            self._running[kind.name] -= 1
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Claim and run one batch of the next kind with due jobs and a free slot; returns the jobs run"""
+        kinds = list(_kinds.values())
+        if not kinds:
+            return 0
+        # Start from a different kind each time so a busy kind cannot starve the rest
+        start = next(self._start_kind) % len(kinds)
+        for kind in kinds[start:] + kinds[:start]:
+            if not self._acquire(kind):
+                continue
+            try:
+                processed = self._run_batch(kind, now or datetime.utcnow())
+            finally:
+                self._release(kind)
+            if processed:
+                return processed
+        return 0
+
+    def _run_batch(self, kind: JobKind, now: datetime) -> int:
+        max_attempts = kind.max_attempts or config.JOB_MAX_ATTEMPTS
+        with self.session_factory() as db:
+            jobs = _claim(db, kind, now, max_attempts)
+            if jobs and not _run(db, kind, jobs, now, max_attempts):
+                for job in jobs:
+                    _run(db, kind, [job], now, max_attempts)
+            return len(jobs)
+
+    def prune(self):
+        """Delete finished jobs older than JOB_RETENTION_SECONDS"""
+        cutoff = datetime.utcnow() - timedelta(seconds=config.JOB_RETENTION_SECONDS)
+        with self.session_factory() as db:
+            db.query(Job).filter(Job.status == DONE, Job.finished_at < cutoff).delete(synchronize_session=False)
+            db.commit()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+                # Idle: one worker at a time clears out old finished jobs, about once a minute
+                with self._lock:
+                    prune = self._last_prune + METRICS_WINDOW_SECONDS < time.monotonic()
+                    if prune:
+                        self._last_prune = time.monotonic()
+                if prune:
+                    self.prune()
+            except Exception:
+                # Database errors (e.g. a locked database) must not kill the worker
+                logger.exception("Job worker error")
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True) for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop claiming jobs and wait for running batches to finish"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+def drain(session_factory, now: Optional[datetime] = None) -> int:
+    """Run every job that is due at now (default: the current time) in this thread; returns the jobs run"""
+    pool = WorkerPool(session_factory, workers=0)
+    total = 0
+    while True:
+        processed = pool.run_once(now)
+        if not processed:
+            return total
+        total += processed
+
+def _empty_metrics() -> dict:
+    return {
+        "pending": 0, "scheduled": 0, "running": 0, "failed": 0, "done": 0,
+        "lag_seconds": 0.0, "done_last_minute": 0, "throughput_per_second": 0.0, "latency_seconds": None
+    }
+
+def job_metrics(db: Session, now: Optional[datetime] = None) -> dict:
+    """Queue depth, lag, throughput and latency per job kind"""
+    now = now or datetime.utcnow()
+    since = now - timedelta(seconds=METRICS_WINDOW_SECONDS)
+    due = and_(Job.status == PENDING, Job.run_after <= now)
+    recent = and_(Job.status == DONE, Job.finished_at >= since)
+    rows = db.execute(
+        select(
+            Job.kind,
+            Job.status,
+            func.count(),
+            func.sum(case((due, 1), else_=0)),
+            func.min(case((due, Job.run_after))),
+            func.sum(case((recent, 1), else_=0)),
+            func.avg(case((recent, func.julianday(Job.finished_at) - func.julianday(Job.created_at)))) * 86400
+        )
+        .group_by(Job.kind, Job.status)
+    ).all()
+
+    kinds = {name: _empty_metrics() for name in _kinds}
+    for kind, status, count, due_count, oldest_due, recent_count, latency in rows:
+        metrics = kinds.setdefault(kind, _empty_metrics())
+        if status == PENDING:
+            # Pending jobs waiting for a retry are scheduled, not lagging
+            metrics["pending"] = due_count
+            metrics["scheduled"] = count - due_count
+            if oldest_due is not None:
+                metrics["lag_seconds"] = round((now - oldest_due).total_seconds(), 3)
+        else:
+            metrics[status] = count
+        if status == DONE:
+            metrics["done_last_minute"] = recent_count
+            metrics["throughput_per_second"] = round(recent_count / METRICS_WINDOW_SECONDS, 3)
+            metrics["latency_seconds"] = round(latency, 3) if latency is not None else None
+    return {"window_seconds": METRICS_WINDOW_SECONDS, "kinds": kinds}
\ No newline at end of file
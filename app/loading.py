@@ -0,0 +1,21 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models.models import Order, OrderItem, ShopItem, ArchivedOrder, ArchivedOrderItem
+
+# Eager loading for everything the response schemas serialize, so that
+# listing N rows costs a fixed number of queries instead of N lazy loads
+
+def item_options():
+    return (selectinload(ShopItem.categories),)
+
+def order_options():
+    return (
+        joinedload(Order.customer),
+        selectinload(Order.items).selectinload(OrderItem.shop_item).selectinload(ShopItem.categories),
+    )
+
+def archived_order_options():
+    return (
+        joinedload(ArchivedOrder.customer),
+        selectinload(ArchivedOrder.items).selectinload(ArchivedOrderItem.shop_item).selectinload(ShopItem.categories),
+    )
\ No newline at end of file
@@ -0,0 +1,55 @@
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+from sqlalchemy import bindparam, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+# Primary key lookups shared by the routers. Rows already loaded by the
+# request's session come from its identity map without a query, and the
+# session keeps a strong reference to every row looked up here, so asking
+# for the same entity again within the request never goes back to the
+# database. Misses are loaded with statements built once per model.
+# Items and categories marked deleted (deleted_at set) count as missing.
+
+_LOADED_KEY = "lookups_loaded"
+
+def _keep(db: Session, instance):
+    # The identity map only holds weak references; pin the row for the rest of the session
+    db.info.setdefault(_LOADED_KEY, {})[identity_key(instance=instance)] = instance
+
+def _deleted(instance) -> bool:
+    return getattr(instance, "deleted_at", None) is not None
+
+@lru_cache(maxsize=None)
+def _select_by_ids(model):
+    return select(model).where(model.id.in_(bindparam("ids", expanding=True)))
+
+def get_by_id(db: Session, model, id: int, options=()) -> Optional[object]:
+    """Row by primary key, or None"""
+    instance = db.get(model, id, options=options)
+    if instance is None or _deleted(instance):
+        return None
+    _keep(db, instance)
+    return instance
+
+def get_by_ids(db: Session, model, ids: Iterable[int], options=()) -> Dict[int, object]:
+    """Rows by primary key as {id: row}; IDs that do not exist are left out"""
+    found = {}
+    missing = []
+    for id in set(ids):
+        instance = db.identity_map.get(identity_key(model, id))
+        if instance is not None and not inspect(instance).expired:
+            found[id] = instance
+        else:
+            missing.append(id)
+
+    if missing:
+        statement = _select_by_ids(model).options(*options)
+        for instance in db.execute(statement, {"ids": missing}).scalars():
+            found[instance.id] = instance
+    for id, instance in list(found.items()):
+        if _deleted(instance):
+            del found[id]
+        else:
+            _keep(db, instance)
+    return found
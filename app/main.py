@@ -1,33 +1,31 @@
 from fastapi import FastAPI
-from contextlib import asynccontextmanager
-from app.database import engine
-from app.models.models import Base
-from app.routers import customers, categories, items, orders
-from app.init_data import create_test_data
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-# Initialize test data on startup
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    create_test_data()
-    yield
-    # Shutdown (no cleanup needed)
+from app.routers import customers, categories, items, orders, changes, catalog, batch, admin
+from app.profiling import ProfilingMiddleware
+from app.query_guard import QueryGuardMiddleware
 
+# Startup does not touch the database: the schema is managed with
+# `python -m app.manage migrate` and sample data with `python -m app.manage seed`
 app = FastAPI(
     title="Online Shop API",
     description="A minimalistic backend web app for an online shop",
-    version="1.0.0",
-    lifespan=lifespan
+    version="1.0.0"
 )
 
+# Per-request query budgets and N+1 detection, see app/query_guard.py
+app.add_middleware(QueryGuardMiddleware)
+
+# Opt-in per-request profiling, see app/profiling.py
+app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(customers.router, prefix="/customers", tags=["customers"])
 app.include_router(categories.router, prefix="/categories", tags=["categories"])
 app.include_router(items.router, prefix="/items", tags=["items"])
 app.include_router(orders.router, prefix="/orders", tags=["orders"])
+app.include_router(changes.router, prefix="/changes", tags=["changes"])
+app.include_router(catalog.router, prefix="/catalog", tags=["catalog"])
+app.include_router(batch.router, prefix="/batch", tags=["batch"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 @app.get("/")
 def read_root():
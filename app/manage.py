@@ -0,0 +1,83 @@
+"""Management commands for the shop database.
+
+    python -m app.manage migrate    # create or upgrade the schema
+    python -m app.manage seed       # load sample data into an empty database
+    python -m app.manage backup     # copy the live database, --vacuum for a compacted snapshot
+    python -m app.manage worker     # run background jobs until interrupted
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+
+from app.backup import backup_database, vacuum_snapshot
+from app.database import SessionLocal, engine
+from app.init_data import create_test_data
+from app.jobs import WorkerPool
+from app.migrations import LATEST_VERSION, current_version, migrate
+# Registers the job handlers the workers run
+from app import purge, recommendations
+
+def migrate_command(args) -> int:
+    with engine.connect() as connection:
+        before = current_version(connection)
+    after = migrate(engine)
+    if after == before:
+        print(f"Schema is up to date (version {after})")
+    else:
+        print(f"Migrated schema from version {before} to {after}")
+    return 0
+
+def seed_command(args) -> int:
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version < LATEST_VERSION:
+        print(f"Schema is at version {version}, run `python -m app.manage migrate` first", file=sys.stderr)
+        return 1
+    create_test_data()
+    return 0
+
+def backup_command(args) -> int:
+    source = engine.url.database
+    if args.vacuum:
+        report = vacuum_snapshot(source, args.output)
+    else:
+        sleep = args.sleep_ms / 1000 if args.sleep_ms is not None else None
+        report = backup_database(source, args.output, pages=args.pages, sleep=sleep)
+    print(json.dumps(report, indent=2))
+    return 0
+
+def worker_command(args) -> int:
+    pool = WorkerPool(SessionLocal, workers=args.workers)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    pool.start()
+    print(f"Running background jobs with {pool.workers} workers, Ctrl+C to stop")
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    # Batches already claimed finish before the process exits
+    pool.stop()
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Online Shop API management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="create or upgrade the database schema").set_defaults(handler=migrate_command)
+    commands.add_parser("seed", help="load sample data into an empty database").set_defaults(handler=seed_command)
+    backup = commands.add_parser("backup", help="copy the live database without stopping the API")
+    backup.add_argument("--output", help="destination file, defaults to a timestamped file in SHOP_BACKUP_DIR")
+    backup.add_argument("--vacuum", action="store_true", help="write a compacted snapshot with VACUUM INTO")
+    backup.add_argument("--pages", type=int, help="pages copied per backup step")
+    backup.add_argument("--sleep-ms", type=float, help="pause between backup steps")
+    backup.set_defaults(handler=backup_command)
+    worker = commands.add_parser("worker", help="run background jobs until interrupted")
+    worker.add_argument("--workers", type=int, help="worker threads, defaults to SHOP_JOB_WORKERS")
+    worker.set_defaults(handler=worker_command)
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
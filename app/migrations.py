@@ -0,0 +1,165 @@
+"""Versioned schema migrations tracked in SQLite's PRAGMA user_version.
+
+A new database is created straight from the models and stamped with the
+latest version. An existing one has every migration above its version
+applied in order, each in its own BEGIN IMMEDIATE transaction, so several
+processes can run migrate() at once and only one of them does the work.
+Every step checks the schema before changing it, which also lets databases
+that predate versioning (user_version 0) catch up whatever state they are in.
+Every run also switches the database to WAL journaling, which is kept in the
+file, so readers (including backups) and writers do not block each other.
+"""
+from sqlalchemy import MetaData, inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+
+from app.database import Base
+from app.models.models import (
+    ArchivedOrder, ArchivedOrderItem, ChangeLogEntry, IdempotencyKey, ItemCoPurchase, Job, Order, OrderItem,
+    shop_item_category_association
+)
+
+def _columns(connection: Connection, table: str) -> set:
+    return {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+def _add_column(connection: Connection, table: str, column: str, definition: str) -> bool:
+    # Returns True when the column was missing and has been added
+    if column in _columns(connection, table):
+        return False
+    connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+def _create_indexes(connection: Connection, table):
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+def _recount_order_totals(connection: Connection):
+    connection.exec_driver_sql("""
+        UPDATE orders SET total = (
+            SELECT coalesce(sum(order_items.quantity * shop_items.price), 0)
+            FROM order_items JOIN shop_items ON shop_items.id = order_items.shop_item_id
+            WHERE order_items.order_id = orders.id
+        )
+    """)
+
+def _recount_item_counts(connection: Connection):
+    connection.exec_driver_sql("""
+        UPDATE shop_item_categories SET item_count = (
+            SELECT count(*) FROM shop_item_category_association
+            WHERE shop_item_category_association.category_id = shop_item_categories.id
+        )
+    """)
+
+def _recount_customer_stats(connection: Connection):
+    connection.exec_driver_sql("""
+        UPDATE customers SET
+            order_count = (SELECT count(*) FROM orders WHERE orders.customer_id = customers.id),
+            total_spend = (SELECT coalesce(sum(total), 0) FROM orders WHERE orders.customer_id = customers.id),
+            last_order_id = (SELECT max(id) FROM orders WHERE orders.customer_id = customers.id)
+    """)
+
+def recount(connection: Connection):
+    """Recompute order totals, category item counts and customer stats from the base tables"""
+    _recount_order_totals(connection)
+    _recount_item_counts(connection)
+    _recount_customer_stats(connection)
+
+def _add_order_columns(connection: Connection):
+    if _add_column(connection, "orders", "created_at", "DATETIME"):
+        # Orders placed before the column existed count as placed now
+        connection.exec_driver_sql("UPDATE orders SET created_at = datetime('now')")
+    if _add_column(connection, "orders", "total", "FLOAT NOT NULL DEFAULT 0"):
+        # Best effort for old orders: value them at current prices
+        _recount_order_totals(connection)
+    _add_column(connection, "shop_items", "stock", "INTEGER")
+    _create_indexes(connection, Order.__table__)
+
+def _add_counters(connection: Connection):
+    if _add_column(connection, "shop_item_categories", "item_count", "INTEGER NOT NULL DEFAULT 0"):
+        _recount_item_counts(connection)
+    added = [
+        _add_column(connection, "customers", "order_count", "INTEGER NOT NULL DEFAULT 0"),
+        _add_column(connection, "customers", "total_spend", "FLOAT NOT NULL DEFAULT 0"),
+        _add_column(connection, "customers", "last_order_id", "INTEGER")
+    ]
+    if any(added):
+        _recount_customer_stats(connection)
+    _create_indexes(connection, shop_item_category_association)
+
+def _add_history_tables(connection: Connection):
+    for model in (ArchivedOrder, ArchivedOrderItem, ChangeLogEntry, ItemCoPurchase):
+        model.__table__.create(connection, checkfirst=True)
+        _create_indexes(connection, model.__table__)
+
+def _rebuild_with_autoincrement(connection: Connection, table):
+    # SQLite cannot alter a primary key, so copy the rows into a fresh table
+    sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+    ).scalar()
+    if "AUTOINCREMENT" in sql.upper():
+        return
+    # The staging copy needs the tables its foreign keys point at to compile
+    scratch = MetaData()
+    for other in Base.metadata.sorted_tables:
+        if other is not table:
+            other.to_metadata(scratch)
+    staging = table.to_metadata(scratch, name=f"_{table.name}_rebuild")
+    connection.execute(CreateTable(staging))
+    columns = ", ".join(column.name for column in table.columns)
+    connection.exec_driver_sql(f"INSERT INTO {staging.name} ({columns}) SELECT {columns} FROM {table.name}")
+    connection.exec_driver_sql(f"DROP TABLE {table.name}")
+    connection.exec_driver_sql(f"ALTER TABLE {staging.name} RENAME TO {table.name}")
+    _create_indexes(connection, table)
+
+def _use_autoincrement_ids(connection: Connection):
+    for table in (Order.__table__, OrderItem.__table__):
+        _rebuild_with_autoincrement(connection, table)
+
+def _add_jobs_table(connection: Connection):
+    Job.__table__.create(connection, checkfirst=True)
+    _create_indexes(connection, Job.__table__)
+
+def _add_idempotency_keys_table(connection: Connection):
+    IdempotencyKey.__table__.create(connection, checkfirst=True)
+    _create_indexes(connection, IdempotencyKey.__table__)
+
+def _add_deleted_at_columns(connection: Connection):
+    _add_column(connection, "shop_items", "deleted_at", "DATETIME")
+    _add_column(connection, "shop_item_categories", "deleted_at", "DATETIME")
+
+# Applied in order; a migration's version is its position in the list
+MIGRATIONS = [
+    _add_order_columns,
+    _add_counters,
+    _add_history_tables,
+    _use_autoincrement_ids,
+    _add_jobs_table,
+    _add_idempotency_keys_table,
+    _add_deleted_at_columns,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+def current_version(connection: Connection) -> int:
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+def migrate(engine: Engine) -> int:
+    """Bring the database schema up to LATEST_VERSION and return the version it is at"""
+    with engine.connect() as connection:
+        # Cannot be changed inside a transaction, so it is not a numbered migration
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+        while True:
+            # Take the write lock before reading the version so concurrent runs queue up
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            version = current_version(connection)
+            if version >= LATEST_VERSION:
+                connection.rollback()
+                return version
+            if version == 0 and not inspect(connection).get_table_names():
+                Base.metadata.create_all(connection)
+                version = LATEST_VERSION
+            else:
+                MIGRATIONS[version](connection)
+                version += 1
+            connection.exec_driver_sql(f"PRAGMA user_version = {version}")
+            connection.commit()
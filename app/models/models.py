@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Table
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Table, Index, JSON, LargeBinary, and_
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -7,7 +8,9 @@ shop_item_category_association = Table(
     'shop_item_category_association',
     Base.metadata,
     Column('shop_item_id', Integer, ForeignKey('shop_items.id'), primary_key=True),
-    Column('category_id', Integer, ForeignKey('shop_item_categories.id'), primary_key=True)
+    Column('category_id', Integer, ForeignKey('shop_item_categories.id'), primary_key=True),
+    # Lets category listings walk their items without scanning the whole table
+    Index('ix_shop_item_category_association_category_item', 'category_id', 'shop_item_id')
 )
 
 class Customer(Base):
@@ -17,6 +20,10 @@ class Customer(Base):
     name = Column(String, index=True)
     surname = Column(String, index=True)
     email = Column(String, unique=True, index=True)
+    # Lifetime order aggregates, maintained by the orders router
+    order_count = Column(Integer, default=0, nullable=False)
+    total_spend = Column(Float, default=0.0, nullable=False)
+    last_order_id = Column(Integer)
     
     # Relationship with orders
     orders = relationship("Order", back_populates="customer")
@@ -27,9 +34,19 @@ class ShopItemCategory(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String)
+    # Number of items assigned to this category, maintained by the items router
+    item_count = Column(Integer, default=0, nullable=False)
+    # Set when the category is deleted; the purge job removes it later, see app/purge.py
+    deleted_at = Column(DateTime)
     
-    # Many-to-many relationship with shop items
-    shop_items = relationship("ShopItem", secondary=shop_item_category_association, back_populates="categories")
+    # Many-to-many relationship with shop items, leaving out deleted ones
+    shop_items = relationship(
+        "ShopItem",
+        secondary=shop_item_category_association,
+        primaryjoin=lambda: ShopItemCategory.id == shop_item_category_association.c.category_id,
+        secondaryjoin=lambda: and_(ShopItem.id == shop_item_category_association.c.shop_item_id, ShopItem.deleted_at.is_(None)),
+        back_populates="categories"
+    )
 
 class ShopItem(Base):
     __tablename__ = "shop_items"
@@ -38,15 +55,27 @@ class ShopItem(Base):
     title = Column(String, index=True)
     description = Column(String)
     price = Column(Float)
+    # Units on hand; NULL means stock is not tracked for the item
+    stock = Column(Integer, nullable=True)
+    # Set when the item is deleted; the purge job removes it later unless order lines still refer to it
+    deleted_at = Column(DateTime)
     
-    # Many-to-many relationship with categories
-    categories = relationship("ShopItemCategory", secondary=shop_item_category_association, back_populates="shop_items")
+    # Many-to-many relationship with categories, leaving out deleted ones
+    categories = relationship(
+        "ShopItemCategory",
+        secondary=shop_item_category_association,
+        primaryjoin=lambda: ShopItem.id == shop_item_category_association.c.shop_item_id,
+        secondaryjoin=lambda: and_(ShopItemCategory.id == shop_item_category_association.c.category_id, ShopItemCategory.deleted_at.is_(None)),
+        back_populates="shop_items"
+    )
     
     # Relationship with order items
     order_items = relationship("OrderItem", back_populates="shop_item")
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    # Never reuse IDs, they must stay unique across the archive tables
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
     shop_item_id = Column(Integer, ForeignKey("shop_items.id"))
@@ -59,10 +88,106 @@ class OrderItem(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    # Never reuse IDs, they must stay unique across the archive tables
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("customers.id"))
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Order value at the time it was written, used to keep customer aggregates exact
+    total = Column(Float, default=0.0, nullable=False)
     
     # Relationships
     customer = relationship("Customer", back_populates="orders")
-    items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
\ No newline at end of file
+    items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+
+# Cold storage for old orders, see app/archive.py
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+    
+    id = Column(Integer, primary_key=True)
+    shop_item_id = Column(Integer, ForeignKey("shop_items.id"))
+    quantity = Column(Integer)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    
+    # Relationships
+    shop_item = relationship("ShopItem")
+    order = relationship("ArchivedOrder", back_populates="items")
+
+class ArchivedOrder(Base):
+    __tablename__ = "orders_archive"
+    
+    id = Column(Integer, primary_key=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True)
+    created_at = Column(DateTime)
+    total = Column(Float, default=0.0, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    customer = relationship("Customer")
+    items = relationship("ArchivedOrderItem", back_populates="order", cascade="all, delete-orphan")
+
+class ChangeLogEntry(Base):
+    __tablename__ = "change_log"
+    # Sequence numbers must stay monotonic even after compaction deletes the newest rows
+    __table_args__ = (
+        Index('ix_change_log_entity', 'entity_type', 'entity_id', 'seq'),
+        {"sqlite_autoincrement": True}
+    )
+    
+    seq = Column(Integer, primary_key=True)
+    entity_type = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    operation = Column(String, nullable=False)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+# Number of orders containing both items, see app/recommendations.py
+class ItemCoPurchase(Base):
+    __tablename__ = "item_co_purchases"
+    __table_args__ = (
+        Index('ix_item_co_purchases_item_score', 'item_id', 'score', 'related_item_id'),
+    )
+    
+    item_id = Column(Integer, ForeignKey("shop_items.id"), primary_key=True)
+    related_item_id = Column(Integer, ForeignKey("shop_items.id"), primary_key=True)
+    score = Column(Integer, default=0, nullable=False)
+
+# Background work queued in the transaction of the write that needs it, see app/jobs.py
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers claim due jobs of one kind in ID order
+        Index('ix_jobs_claim', 'kind', 'status', 'run_after'),
+        {"sqlite_autoincrement": True}
+    )
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    # pending, running, done or failed
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Not claimed before this time; pushed back after a failed attempt
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    last_error = Column(String)
+
+# Responses of writes sent with an Idempotency-Key, stored in the write's transaction, see app/idempotency.py
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # Expired keys are purged in expiry order
+        Index('ix_idempotency_keys_expires_at', 'expires_at'),
+        {"sqlite_with_rowid": False}
+    )
+    
+    # First 16 bytes of the SHA-256 of the method, path and client key
+    key = Column(LargeBinary, primary_key=True)
+    # First 16 bytes of the SHA-256 of the request body, to reject a key reused for another request
+    request_hash = Column(LargeBinary, nullable=False)
+    status_code = Column(Integer)
+    # Compact JSON of the response content
+    response = Column(LargeBinary)
+    expires_at = Column(DateTime, nullable=False)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""MessagePack content negotiation for every route.
+
+ShopRoute wraps each route handler so that:
+
+- a request body sent with `Content-Type: application/msgpack` is decoded
+  with msgpack and validated exactly like a JSON body;
+- a response whose content FastAPI serializes itself (the endpoint's return
+  value or response_model) is encoded as MessagePack when the request's
+  Accept header prefers `application/msgpack` over JSON.
+
+Responses an endpoint builds itself (streams, exports) and error responses
+stay in their own format. msgpack is optional: without it every response is
+JSON and MessagePack request bodies are rejected with 415.
+"""
+from contextvars import ContextVar
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+JSON_TYPES = ("application/json", "application/*", "*/*")
+
+# Media type of the response for the request being handled
+_response_media_type: ContextVar[str] = ContextVar("response_media_type", default="application/json")
+
+def header_quality(accept: str, media_types) -> float:
+    """Highest q value an Accept-style header gives any of media_types (lowercase), 0 if none"""
+    best = 0.0
+    for part in accept.split(","):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        if media_type.lower() not in media_types:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        best = max(best, quality)
+    return best
+
+def prefers_msgpack(accept: str) -> bool:
+    """Whether an Accept header ranks MessagePack above JSON"""
+    if msgpack is None or not accept:
+        return False
+    msgpack_quality = header_quality(accept, MSGPACK_TYPES)
+    # Ties go to JSON, so `*/*` alone or listing both equally keeps the default
+    return msgpack_quality > 0 and msgpack_quality > header_quality(accept, JSON_TYPES)
+
+def is_msgpack(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in MSGPACK_TYPES
+
+class MsgPackRequest(Request):
+    """Request whose MessagePack body FastAPI reads through json()"""
+
+    def __init__(self, request: Request):
+        # FastAPI only parses bodies it sees as JSON, so present the decoded body as JSON
+        headers = [(name, value) for name, value in request.scope["headers"] if name != b"content-type"]
+        headers.append((b"content-type", b"application/json"))
+        super().__init__(dict(request.scope, headers=headers), request.receive)
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="MessagePack request bodies are not supported, install msgpack")
+            try:
+                # Timestamp extensions decode to datetimes, which datetime fields accept
+                self._json = msgpack.unpackb(await self.body(), timestamp=3)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=f"Invalid MessagePack body: {exc}")
+        return self._json
+
+class NegotiatedResponse(JSONResponse):
+    """Default response class: JSON, or MessagePack when the request asked for it"""
+
+    def __init__(self, content, status_code: int = 200, headers=None, media_type=None, background=None):
+        # OpenAPI reads the default status code from this signature
+        super().__init__(content, status_code, headers, media_type or _response_media_type.get(), background)
+        # Caches must key responses on Accept as well as the URL
+        self.headers["Vary"] = "Accept"
+
+    def render(self, content) -> bytes:
+        if self.media_type == MSGPACK:
+            return msgpack.packb(content)
+        return super().render(content)
+
+def negotiate(handler):
+    """Wrap a route handler with MessagePack request decoding and response negotiation"""
+    async def negotiated_handler(request: Request):
+        if is_msgpack(request.headers.get("content-type", "")):
+            request = MsgPackRequest(request)
+        media_type = MSGPACK if prefers_msgpack(request.headers.get("accept", "")) else "application/json"
+        token = _response_media_type.set(media_type)
+        try:
+            return await handler(request)
+        finally:
+            _response_media_type.reset(token)
+    return negotiated_handler
@@ -0,0 +1,175 @@
+import cProfile
+import itertools
+import marshal
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import config
+
+# Interval between stack samples taken for the speedscope export
+SAMPLE_INTERVAL_SECONDS = 0.001
+
+class RequestProfile:
+    def __init__(self, id: int, method: str, path: str):
+        self.id = id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.status_code = None
+        self.queries = []
+        self.pstats_data = None
+        self.samples = []
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "status_code": self.status_code,
+            "query_count": len(self.queries),
+            "query_ms": round(sum(duration for statement, duration in self.queries), 3)
+        }
+
+    def speedscope(self) -> dict:
+        """Convert the stack samples to the speedscope sampled-profile format"""
+        frames = []
+        frame_index = {}
+        samples = []
+        weights = []
+        for stack, weight in self.samples:
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    name, file, line = frame
+                    frames.append({"name": name, "file": file, "line": line})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(weight)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path}",
+            "exporter": "online-shop-api",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{self.method} {self.path}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            }]
+        }
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+_profile_ids = itertools.count(1)
+_profiles_lock = threading.Lock()
+_profiles = deque(maxlen=config.PROFILE_BUFFER_SIZE)
+
+def recent_profiles():
+    with _profiles_lock:
+        return list(_profiles)
+
+def get_profile(profile_id: int) -> Optional[RequestProfile]:
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile.id == profile_id:
+                return profile
+    return None
+
+def _sample_thread(thread_id: int, profile: RequestProfile, stop: threading.Event):
+    # Periodically record the call stack of the thread running the endpoint
+    last = time.perf_counter()
+    while not stop.wait(SAMPLE_INTERVAL_SECONDS):
+        frame = sys._current_frames().get(thread_id)
+        now = time.perf_counter()
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        if stack:
+            profile.samples.append((tuple(reversed(stack)), (now - last) * 1000))
+        last = now
+
+def profile_call(func, *args, **kwargs):
+    """Run a sync endpoint, under cProfile and the stack sampler if the request is profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        return func(*args, **kwargs)
+
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_thread, args=(threading.get_ident(), profile, stop), daemon=True)
+    profiler = cProfile.Profile()
+    sampler.start()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        stop.set()
+        sampler.join()
+        profile.pstats_data = marshal.dumps(pstats.Stats(profiler).stats)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        started = conn.info["profile_query_start"].pop()
+        profile.queries.append((statement, (time.perf_counter() - started) * 1000))
+
+class ProfilingMiddleware:
+    """Profile requests that carry X-Profile: <admin token>, or a random sample of them.
+
+    Unprofiled requests only pay for one header lookup and, when sampling is
+    enabled, one random number.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _should_profile(self, scope) -> bool:
+        if config.ADMIN_TOKEN:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return value.decode() == config.ADMIN_TOKEN
+        return config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(next(_profile_ids), scope["method"], scope["path"])
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", str(profile.id).encode())]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.duration_ms = (time.perf_counter() - started) * 1000
+            _current_profile.reset(token)
+            with _profiles_lock:
+                _profiles.append(profile)
@@ -0,0 +1,119 @@
+"""Deferred removal of deleted items and categories.
+
+Deleting an item or category only marks it (deleted_at) and queues a purge
+job in the same transaction, so the request does not wait for the cascade.
+From then on readers leave it out: lookups treat it as missing, lists, facets
+and the catalog caches filter it, and the relationships between items and
+categories hide it.
+
+A purge job removes up to PURGE_CHUNK_SIZE dependent rows (category links,
+co-purchase scores) per transaction. While rows remain it queues its own
+continuation carrying the running totals, so a large delete becomes a series
+of short write transactions that other writers interleave with, and its
+progress shows in the queue (purge_progress, GET /admin/purges). The last
+chunk deletes the row itself. An item that hot or archived order lines still
+refer to is kept as a marked row, so order history keeps its item.
+"""
+import logging
+from typing import List
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+
+from app import config
+from app.changes import CATEGORY, ITEM
+from app.jobs import DONE, enqueue, job_handler
+from app.models.models import (
+    ArchivedOrderItem, ItemCoPurchase, Job, OrderItem, ShopItem, ShopItemCategory, shop_item_category_association
+)
+
+logger = logging.getLogger(__name__)
+
+PURGE_ITEM_JOB = "purge_item"
+PURGE_CATEGORY_JOB = "purge_category"
+
+association = shop_item_category_association
+co_purchases_table = ItemCoPurchase.__table__
+
+# Rows removed before the purged row: (table, column holding the purged ID, the rest of the key)
+_ITEM_DEPENDENTS = [
+    (association, association.c.shop_item_id, association.c.category_id),
+    (co_purchases_table, co_purchases_table.c.item_id, co_purchases_table.c.related_item_id),
+    (co_purchases_table, co_purchases_table.c.related_item_id, co_purchases_table.c.item_id),
+]
+_CATEGORY_DEPENDENTS = [
+    (association, association.c.category_id, association.c.shop_item_id),
+]
+
+def purge_item(db: Session, item_id: int):
+    """Queue removing an item the caller has marked deleted; runs once the caller commits"""
+    enqueue(db, PURGE_ITEM_JOB, {"id": item_id, "removed": 0, "chunks": 0})
+
+def purge_category(db: Session, category_id: int):
+    """Queue removing a category the caller has marked deleted; runs once the caller commits"""
+    enqueue(db, PURGE_CATEGORY_JOB, {"id": category_id, "removed": 0, "chunks": 0})
+
+def _remove_dependents(db: Session, dependents, id: int, limit: int) -> int:
+    removed = 0
+    for table, key, rest in dependents:
+        if removed >= limit:
+            break
+        chunk = select(rest).where(key == id).limit(limit - removed)
+        removed += db.execute(table.delete().where(key == id, rest.in_(chunk))).rowcount
+    return removed
+
+def _delete_item(db: Session, item_id: int):
+    db.execute(ShopItem.__table__.delete().where(
+        ShopItem.id == item_id,
+        ShopItem.deleted_at.isnot(None),
+        ~exists().where(OrderItem.shop_item_id == item_id),
+        ~exists().where(ArchivedOrderItem.shop_item_id == item_id)
+    ))
+
+def _delete_category(db: Session, category_id: int):
+    db.execute(ShopItemCategory.__table__.delete().where(
+        ShopItemCategory.id == category_id,
+        ShopItemCategory.deleted_at.isnot(None)
+    ))
+
+def _purge(db: Session, kind: str, dependents, delete_row, payload: dict):
+    # One chunk per job, so each chunk is its own transaction
+    removed = _remove_dependents(db, dependents, payload["id"], config.PURGE_CHUNK_SIZE)
+    progress = {"id": payload["id"], "removed": payload["removed"] + removed, "chunks": payload["chunks"] + 1}
+    if removed >= config.PURGE_CHUNK_SIZE:
+        enqueue(db, kind, progress)
+        logger.info("Purging %s %s: %s rows removed in %s chunks", kind, progress["id"], progress["removed"], progress["chunks"])
+        return
+    delete_row(db, payload["id"])
+    logger.info("Purged %s %s: %s rows removed in %s chunks", kind, progress["id"], progress["removed"], progress["chunks"])
+
+@job_handler(PURGE_ITEM_JOB, batch_size=1)
+def purge_items(db: Session, payloads: List[dict]):
+    for payload in payloads:
+        _purge(db, PURGE_ITEM_JOB, _ITEM_DEPENDENTS, _delete_item, payload)
+
+@job_handler(PURGE_CATEGORY_JOB, batch_size=1)
+def purge_categories(db: Session, payloads: List[dict]):
+    for payload in payloads:
+        _purge(db, PURGE_CATEGORY_JOB, _CATEGORY_DEPENDENTS, _delete_category, payload)
+
+def purge_progress(db: Session) -> List[dict]:
+    """Purges still queued, running or failed, with the rows each has removed so far"""
+    entities = {PURGE_ITEM_JOB: ITEM, PURGE_CATEGORY_JOB: CATEGORY}
+    jobs = db.execute(
+        select(Job.kind, Job.payload, Job.status, Job.attempts, Job.last_error)
+        .where(Job.kind.in_(entities), Job.status != DONE)
+        .order_by(Job.id)
+    ).all()
+    return [
+        {
+            "entity": entities[kind],
+            "id": payload["id"],
+            "rows_removed": payload["removed"],
+            "chunks": payload["chunks"],
+            "status": status,
+            "attempts": attempts,
+            "last_error": last_error
+        }
+        for kind, payload, status, attempts, last_error in jobs
+    ]
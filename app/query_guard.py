@@ -0,0 +1,108 @@
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Per-route statement budgets keyed by endpoint function name, overriding config.QUERY_BUDGET
+ROUTE_QUERY_BUDGETS = {
+    "bulk_upsert": 1000,
+    "rebuild_related_items": 1000,
+    "archive_old_orders": 1000,
+}
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class RequestQueries:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.endpoint = None
+        self.count = 0
+        self.lazy_loads = Counter()
+
+    def repeated_lazy_loads(self, threshold: int):
+        return {relationship: count for relationship, count in self.lazy_loads.items() if count >= threshold}
+
+    def violations(self) -> list:
+        budget = ROUTE_QUERY_BUDGETS.get(self.endpoint, config.QUERY_BUDGET)
+        problems = []
+        if self.count > budget:
+            problems.append(f"{self.count} statements exceed the budget of {budget}")
+        for relationship, count in self.repeated_lazy_loads(config.N_PLUS_ONE_THRESHOLD).items():
+            problems.append(f"{relationship} lazy-loaded {count} times (N+1)")
+        return problems
+
+_current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+_observers_lock = threading.Lock()
+_observers = []
+
+@contextmanager
+def observe_requests():
+    """Collect the RequestQueries of every request that finishes inside the block"""
+    finished = []
+    with _observers_lock:
+        _observers.append(finished)
+    try:
+        yield finished
+    finally:
+        with _observers_lock:
+            _observers.remove(finished)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    queries = _current_queries.get()
+    if queries is not None:
+        queries.count += 1
+
+@event.listens_for(Session, "do_orm_execute")
+def _count_lazy_load(orm_execute_state):
+    queries = _current_queries.get()
+    if queries is not None and orm_execute_state.is_select and orm_execute_state.lazy_loaded_from is not None:
+        queries.lazy_loads[str(orm_execute_state.loader_strategy_path[-1])] += 1
+
+class QueryGuardMiddleware:
+    """Count the statements each request issues and flag N+1 lazy loading.
+
+    Violations are logged, or raised as QueryBudgetExceeded when
+    config.QUERY_GUARD_RAISE is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries(scope["method"], scope["path"])
+        token = _current_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_queries.reset(token)
+
+        # The router stores the matched endpoint in the scope
+        endpoint = scope.get("endpoint")
+        queries.endpoint = getattr(endpoint, "__name__", None)
+        with _observers_lock:
+            for finished in _observers:
+                finished.append(queries)
+
+        problems = queries.violations()
+        if problems:
+            message = f"{queries.method} {queries.path}: " + "; ".join(problems)
+            if config.QUERY_GUARD_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
\ No newline at end of file
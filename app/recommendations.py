@@ -0,0 +1,120 @@
+from collections import Counter
+from itertools import permutations
+from typing import Iterable, List
+from sqlalchemy import bindparam, select, func, union_all
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.jobs import PENDING, RUNNING, enqueue, job_handler
+from app.models.models import OrderItem, ArchivedOrderItem, ItemCoPurchase, Job, ShopItem
+
+# Related items kept per item by a full rebuild
+TOP_K = 20
+
+CO_PURCHASES_JOB = "co_purchases"
+
+co_purchases_table = ItemCoPurchase.__table__
+
+def record_co_purchases(db: Session, item_ids: Iterable[int], delta: int):
+    """Queue adding delta to the score of every pair of distinct items in one order.
+
+    The job commits with the caller's transaction and a worker applies it
+    afterwards, so order writes do not pay for the pairwise upserts.
+    """
+    item_ids = sorted(set(item_ids))
+    if len(item_ids) > 1:
+        enqueue(db, CO_PURCHASES_JOB, {"item_ids": item_ids, "delta": delta})
+
+def _pair_deltas(payloads: List[dict]) -> Counter:
+    scores = Counter()
+    for payload in payloads:
+        for pair in permutations(payload["item_ids"], 2):
+            scores[pair] += payload["delta"]
+    return scores
+
+def _apply_scores(db: Session, scores: Counter):
+    rows = [
+        {"item_id": item_id, "related_item_id": related_item_id, "score": delta}
+        for (item_id, related_item_id), delta in scores.items() if delta != 0
+    ]
+    if not rows:
+        return
+
+    # One statement executed for every pair, compiled once and cached
+    statement = insert(co_purchases_table)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["item_id", "related_item_id"],
+        set_={"score": co_purchases_table.c.score + statement.excluded.score}
+    ), rows)
+    # Pairs no longer bought together drop out of the index
+    lowered = [row for row in rows if row["score"] < 0]
+    if lowered:
+        db.execute(co_purchases_table.delete().where(
+            co_purchases_table.c.item_id == bindparam("item_id"),
+            co_purchases_table.c.related_item_id == bindparam("related_item_id"),
+            co_purchases_table.c.score <= 0
+        ), lowered)
+
+@job_handler(CO_PURCHASES_JOB, batch_size=200)
+def apply_co_purchases(db: Session, payloads: List[dict]):
+    """Apply the queued score changes of a batch of orders, each pair written once"""
+    _apply_scores(db, _pair_deltas(payloads))
+
+def rebuild_co_purchase_index(db: Session, top_k: int = TOP_K, batch_size: int = 1000) -> int:
+    """Recompute the top-K related items for every item from order history.
+
+    Items are processed in ID ranges of batch_size. Each range is scored
+    with one grouped self-join over hot and archived order lines and swapped
+    in with a single transaction, so readers never see an empty index.
+    Score changes still queued when a range is swapped in are for orders
+    the range already counted; they are subtracted in the same transaction,
+    so once workers apply them every order is counted exactly once.
+    """
+    order_lines = union_all(
+        select(OrderItem.order_id, OrderItem.shop_item_id),
+        select(ArchivedOrderItem.order_id, ArchivedOrderItem.shop_item_id)
+    ).subquery()
+    max_item_id = db.execute(select(func.max(ShopItem.id))).scalar() or 0
+
+    pairs = 0
+    for low in range(0, max_item_id + 1, batch_size):
+        high = low + batch_size
+        a = order_lines.alias("a")
+        b = order_lines.alias("b")
+        score = func.count(a.c.order_id.distinct())
+        scored = (
+            select(
+                a.c.shop_item_id.label("item_id"),
+                b.c.shop_item_id.label("related_item_id"),
+                score.label("score"),
+                func.row_number().over(
+                    partition_by=a.c.shop_item_id,
+                    order_by=(score.desc(), b.c.shop_item_id)
+                ).label("rank")
+            )
+            .join(b, (a.c.order_id == b.c.order_id) & (a.c.shop_item_id != b.c.shop_item_id))
+            .where(a.c.shop_item_id >= low, a.c.shop_item_id < high)
+            .group_by(a.c.shop_item_id, b.c.shop_item_id)
+            .subquery()
+        )
+
+        db.execute(co_purchases_table.delete().where(
+            co_purchases_table.c.item_id >= low, co_purchases_table.c.item_id < high
+        ))
+        result = db.execute(co_purchases_table.insert().from_select(
+            ["item_id", "related_item_id", "score"],
+            select(scored.c.item_id, scored.c.related_item_id, scored.c.score).where(scored.c.rank <= top_k)
+        ))
+        # Read under the range's write lock: no job can be queued or finished in between
+        queued = db.execute(
+            select(Job.payload).where(Job.kind == CO_PURCHASES_JOB, Job.status.in_((PENDING, RUNNING)))
+        ).scalars().all()
+        _apply_scores(db, Counter({
+            (item_id, related_item_id): -delta
+            for (item_id, related_item_id), delta in _pair_deltas(queued).items()
+            if low <= item_id < high
+        }))
+        db.commit()
+        pairs += result.rowcount
+
+    return pairs
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
+from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
+
+from app import config
+from app.archive import archive_orders
+from app.backup import backup_database, vacuum_snapshot
+from app.changes import compact_changes
+from app.database import get_db
+from app.jobs import job_metrics
+from app.profiling import recent_profiles, get_profile
+from app.purge import purge_progress
+from app.recommendations import rebuild_co_purchase_index, TOP_K
+from app.routing import ShopRoute
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not config.ADMIN_TOKEN or x_admin_token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+router = APIRouter(route_class=ShopRoute, dependencies=[Depends(require_admin)])
+
+# One backup at a time per process
+_backup_lock = threading.Lock()
+
+def _find_profile(profile_id: int):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@router.get("/profiles", response_model=List[dict])
+def read_profiles():
+    return [profile.summary() for profile in reversed(recent_profiles())]
+
+@router.get("/profiles/{profile_id}", response_model=dict)
+def read_profile(profile_id: int):
+    profile = _find_profile(profile_id)
+    queries = [{"statement": statement, "duration_ms": round(duration, 3)} for statement, duration in profile.queries]
+    return {**profile.summary(), "queries": queries}
+
+@router.get("/profiles/{profile_id}/pstats")
+def download_pstats(profile_id: int):
+    profile = _find_profile(profile_id)
+    if profile.pstats_data is None:
+        raise HTTPException(status_code=404, detail="No Python profile recorded for this request")
+    # Load with pstats.Stats("<file>") or snakeviz
+    return Response(
+        content=profile.pstats_data,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'}
+    )
+
+@router.get("/profiles/{profile_id}/speedscope", response_model=dict)
+def download_speedscope(profile_id: int):
+    profile = _find_profile(profile_id)
+    # Open at https://www.speedscope.app
+    return profile.speedscope()
+
+@router.get("/jobs", response_model=dict)
+def read_job_metrics(db: Session = Depends(get_db)):
+    # Depth, lag, throughput and latency of the background job queue per kind
+    return job_metrics(db)
+
+@router.get("/purges", response_model=dict)
+def read_purges(db: Session = Depends(get_db)):
+    # Deleted items and categories whose rows are still being removed, with progress so far
+    return {"purges": purge_progress(db)}
+
+@router.post("/orders/archive", response_model=dict)
+def archive_old_orders(before: datetime, batch_size: int = Query(500, ge=1), db: Session = Depends(get_db)):
+    archived = archive_orders(db, before, batch_size)
+    return {"archived": archived}
+
+@router.post("/changes/compact", response_model=dict)
+def compact_change_feed(before_seq: Optional[int] = None, db: Session = Depends(get_db)):
+    removed = compact_changes(db, before_seq)
+    return {"removed": removed}
+
+@router.post("/items/related/rebuild", response_model=dict)
+def rebuild_related_items(top_k: int = Query(TOP_K, ge=1), batch_size: int = Query(1000, ge=1), db: Session = Depends(get_db)):
+    pairs = rebuild_co_purchase_index(db, top_k, batch_size)
+    return {"pairs": pairs}
+
+@router.post("/backup", response_model=dict)
+def create_backup(
+    mode: Literal["backup", "vacuum"] = "backup",
+    pages: Optional[int] = None,
+    sleep_ms: Optional[float] = None,
+    db: Session = Depends(get_db)
+):
+    source = db.get_bind().url.database
+    if not source or source == ":memory:":
+        raise HTTPException(status_code=400, detail="Database is not file based")
+    if pages is not None and pages <= 0:
+        raise HTTPException(status_code=400, detail="pages must be positive")
+    if not _backup_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A backup is already running")
+    
+    try:
+        if mode == "vacuum":
+            return vacuum_snapshot(source)
+        sleep = sleep_ms / 1000 if sleep_ms is not None else None
+        return backup_database(source, pages=pages, sleep=sleep)
+    finally:
+        _backup_lock.release()
\ No newline at end of file
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app import config
+from app.batch import EXCLUDED_PATHS, begin_atomic, dispatch, end_atomic
+from app.database import get_db
+from app.routing import ShopRoute
+from app.schemas import BatchRequest, BatchResponse
+
+router = APIRouter(route_class=ShopRoute)
+
+@router.post("/", response_model=BatchResponse)
+async def run_batch(batch: BatchRequest, request: Request, db: Session = Depends(get_db)):
+    if len(batch.requests) > config.BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"A batch may hold at most {config.BATCH_MAX_REQUESTS} requests")
+    for operation in batch.requests:
+        if not operation.path.startswith("/") or operation.path.partition("?")[0] in EXCLUDED_PATHS:
+            raise HTTPException(status_code=400, detail=f"Path {operation.path} cannot be batched")
+    
+    # The async endpoint keeps the event loop free while sub-requests run; blocking session calls go to the thread pool
+    results = []
+    if not batch.atomic:
+        for operation in batch.requests:
+            result = await dispatch(request, operation, db)
+            if result.status >= 400:
+                # Drop whatever the failed sub-request left uncommitted
+                await run_in_threadpool(db.rollback)
+            results.append(result)
+        return BatchResponse(responses=results)
+    
+    connection, session = await run_in_threadpool(begin_atomic, db)
+    failed = True
+    try:
+        for operation in batch.requests:
+            result = await dispatch(request, operation, session)
+            results.append(result)
+            if result.status >= 400:
+                break
+        else:
+            failed = False
+    finally:
+        await run_in_threadpool(end_atomic, connection, session, not failed)
+    return BatchResponse(responses=results, rolled_back=failed)
\ No newline at end of file
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app import config
+from app.catalog_snapshot import current_snapshot
+from app.database import get_db
+from app.routing import ShopRoute
+
+router = APIRouter(route_class=ShopRoute)
+
+# A versioned snapshot URL never changes content
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+@router.get("/snapshot")
+def read_catalog_snapshot(
+    version: Optional[int] = None,
+    accept_encoding: str = Header(""),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    snapshot = current_snapshot(db)
+    if version is not None and version != snapshot.version:
+        raise HTTPException(status_code=404, detail=f"Catalog snapshot version {version} is not available, the current version is {snapshot.version}")
+
+    encoding = snapshot.encoding_for(accept_encoding)
+    if version is not None:
+        cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        cache_control = f"public, max-age={config.CATALOG_SNAPSHOT_MAX_AGE}"
+    headers = {
+        "ETag": snapshot.etag(encoding),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+        "X-Catalog-Version": str(snapshot.version),
+    }
+    if if_none_match and snapshot.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=snapshot.encodings[encoding], media_type="application/json", headers=headers)
\ No newline at end of file
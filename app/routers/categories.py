@@ -1,36 +1,68 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List
 
+from app.changes import record_change, record_changes_from_select, CATEGORY, ITEM, CREATE, UPDATE, DELETE
 from app.database import get_db
-from app.models.models import ShopItemCategory as CategoryModel
-from app.schemas import ShopItemCategory, ShopItemCategoryCreate, ShopItemCategoryUpdate
+from app.facets import invalidate as invalidate_facets
+from app.loading import item_options
+from app.lookups import get_by_id
+from app.models.models import ShopItemCategory as CategoryModel, ShopItem as ItemModel, shop_item_category_association
+from app.purge import purge_category
+from app.routing import ShopRoute
+from app.schemas import ShopItemCategory, ShopItemCategoryCreate, ShopItemCategoryUpdate, ShopItem
 
-router = APIRouter()
+router = APIRouter(route_class=ShopRoute)
 
 @router.post("/", response_model=ShopItemCategory)
 def create_category(category: ShopItemCategoryCreate, db: Session = Depends(get_db)):
     db_category = CategoryModel(**category.model_dump())
     db.add(db_category)
+    db.flush()
+    record_change(db, CATEGORY, db_category.id, CREATE)
     db.commit()
     db.refresh(db_category)
     return db_category
 
 @router.get("/", response_model=List[ShopItemCategory])
 def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    categories = db.query(CategoryModel).offset(skip).limit(limit).all()
+    categories = db.query(CategoryModel).filter(CategoryModel.deleted_at.is_(None)).offset(skip).limit(limit).all()
     return categories
 
 @router.get("/{category_id}", response_model=ShopItemCategory)
 def read_category(category_id: int, db: Session = Depends(get_db)):
-    category = db.query(CategoryModel).filter(CategoryModel.id == category_id).first()
+    category = get_by_id(db, CategoryModel, category_id)
     if category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
 
+@router.get("/{category_id}/items", response_model=List[ShopItem])
+def read_category_items(category_id: int, after_id: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    category = get_by_id(db, CategoryModel, category_id)
+    if category is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    # Keyset pagination: pass the last item ID of the previous page as after_id
+    items = (
+        db.query(ItemModel)
+        .options(*item_options())
+        .join(shop_item_category_association, shop_item_category_association.c.shop_item_id == ItemModel.id)
+        .filter(
+            shop_item_category_association.c.category_id == category_id,
+            ItemModel.id > after_id,
+            ItemModel.deleted_at.is_(None)
+        )
+        .order_by(ItemModel.id)
+        .limit(limit)
+        .all()
+    )
+    return items
+
 @router.put("/{category_id}", response_model=ShopItemCategory)
 def update_category(category_id: int, category: ShopItemCategoryUpdate, db: Session = Depends(get_db)):
-    db_category = db.query(CategoryModel).filter(CategoryModel.id == category_id).first()
+    db_category = get_by_id(db, CategoryModel, category_id)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     
@@ -38,16 +70,23 @@ def update_category(category_id: int, category: ShopItemCategoryUpdate, db: Sess
     for field, value in category_data.items():
         setattr(db_category, field, value)
     
+    record_change(db, CATEGORY, category_id, UPDATE)
     db.commit()
     db.refresh(db_category)
     return db_category
 
 @router.delete("/{category_id}", response_model=dict)
 def delete_category(category_id: int, db: Session = Depends(get_db)):
-    category = db.query(CategoryModel).filter(CategoryModel.id == category_id).first()
+    category = get_by_id(db, CategoryModel, category_id)
     if category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    db.delete(category)
+    # Items lose this category now; the purge job removes the association rows later
+    item_ids = select(shop_item_category_association.c.shop_item_id).where(shop_item_category_association.c.category_id == category_id)
+    record_changes_from_select(db, ITEM, item_ids, UPDATE)
+    category.deleted_at = datetime.utcnow()
+    record_change(db, CATEGORY, category_id, DELETE)
+    purge_category(db, category_id)
     db.commit()
+    invalidate_facets()
     return {"message": "Category deleted successfully"}
\ No newline at end of file
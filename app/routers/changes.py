@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.changes import read_changes
+from app.database import get_db
+from app.routing import ShopRoute
+from app.schemas import ChangeFeed
+
+router = APIRouter(route_class=ShopRoute)
+
+@router.get("/", response_model=ChangeFeed)
+def read_change_feed(since: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
+    changes = read_changes(db, since, limit)
+    # Consumers pass next_since back as since to resume the feed
+    next_since = changes[-1].seq if changes else since
+    return ChangeFeed(changes=changes, next_since=next_since)
\ No newline at end of file
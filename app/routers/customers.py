@@ -1,15 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 
+from app.archive import customer_orders
+from app.bulk import bulk_upsert_customers
+from app.changes import record_change, CUSTOMER, CREATE, UPDATE, DELETE
 from app.database import get_db
+from app.idempotency import Idempotency, idempotency
+from app.lookups import get_by_id
 from app.models.models import Customer as CustomerModel
-from app.schemas import Customer, CustomerCreate, CustomerUpdate
+from app.routing import ShopRoute
+from app.schemas import Customer, CustomerCreate, CustomerUpdate, CustomerBulkResult, CustomerStats, Order
 
-router = APIRouter()
+router = APIRouter(route_class=ShopRoute)
 
 @router.post("/", response_model=Customer)
-def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
+def create_customer(customer: CustomerCreate, db: Session = Depends(get_db), idempotent: Idempotency = Depends(idempotency)):
+    replay = idempotent.begin(db, customer)
+    if replay is not None:
+        return replay
+    
     # Check if email already exists
     db_customer = db.query(CustomerModel).filter(CustomerModel.email == customer.email).first()
     if db_customer:
@@ -17,10 +27,17 @@ def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
     
     db_customer = CustomerModel(**customer.model_dump())
     db.add(db_customer)
+    db.flush()
+    record_change(db, CUSTOMER, db_customer.id, CREATE)
+    idempotent.save_instance(db, Customer, db_customer)
     db.commit()
     db.refresh(db_customer)
     return db_customer
 
+@router.post("/bulk", response_model=CustomerBulkResult)
+def bulk_upsert(customers: List[CustomerCreate], batch_size: int = Query(500, ge=1, le=5000), db: Session = Depends(get_db)):
+    return bulk_upsert_customers(db, customers, batch_size)
+
 @router.get("/", response_model=List[Customer])
 def read_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     customers = db.query(CustomerModel).offset(skip).limit(limit).all()
@@ -28,14 +45,37 @@ def read_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db
 
 @router.get("/{customer_id}", response_model=Customer)
 def read_customer(customer_id: int, db: Session = Depends(get_db)):
-    customer = db.query(CustomerModel).filter(CustomerModel.id == customer_id).first()
+    customer = get_by_id(db, CustomerModel, customer_id)
     if customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
     return customer
 
+@router.get("/{customer_id}/orders", response_model=List[Order])
+def read_customer_orders(customer_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    customer = get_by_id(db, CustomerModel, customer_id)
+    if customer is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Archived orders still count in the customer's stats, so the history lists them too
+    return customer_orders(db, customer_id, skip, limit)
+
+@router.get("/{customer_id}/stats", response_model=CustomerStats)
+def read_customer_stats(customer_id: int, db: Session = Depends(get_db)):
+    customer = get_by_id(db, CustomerModel, customer_id)
+    if customer is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Served from the aggregates maintained by the orders router
+    return CustomerStats(
+        customer_id=customer.id,
+        order_count=customer.order_count or 0,
+        total_spend=round(customer.total_spend or 0.0, 2),
+        last_order_id=customer.last_order_id
+    )
+
 @router.put("/{customer_id}", response_model=Customer)
 def update_customer(customer_id: int, customer: CustomerUpdate, db: Session = Depends(get_db)):
-    db_customer = db.query(CustomerModel).filter(CustomerModel.id == customer_id).first()
+    db_customer = get_by_id(db, CustomerModel, customer_id)
     if db_customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
     
@@ -49,16 +89,18 @@ def update_customer(customer_id: int, customer: CustomerUpdate, db: Session = De
     for field, value in customer_data.items():
         setattr(db_customer, field, value)
     
+    record_change(db, CUSTOMER, customer_id, UPDATE)
     db.commit()
     db.refresh(db_customer)
     return db_customer
 
 @router.delete("/{customer_id}", response_model=dict)
 def delete_customer(customer_id: int, db: Session = Depends(get_db)):
-    customer = db.query(CustomerModel).filter(CustomerModel.id == customer_id).first()
+    customer = get_by_id(db, CustomerModel, customer_id)
     if customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
     
     db.delete(customer)
+    record_change(db, CUSTOMER, customer_id, DELETE)
     db.commit()
     return {"message": "Customer deleted successfully"}
\ No newline at end of file
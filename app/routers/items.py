@@ -1,15 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 
+from app.bulk import bulk_update_items
+from app.catalog_engine import search_items
+from app.changes import record_change, record_changes, CATEGORY, ITEM, CREATE, UPDATE, DELETE
 from app.database import get_db
-from app.models.models import ShopItem as ItemModel, ShopItemCategory as CategoryModel
-from app.schemas import ShopItem, ShopItemCreate, ShopItemUpdate
+from app.facets import item_total, item_facets, invalidate as invalidate_facets
+from app.idempotency import Idempotency, idempotency
+from app.loading import item_options
+from app.lookups import get_by_id, get_by_ids
+from app.models.models import ShopItem as ItemModel, ShopItemCategory as CategoryModel, ItemCoPurchase
+from app.purge import purge_item
+from app.routing import ShopRoute
+from app.schemas import ShopItem, ShopItemCreate, ShopItemUpdate, ShopItemPage, ShopItemBulkUpdate, ShopItemBulkResult, ItemSort
 
-router = APIRouter()
+ITEM_LIST_INCLUDES = {"total", "facets"}
+
+router = APIRouter(route_class=ShopRoute)
+
+def _adjust_item_counts(db: Session, category_ids, delta: int):
+    # Keep the cached per-category item counts in step with association changes
+    if not category_ids:
+        return
+    db.query(CategoryModel).filter(CategoryModel.id.in_(category_ids)).update(
+        {CategoryModel.item_count: CategoryModel.item_count + delta},
+        synchronize_session=False
+    )
+    record_changes(db, CATEGORY, category_ids, UPDATE)
 
 @router.post("/", response_model=ShopItem)
-def create_item(item: ShopItemCreate, db: Session = Depends(get_db)):
+def create_item(item: ShopItemCreate, db: Session = Depends(get_db), idempotent: Idempotency = Depends(idempotency)):
+    replay = idempotent.begin(db, item)
+    if replay is not None:
+        return replay
+    
     item_data = item.model_dump()
     category_ids = item_data.pop("category_ids", [])
     
@@ -17,31 +43,107 @@ def create_item(item: ShopItemCreate, db: Session = Depends(get_db)):
     
     # Add categories if provided
     if category_ids:
-        categories = db.query(CategoryModel).filter(CategoryModel.id.in_(category_ids)).all()
+        categories = list(get_by_ids(db, CategoryModel, category_ids).values())
         if len(categories) != len(category_ids):
             raise HTTPException(status_code=400, detail="One or more categories not found")
         db_item.categories = categories
     
     db.add(db_item)
+    _adjust_item_counts(db, category_ids, 1)
+    db.flush()
+    record_change(db, ITEM, db_item.id, CREATE)
+    idempotent.save_instance(db, ShopItem, db_item, item_options())
     db.commit()
+    invalidate_facets()
     db.refresh(db_item)
     return db_item
 
-@router.get("/", response_model=List[ShopItem])
-def read_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    items = db.query(ItemModel).offset(skip).limit(limit).all()
-    return items
+@router.get("/", response_model=Union[List[ShopItem], ShopItemPage])
+def read_items(
+    skip: int = 0,
+    limit: int = 100,
+    include: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    category_id: Optional[List[int]] = Query(None),
+    sort: ItemSort = "id",
+    db: Session = Depends(get_db)
+):
+    # include=total,facets wraps the page with counts served from cached aggregates
+    includes = set(include.split(",")) if include else set()
+    if not includes <= ITEM_LIST_INCLUDES:
+        raise HTTPException(status_code=400, detail=f"Unknown include value, expected any of: {', '.join(sorted(ITEM_LIST_INCLUDES))}")
+    
+    # Items in any of the category_id categories; the total counts matches when filtering
+    filtered = min_price is not None or max_price is not None or bool(category_id)
+    items, matched = search_items(
+        db, min_price, max_price, category_id, sort, skip, limit,
+        count=filtered and "total" in includes
+    )
+    if not include:
+        return items
+    return ShopItemPage(
+        items=items,
+        total=(matched if filtered else item_total(db)) if "total" in includes else None,
+        facets=item_facets(db) if "facets" in includes else None
+    )
+
+@router.post("/bulk", response_model=ShopItemBulkResult)
+def bulk_update(update: ShopItemBulkUpdate, db: Session = Depends(get_db), idempotent: Idempotency = Depends(idempotency)):
+    replay = idempotent.begin(db, update)
+    if replay is not None:
+        return replay
+    
+    if update.item_ids is None and update.category_ids is None:
+        raise HTTPException(status_code=400, detail="Provide item_ids or category_ids to select items")
+    if update.price_mode is not None and update.price_value is None:
+        raise HTTPException(status_code=400, detail="price_value is required with price_mode")
+    
+    # Check that the categories being assigned or removed exist
+    category_ids = set(update.add_category_ids) | set(update.remove_category_ids)
+    if category_ids:
+        found = db.query(CategoryModel).filter(CategoryModel.id.in_(category_ids), CategoryModel.deleted_at.is_(None)).count()
+        if found != len(category_ids):
+            raise HTTPException(status_code=400, detail="One or more categories not found")
+    
+    result = bulk_update_items(db, update)
+    idempotent.save(db, result)
+    db.commit()
+    invalidate_facets()
+    return result
 
 @router.get("/{item_id}", response_model=ShopItem)
 def read_item(item_id: int, db: Session = Depends(get_db)):
-    item = db.query(ItemModel).filter(ItemModel.id == item_id).first()
+    item = get_by_id(db, ItemModel, item_id)
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return item
 
+@router.get("/{item_id}/related", response_model=List[ShopItem])
+def read_related_items(item_id: int, limit: int = 10, db: Session = Depends(get_db)):
+    item = get_by_id(db, ItemModel, item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    # Frequently bought together, served from the precomputed co-purchase index
+    related_items = (
+        db.query(ItemModel)
+        .options(*item_options())
+        .join(ItemCoPurchase, ItemCoPurchase.related_item_id == ItemModel.id)
+        .filter(ItemCoPurchase.item_id == item_id, ItemModel.deleted_at.is_(None))
+        .order_by(ItemCoPurchase.score.desc(), ItemCoPurchase.related_item_id)
+        .limit(limit)
+        .all()
+    )
+    return related_items
+
 @router.put("/{item_id}", response_model=ShopItem)
-def update_item(item_id: int, item: ShopItemUpdate, db: Session = Depends(get_db)):
-    db_item = db.query(ItemModel).filter(ItemModel.id == item_id).first()
+def update_item(item_id: int, item: ShopItemUpdate, db: Session = Depends(get_db), idempotent: Idempotency = Depends(idempotency)):
+    replay = idempotent.begin(db, item)
+    if replay is not None:
+        return replay
+    
+    db_item = get_by_id(db, ItemModel, item_id)
     if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     
@@ -54,21 +156,39 @@ def update_item(item_id: int, item: ShopItemUpdate, db: Session = Depends(get_db
     
     # Update categories if provided
     if category_ids is not None:
-        categories = db.query(CategoryModel).filter(CategoryModel.id.in_(category_ids)).all()
+        categories = list(get_by_ids(db, CategoryModel, category_ids).values())
         if len(categories) != len(category_ids):
             raise HTTPException(status_code=400, detail="One or more categories not found")
+        old_ids = {category.id for category in db_item.categories}
+        new_ids = {category.id for category in categories}
         db_item.categories = categories
+        _adjust_item_counts(db, new_ids - old_ids, 1)
+        _adjust_item_counts(db, old_ids - new_ids, -1)
     
+    record_change(db, ITEM, item_id, UPDATE)
+    idempotent.save_instance(db, ShopItem, db_item, item_options())
     db.commit()
+    invalidate_facets()
     db.refresh(db_item)
     return db_item
 
 @router.delete("/{item_id}", response_model=dict)
-def delete_item(item_id: int, db: Session = Depends(get_db)):
-    item = db.query(ItemModel).filter(ItemModel.id == item_id).first()
+def delete_item(item_id: int, db: Session = Depends(get_db), idempotent: Idempotency = Depends(idempotency)):
+    replay = idempotent.begin(db)
+    if replay is not None:
+        return replay
+    
+    item = get_by_id(db, ItemModel, item_id)
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    db.delete(item)
+    # Mark the item deleted and leave its links and scores to the purge job
+    _adjust_item_counts(db, [category.id for category in item.categories], -1)
+    item.deleted_at = datetime.utcnow()
+    record_change(db, ITEM, item_id, DELETE)
+    purge_item(db, item_id)
+    response = {"message": "Item deleted successfully"}
+    idempotent.save(db, response)
     db.commit()
-    return {"message": "Item deleted successfully"}
\ No newline at end of file
+    invalidate_facets()
+    return response
\ No newline at end of file
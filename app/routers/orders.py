@@ -1,29 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+from app.batch import after_commit
+from app.changes import record_change, ORDER, CREATE, UPDATE, DELETE
 from app.database import get_db
-from app.models.models import Order as OrderModel, OrderItem as OrderItemModel, Customer as CustomerModel, ShopItem as ItemModel
+from app.events import order_events, ORDER_CREATED, ORDER_UPDATED, ORDER_DELETED
+from app.idempotency import Idempotency, idempotency
+from app.loading import order_options, archived_order_options
+from app.lookups import get_by_id, get_by_ids
+from app.models.models import Order as OrderModel, OrderItem as OrderItemModel, Customer as CustomerModel, ShopItem as ItemModel, ArchivedOrder as ArchivedOrderModel
+from app.recommendations import record_co_purchases
+from app.routing import ShopRoute
 from app.schemas import Order, OrderCreate, OrderUpdate
+from app.stock import order_quantities, reserve_stock, release_stock
 
-router = APIRouter()
+router = APIRouter(route_class=ShopRoute)
+
+def _reserve_order_stock(db: Session, lines):
+    quantities = order_quantities(lines)
+    if any(quantity <= 0 for quantity in quantities.values()):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    if not reserve_stock(db, quantities):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Insufficient stock for one or more items")
+
+def _update_customer_stats(db: Session, customer_id: int, order_count: int, spend: float):
+    # Apply an order delta to the customer's lifetime aggregates
+    db.flush()
+    last_order_id = func.coalesce(
+        db.query(func.max(OrderModel.id)).filter(OrderModel.customer_id == customer_id).scalar_subquery(),
+        db.query(func.max(ArchivedOrderModel.id)).filter(ArchivedOrderModel.customer_id == customer_id).scalar_subquery()
+    )
+    db.query(CustomerModel).filter(CustomerModel.id == customer_id).update(
+        {
+            CustomerModel.order_count: CustomerModel.order_count + order_count,
+            CustomerModel.total_spend: CustomerModel.total_spend + spend,
+            CustomerModel.last_order_id: last_order_id,
+        },
+        synchronize_session=False
+    )
 
 @router.post("/", response_model=Order)
-def create_order(order: OrderCreate, db: Session = Depends(get_db)):
+def create_order(order: OrderCreate, db: Session = Depends(get_db), idempotent: Idempotency = Depends(idempotency)):
+    replay = idempotent.begin(db, order)
+    if replay is not None:
+        return replay
+    
     # Check if customer exists
-    customer = db.query(CustomerModel).filter(CustomerModel.id == order.customer_id).first()
+    customer = get_by_id(db, CustomerModel, order.customer_id)
     if not customer:
         raise HTTPException(status_code=400, detail="Customer not found")
     
+    # Load every ordered item with one query
+    shop_items = get_by_ids(db, ItemModel, [item_data.shop_item_id for item_data in order.items])
+    
     # Create order
     db_order = OrderModel(customer_id=order.customer_id)
     db.add(db_order)
     db.flush()  # Get the order ID
     
     # Create order items
+    total = 0.0
     for item_data in order.items:
         # Check if shop item exists
-        shop_item = db.query(ItemModel).filter(ItemModel.id == item_data.shop_item_id).first()
+        shop_item = shop_items.get(item_data.shop_item_id)
         if not shop_item:
             raise HTTPException(status_code=400, detail=f"Shop item with ID {item_data.shop_item_id} not found")
         
@@ -33,35 +78,79 @@ def create_order(order: OrderCreate, db: Session = Depends(get_db)):
             order_id=db_order.id
         )
         db.add(order_item)
+        total += shop_item.price * item_data.quantity
+    
+    _reserve_order_stock(db, [(item_data.shop_item_id, item_data.quantity) for item_data in order.items])
     
+    db_order.total = total
+    _update_customer_stats(db, order.customer_id, 1, total)
+    record_co_purchases(db, [item_data.shop_item_id for item_data in order.items], 1)
+    order_id = db_order.id
+    record_change(db, ORDER, order_id, CREATE)
+    response = idempotent.save_instance(db, Order, db_order, order_options())
     db.commit()
-    db.refresh(db_order)
-    return db_order
+    after_commit(db, order_events.publish, ORDER_CREATED, order_id, order.customer_id, {"total": total})
+    # The stored response already loaded the order
+    if response is not None:
+        return response
+    return db.query(OrderModel).options(*order_options()).filter(OrderModel.id == order_id).one()
 
 @router.get("/", response_model=List[Order])
 def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    orders = db.query(OrderModel).offset(skip).limit(limit).all()
+    orders = db.query(OrderModel).options(*order_options()).offset(skip).limit(limit).all()
     return orders
 
+@router.get("/events")
+async def stream_order_events(
+    customer_id: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None),
+    keepalive: float = Query(15.0, ge=1, le=300)
+):
+    # Resume from Last-Event-ID, which EventSource clients send on reconnect
+    subscription = order_events.subscribe(customer_id, last_event_id)
+    
+    async def event_stream():
+        try:
+            yield "retry: 1000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # Too far behind: close and let the client resume from its last event ID
+                    break
+                yield event.encode()
+        finally:
+            order_events.unsubscribe(subscription)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.get("/{order_id}", response_model=Order)
 def read_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+    order = get_by_id(db, OrderModel, order_id, order_options())
+    if order is None:
+        # Fall back to cold storage for archived orders
+        order = get_by_id(db, ArchivedOrderModel, order_id, archived_order_options())
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 @router.put("/{order_id}", response_model=Order)
 def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(get_db)):
-    db_order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+    db_order = get_by_id(db, OrderModel, order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
     order_data = order.model_dump(exclude_unset=True)
     items_data = order_data.pop("items", None)
+    old_customer_id = db_order.customer_id
+    old_total = db_order.total or 0.0
     
     # Update customer if provided
     if "customer_id" in order_data:
-        customer = db.query(CustomerModel).filter(CustomerModel.id == order_data["customer_id"]).first()
+        customer = get_by_id(db, CustomerModel, order_data["customer_id"])
         if not customer:
             raise HTTPException(status_code=400, detail="Customer not found")
         db_order.customer_id = order_data["customer_id"]
@@ -69,11 +158,16 @@ def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(get_db
     # Update items if provided
     if items_data is not None:
         # Remove existing items
+        old_lines = db.query(OrderItemModel.shop_item_id, OrderItemModel.quantity).filter(OrderItemModel.order_id == order_id).all()
+        old_item_ids = [shop_item_id for shop_item_id, quantity in old_lines]
         db.query(OrderItemModel).filter(OrderItemModel.order_id == order_id).delete()
+        release_stock(db, order_quantities(old_lines))
         
         # Add new items
+        shop_items = get_by_ids(db, ItemModel, [item_data["shop_item_id"] for item_data in items_data])
+        total = 0.0
         for item_data in items_data:
-            shop_item = db.query(ItemModel).filter(ItemModel.id == item_data["shop_item_id"]).first()
+            shop_item = shop_items.get(item_data["shop_item_id"])
             if not shop_item:
                 raise HTTPException(status_code=400, detail=f"Shop item with ID {item_data['shop_item_id']} not found")
             
@@ -83,17 +177,37 @@ def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(get_db
                 order_id=order_id
             )
             db.add(order_item)
+            total += shop_item.price * item_data["quantity"]
+        _reserve_order_stock(db, [(item_data["shop_item_id"], item_data["quantity"]) for item_data in items_data])
+        db_order.total = total
+        record_co_purchases(db, old_item_ids, -1)
+        record_co_purchases(db, [item_data["shop_item_id"] for item_data in items_data], 1)
+    
+    # Move the order value between customers, or apply the change in value
+    if db_order.customer_id != old_customer_id:
+        _update_customer_stats(db, old_customer_id, -1, -old_total)
+        _update_customer_stats(db, db_order.customer_id, 1, db_order.total)
+    elif db_order.total != old_total:
+        _update_customer_stats(db, db_order.customer_id, 0, db_order.total - old_total)
     
+    record_change(db, ORDER, order_id, UPDATE)
     db.commit()
-    db.refresh(db_order)
+    db_order = db.query(OrderModel).options(*order_options()).filter(OrderModel.id == order_id).one()
+    after_commit(db, order_events.publish, ORDER_UPDATED, order_id, db_order.customer_id, {"total": db_order.total}, old_customer_id)
     return db_order
 
 @router.delete("/{order_id}", response_model=dict)
 def delete_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+    order = get_by_id(db, OrderModel, order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    customer_id = order.customer_id
+    record_co_purchases(db, [item.shop_item_id for item in order.items], -1)
+    release_stock(db, order_quantities((item.shop_item_id, item.quantity) for item in order.items))
     db.delete(order)
+    _update_customer_stats(db, customer_id, -1, -(order.total or 0.0))
+    record_change(db, ORDER, order_id, DELETE)
     db.commit()
+    after_commit(db, order_events.publish, ORDER_DELETED, order_id, customer_id)
     return {"message": "Order deleted successfully"}
\ No newline at end of file
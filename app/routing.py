@@ -0,0 +1,39 @@
+import asyncio
+import functools
+
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from app.negotiation import NegotiatedResponse, negotiate
+from app.profiling import profile_call
+
+class ShopRoute(APIRoute):
+    """Route class shared by all routers.
+
+    Sync endpoints are wrapped so per-request hooks such as the profiler run
+    in the worker thread that executes the endpoint. Every route accepts
+    MessagePack request bodies and negotiates MessagePack responses, see
+    app/negotiation.py.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        # include_router() builds a second route from this one's endpoint, so wrap only once
+        if not asyncio.iscoroutinefunction(endpoint) and not hasattr(endpoint, "__shop_route_wrapped__"):
+            original = endpoint
+
+            @functools.wraps(original)
+            def endpoint(*args, **kwargs):
+                return profile_call(original, *args, **kwargs)
+
+            endpoint.__shop_route_wrapped__ = True
+
+        # Routes left on the default JSON response negotiate it instead
+        response_class = kwargs.get("response_class")
+        if response_class is None or (isinstance(response_class, DefaultPlaceholder) and response_class.value is JSONResponse):
+            kwargs["response_class"] = Default(NegotiatedResponse)
+
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        return negotiate(super().get_route_handler())
\ No newline at end of file
@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 # Customer schemas
 class CustomerBase(BaseModel):
@@ -20,6 +21,17 @@ class Customer(CustomerBase):
     
     model_config = {"from_attributes": True}
 
+class CustomerBulkResult(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+
+class CustomerStats(BaseModel):
+    customer_id: int
+    order_count: int
+    total_spend: float
+    last_order_id: Optional[int] = None
+
 # ShopItemCategory schemas
 class ShopItemCategoryBase(BaseModel):
     title: str
@@ -34,6 +46,7 @@ class ShopItemCategoryUpdate(BaseModel):
 
 class ShopItemCategory(ShopItemCategoryBase):
     id: int
+    item_count: int = 0
     
     model_config = {"from_attributes": True}
 
@@ -42,6 +55,7 @@ class ShopItemBase(BaseModel):
     title: str
     description: str
     price: float
+    stock: Optional[int] = None
 
 class ShopItemCreate(ShopItemBase):
     category_ids: List[int] = []
@@ -50,6 +64,7 @@ class ShopItemUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     price: Optional[float] = None
+    stock: Optional[int] = None
     category_ids: Optional[List[int]] = None
 
 class ShopItem(ShopItemBase):
@@ -58,6 +73,44 @@ class ShopItem(ShopItemBase):
     
     model_config = {"from_attributes": True}
 
+class CategoryFacet(BaseModel):
+    category_id: int
+    title: str
+    count: int
+
+class PriceBucket(BaseModel):
+    min: float
+    max: Optional[float] = None
+    count: int
+
+class ShopItemFacets(BaseModel):
+    categories: List[CategoryFacet] = []
+    price: List[PriceBucket] = []
+
+# Item list orders; a leading "-" sorts descending, ties are broken by ascending ID
+ItemSort = Literal["id", "-id", "price", "-price"]
+
+class ShopItemPage(BaseModel):
+    items: List[ShopItem] = []
+    total: Optional[int] = None
+    facets: Optional[ShopItemFacets] = None
+
+class ShopItemBulkUpdate(BaseModel):
+    # Target items by ID and/or by membership in any of the given categories
+    item_ids: Optional[List[int]] = None
+    category_ids: Optional[List[int]] = None
+    # "absolute" sets the price, "percentage" changes it by price_value percent
+    price_mode: Optional[Literal["absolute", "percentage"]] = None
+    price_value: Optional[float] = None
+    add_category_ids: List[int] = []
+    remove_category_ids: List[int] = []
+
+class ShopItemBulkResult(BaseModel):
+    matched: int
+    prices_updated: int
+    categories_added: int
+    categories_removed: int
+
 # OrderItem schemas
 class OrderItemBase(BaseModel):
     shop_item_id: int
@@ -85,7 +138,43 @@ class OrderUpdate(BaseModel):
 
 class Order(OrderBase):
     id: int
+    created_at: Optional[datetime] = None
     customer: Customer
     items: List[OrderItem] = []
     
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+# Change feed schemas
+class ChangeLogEntry(BaseModel):
+    seq: int
+    entity_type: str
+    entity_id: int
+    operation: str
+    changed_at: datetime
+    
+    model_config = {"from_attributes": True}
+
+class ChangeFeed(BaseModel):
+    changes: List[ChangeLogEntry] = []
+    next_since: int
+
+# Batch schemas
+class BatchOperation(BaseModel):
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"]
+    # Path of an existing route, with an optional query string
+    path: str
+    body: Optional[Any] = None
+    headers: Dict[str, str] = {}
+
+class BatchRequest(BaseModel):
+    requests: List[BatchOperation]
+    # All sub-requests commit together, or none do
+    atomic: bool = False
+
+class BatchResult(BaseModel):
+    status: int
+    body: Optional[Any] = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResult] = []
+    rolled_back: bool = False
\ No newline at end of file
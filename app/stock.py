@@ -0,0 +1,59 @@
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+from sqlalchemy import case, select
+from sqlalchemy.orm import Session
+
+from app.changes import record_changes_from_select, ITEM, UPDATE
+from app.models.models import ShopItem
+
+def order_quantities(lines: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """Sum (shop_item_id, quantity) order lines per item"""
+    quantities = defaultdict(int)
+    for shop_item_id, quantity in lines:
+        quantities[shop_item_id] += quantity
+    return dict(quantities)
+
+def _record_stock_changes(db: Session, quantities: Dict[int, int]):
+    # Items with untracked stock (NULL) were left unchanged
+    changed = select(ShopItem.id).where(ShopItem.id.in_(quantities), ShopItem.stock.isnot(None))
+    record_changes_from_select(db, ITEM, changed, UPDATE)
+
+def reserve_stock(db: Session, quantities: Dict[int, int]) -> bool:
+    """Take stock for every line of an order in one conditional UPDATE.
+
+    The WHERE clause only matches items with enough stock (or untracked
+    stock), so concurrent orders can never drive stock below zero and no
+    value is read back into Python first. Returns False if any item is
+    short; the caller must then roll back to undo the other lines. Items
+    whose stock changed get an UPDATE entry in the change log.
+    """
+    if not quantities:
+        return True
+
+    needed = case(quantities, value=ShopItem.id)
+    reserved = db.query(ShopItem).filter(
+        ShopItem.id.in_(quantities),
+        (ShopItem.stock.is_(None)) | (ShopItem.stock >= needed)
+    ).update(
+        {ShopItem.stock: ShopItem.stock - needed},
+        synchronize_session=False
+    )
+    if reserved != len(quantities):
+        return False
+    _record_stock_changes(db, quantities)
+    return True
+
+def release_stock(db: Session, quantities: Dict[int, int]):
+    """Return previously reserved stock, e.g. when an order is changed or deleted"""
+    if not quantities:
+        return
+
+    released = db.query(ShopItem).filter(
+        ShopItem.id.in_(quantities),
+        ShopItem.stock.isnot(None)
+    ).update(
+        {ShopItem.stock: ShopItem.stock + case(quantities, value=ShopItem.id)},
+        synchronize_session=False
+    )
+    if released:
+        _record_stock_changes(db, quantities)
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""Backup benchmark: write latency while an online backup or VACUUM INTO runs.
+
+Fills a temporary database (migrated, so in WAL mode), keeps a writer
+committing small transactions, and compares its commit latency with no
+backup running, during an online backup and during a VACUUM INTO snapshot.
+
+    python -m benchmarks.bench_backup --rows 200000 --write-interval-ms 5
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+
+from app.backup import backup_database, vacuum_snapshot
+from app.migrations import migrate
+
+def _writer(path: str, interval: float, stop: threading.Event, latencies: list):
+    connection = sqlite3.connect(path, timeout=30)
+    sequence = 0
+    while not stop.wait(interval):
+        sequence += 1
+        started = time.perf_counter()
+        connection.execute(
+            "INSERT INTO customers (name, surname, email, order_count, total_spend) VALUES (?, ?, ?, 0, 0)",
+            ("Writer", "Bench", f"writer-{sequence}-{time.time_ns()}@example.com")
+        )
+        connection.commit()
+        latencies.append((time.perf_counter() - started) * 1000)
+    connection.close()
+
+def _measure(path: str, interval: float, action):
+    latencies = []
+    stop = threading.Event()
+    writer = threading.Thread(target=_writer, args=(path, interval, stop, latencies))
+    writer.start()
+    try:
+        result = action()
+    finally:
+        stop.set()
+        writer.join()
+    return result, latencies
+
+def _describe(name: str, latencies: list) -> str:
+    if not latencies:
+        return f"{name:<10} no commits"
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (
+        f"{name:<10} commits {len(ordered):>5}  p50 {statistics.median(ordered):7.2f} ms  "
+        f"p95 {p95:7.2f} ms  max {ordered[-1]:7.2f} ms"
+    )
+
+def run(rows: int, write_interval_ms: float, pages: int, sleep_ms: float):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench_backup.db")
+    migrate(create_engine(f"sqlite:///{path}"))
+    connection = sqlite3.connect(path)
+    connection.executemany(
+        "INSERT INTO customers (name, surname, email, order_count, total_spend) VALUES (?, ?, ?, 0, 0)",
+        ((f"Name{i}", f"Surname{i}", f"customer{i}@example.com") for i in range(rows))
+    )
+    connection.commit()
+    connection.close()
+    interval = write_interval_ms / 1000
+
+    _, idle = _measure(path, interval, lambda: time.sleep(1))
+    backup, during_backup = _measure(path, interval, lambda: backup_database(
+        path, os.path.join(directory, "backup.db"), pages=pages, sleep=sleep_ms / 1000
+    ))
+    snapshot, during_vacuum = _measure(path, interval, lambda: vacuum_snapshot(
+        path, os.path.join(directory, "snapshot.db")
+    ))
+
+    print(f"database:  {os.path.getsize(path) / 1e6:.1f} MB, {rows} rows, journal mode {backup['journal_mode']}")
+    print(f"backup:    {backup['duration_ms']:.0f} ms, {backup['steps']} steps, "
+          f"{backup['restarts']} restarts, single step fallback {backup['single_step']}")
+    print(f"vacuum:    {snapshot['duration_ms']:.0f} ms, {snapshot['bytes'] / 1e6:.1f} MB")
+    print(_describe("idle", idle))
+    print(_describe("backup", during_backup))
+    print(_describe("vacuum", during_vacuum))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--write-interval-ms", type=float, default=5)
+    parser.add_argument("--pages", type=int, default=256)
+    parser.add_argument("--sleep-ms", type=float, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.write_interval_ms, args.pages, args.sleep_ms)
@@ -0,0 +1,112 @@
+"""Page loads as sequential API calls against one POST /batch.
+
+Fills a temporary database with customers, categories and items, then times the
+calls a storefront page makes (the customer, their orders, a few items and
+the categories) sent one by one, and the same calls sent as one batch.
+Requests go over a real socket to a uvicorn server, so the per-call HTTP
+cost the batch saves is included.
+
+    python -m benchmarks.bench_batch --pages 200 --items 5
+"""
+import argparse
+import os
+import random
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import Request
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import get_db, request_session
+from app.main import app
+from app.migrations import migrate
+from app.models.models import Customer, ShopItem, ShopItemCategory
+
+def seed(SessionLocal, customers: int, items: int):
+    with SessionLocal() as db:
+        db.execute(insert(ShopItemCategory), [{"title": f"Category {i}", "description": "Category"} for i in range(20)])
+        db.execute(insert(Customer), [
+            {"name": f"Name {i}", "surname": "Customer", "email": f"customer{i}@example.com"} for i in range(customers)
+        ])
+        db.execute(insert(ShopItem), [
+            {"title": f"Item {i}", "description": "Item", "price": round(random.uniform(1, 500), 2)} for i in range(items)
+        ])
+        db.commit()
+
+def median_ms(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def run(pages: int, items_per_page: int, customers: int, items: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_batch.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(SessionLocal, customers, items)
+
+    opened = []
+
+    def open_session():
+        opened.append(1)
+        return SessionLocal()
+
+    def override_get_db(request: Request):
+        yield from request_session(request, open_session)
+
+    app.dependency_overrides[get_db] = override_get_db
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            def page_calls():
+                customer_id = random.randint(1, customers)
+                calls = [f"/customers/{customer_id}", f"/customers/{customer_id}/orders", "/categories/"]
+                return calls + [f"/items/{random.randint(1, items)}" for _ in range(items_per_page)]
+
+            def sequential():
+                for call in page_calls():
+                    client.get(call).raise_for_status()
+
+            def batched():
+                requests = [{"method": "GET", "path": call} for call in page_calls()]
+                client.post("/batch/", json={"requests": requests}).raise_for_status()
+
+            calls = len(page_calls())
+            print(f"pages: {pages}, calls per page: {calls}")
+            for label, func in (("sequential calls", sequential), ("one batch", batched)):
+                opened.clear()
+                elapsed = median_ms(func, pages)
+                print(f"{label:<20} {elapsed:8.2f} ms per page, {len(opened) / pages:5.1f} sessions per page")
+    finally:
+        server.should_exit = True
+        thread.join()
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--items", type=int, default=5, help="item lookups per page")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--catalog", type=int, default=5000, help="items in the catalog")
+    args = parser.parse_args()
+    run(args.pages, args.items, args.customers, args.catalog)
@@ -0,0 +1,95 @@
+"""Item list filtering and sorting: SQL against the columnar catalog engine.
+
+Fills a temporary database with items spread over categories, then times
+search_items with each backend for a few storefront queries, and the time
+the snapshot needs to catch up after a single item write.
+
+    python -m benchmarks.bench_catalog --items 100000 --categories 50 --runs 20
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import config
+from app.catalog_engine import catalog_engine, search_items
+from app.changes import ITEM, UPDATE, record_change
+from app.migrations import migrate
+from app.models.models import ShopItem, ShopItemCategory, shop_item_category_association
+
+def seed(SessionLocal, items: int, categories: int):
+    with SessionLocal() as db:
+        db.execute(insert(ShopItemCategory), [{"title": f"Category {i}", "description": "Category"} for i in range(categories)])
+        db.execute(insert(ShopItem), [
+            {"title": f"Item {i}", "description": "Item", "price": round(random.uniform(1, 2000), 2)}
+            for i in range(items)
+        ])
+        db.execute(insert(shop_item_category_association), [
+            {"shop_item_id": item_id, "category_id": category_id}
+            for item_id in range(1, items + 1)
+            for category_id in random.sample(range(1, categories + 1), 2)
+        ])
+        db.commit()
+
+def median_ms(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(items: int, categories: int, runs: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_catalog.db")
+    engine = create_engine(f"sqlite:///{path}")
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(SessionLocal, items, categories)
+
+    queries = {
+        "price range, by price": dict(min_price=100, max_price=300, sort="price"),
+        "2 categories, by -price": dict(category_ids=[1, 2], sort="-price"),
+        "category + range, page 10": dict(category_ids=[3], min_price=500, skip=1000),
+        "everything, by price": dict(sort="price"),
+    }
+    print(f"items: {items}, categories: {categories}, page size: 100, median of {runs} runs")
+    print(f"{'query':<28} {'sql ms':>8} {'engine ms':>10} {'matches':>8}")
+    with SessionLocal() as db:
+        config.CATALOG_ENGINE = True
+        started = time.perf_counter()
+        catalog_engine(db).current(db)
+        print(f"{'snapshot build':<28} {'':>8} {(time.perf_counter() - started) * 1000:>10.1f}")
+
+        for label, params in queries.items():
+            config.CATALOG_ENGINE = False
+            sql_items, total = search_items(db, count=True, **params)
+            sql_ms = median_ms(lambda: search_items(db, count=True, **params), runs)
+            config.CATALOG_ENGINE = True
+            engine_items, engine_total = search_items(db, count=True, **params)
+            assert [item.id for item in engine_items] == [item.id for item in sql_items] and engine_total == total
+            engine_ms = median_ms(lambda: search_items(db, count=True, **params), runs)
+            db.expunge_all()
+            print(f"{label:<28} {sql_ms:>8.2f} {engine_ms:>10.2f} {total:>8}")
+
+        def write_and_refresh():
+            item = db.get(ShopItem, random.randint(1, items))
+            item.price = round(random.uniform(1, 2000), 2)
+            record_change(db, ITEM, item.id, UPDATE)
+            db.commit()
+            catalog_engine(db).current(db)
+
+        print(f"{'refresh after 1 write':<28} {'':>8} {median_ms(write_and_refresh, runs):>10.2f}")
+    engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    run(args.items, args.categories, args.runs)
@@ -0,0 +1,111 @@
+"""Full catalog download: paging through GET /items/ against GET /catalog/snapshot.
+
+Fills a temporary database with items spread over categories, then times
+a client fetching every item page by page, the prebuilt snapshot in each
+encoding, an ETag revalidation, and the rebuild after an item write.
+
+    python -m benchmarks.bench_catalog_snapshot --items 20000 --categories 50 --runs 20
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.catalog_snapshot import _import_brotli, wait_for_rebuilds
+from app.database import get_db
+from app.main import app
+from app.migrations import migrate
+from app.models.models import ShopItem, ShopItemCategory, shop_item_category_association
+
+def seed(SessionLocal, items: int, categories: int):
+    with SessionLocal() as db:
+        db.execute(insert(ShopItemCategory), [{"title": f"Category {i}", "description": "Category"} for i in range(categories)])
+        db.execute(insert(ShopItem), [
+            {"title": f"Item {i}", "description": "A reasonably descriptive item description", "price": round(random.uniform(1, 2000), 2)}
+            for i in range(items)
+        ])
+        db.execute(insert(shop_item_category_association), [
+            {"shop_item_id": item_id, "category_id": category_id}
+            for item_id in range(1, items + 1)
+            for category_id in random.sample(range(1, categories + 1), 2)
+        ])
+        db.commit()
+
+def median_ms(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(items: int, categories: int, runs: int, page_size: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_catalog_snapshot.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(SessionLocal, items, categories)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            def paged():
+                size = 0
+                for skip in range(0, items, page_size):
+                    size += len(client.get("/items/", params={"skip": skip, "limit": page_size}, headers={"Accept-Encoding": "identity"}).content)
+                return size
+
+            def snapshot(encoding: str):
+                # Raw bytes as sent, without the client decoding them
+                with client.stream("GET", "/catalog/snapshot", headers={"Accept-Encoding": encoding}) as response:
+                    return response.headers, len(b"".join(response.iter_raw()))
+
+            print(f"items: {items}, categories: {categories}, median of {runs} runs")
+            print(f"{'download':<32} {'bytes':>10} {'ms':>9}")
+            started = time.perf_counter()
+            headers, size = snapshot("identity")
+            print(f"{'first request (build)':<32} {size:>10} {(time.perf_counter() - started) * 1000:>9.1f}")
+            print(f"{f'GET /items/ in pages of {page_size}':<32} {paged():>10} {median_ms(paged, max(runs // 10, 1)):>9.1f}")
+            encodings = ["identity", "gzip"] + (["br"] if _import_brotli() is not None else [])
+            for encoding in encodings:
+                size = snapshot(encoding)[1]
+                print(f"{f'snapshot, {encoding}':<32} {size:>10} {median_ms(lambda: snapshot(encoding), runs):>9.2f}")
+            etag = {"If-None-Match": headers["etag"]}
+            print(f"{'snapshot, 304 revalidation':<32} {0:>10} {median_ms(lambda: client.get('/catalog/snapshot', headers=etag), runs):>9.2f}")
+
+            # The first request after a write is served the previous version while the rebuild runs in the background
+            first, rebuilt = [], []
+            for _ in range(max(runs // 4, 1)):
+                client.put(f"/items/{random.randint(1, items)}", json={"price": round(random.uniform(1, 2000), 2)})
+                started = time.perf_counter()
+                snapshot("identity")
+                first.append((time.perf_counter() - started) * 1000)
+                wait_for_rebuilds()
+                rebuilt.append((time.perf_counter() - started) * 1000)
+            print(f"{'first request after 1 write':<32} {'':>10} {statistics.median(first):>9.2f}")
+            print(f"{'new version ready after 1 write':<32} {'':>10} {statistics.median(rebuilt):>9.1f}")
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    run(args.items, args.categories, args.runs, args.page_size)
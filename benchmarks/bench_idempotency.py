@@ -0,0 +1,84 @@
+"""Idempotency-Key cost and retry storms on POST /orders/.
+
+Times creating orders without a key, with a fresh key per order (the cost
+of claiming and storing the key) and replaying a stored key, then sends
+bursts of concurrent retries of one order, as clients do after a timeout,
+and counts the orders they create.
+
+    python -m benchmarks.bench_idempotency --orders 500 --retries 16 --threads 8
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import get_db
+from app.main import app
+from app.migrations import migrate
+from app.models.models import Customer, Order, ShopItem
+
+def median_ms(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(orders: int, retries: int, threads: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_idempotency.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        db.add(Customer(name="Bench", surname="Customer", email="bench@example.com"))
+        db.add_all(ShopItem(title=f"Item {i}", description="Item", price=9.99) for i in range(5))
+        db.commit()
+    order_data = {"customer_id": 1, "items": [{"shop_item_id": item_id, "quantity": 1} for item_id in range(1, 6)]}
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def count_orders() -> int:
+        with SessionLocal() as db:
+            return db.execute(select(func.count(Order.id))).scalar()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            post = lambda headers=None: client.post("/orders/", json=order_data, headers=headers)
+            print(f"orders: {orders}, retries per burst: {retries}, threads: {threads}")
+            print(f"{'no key':<28} {median_ms(post, orders):8.2f} ms")
+            print(f"{'new key per order':<28} {median_ms(lambda: post({'Idempotency-Key': str(uuid.uuid4())}), orders):8.2f} ms")
+            post({"Idempotency-Key": "replayed"})
+            print(f"{'replay of a stored key':<28} {median_ms(lambda: post({'Idempotency-Key': 'replayed'}), orders):8.2f} ms")
+
+            for label, key in (("retry burst, no key", None), ("retry burst, one key", "burst")):
+                before = count_orders()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    statuses = list(executor.map(lambda _: post({"Idempotency-Key": key} if key else None).status_code, range(retries)))
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"{label:<28} {elapsed:8.2f} ms, {count_orders() - before} orders created, statuses {sorted(set(statuses))}")
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--retries", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    run(args.orders, args.retries, args.threads)
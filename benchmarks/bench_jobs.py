@@ -0,0 +1,75 @@
+"""Background job benchmark for the co-purchase index.
+
+Times the order write path with the co-purchase scores applied inline, as
+before the job queue, against queueing the update as a job, then how fast
+a worker pool drains the queued jobs and how far behind it was.
+
+    python -m benchmarks.bench_jobs --orders 2000 --order-size 8 --workers 4
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.jobs import WorkerPool, job_metrics
+from app.migrations import migrate
+from app.models.models import ShopItem
+from app.recommendations import CO_PURCHASES_JOB, apply_co_purchases, record_co_purchases
+
+def write_orders(SessionLocal, orders, write) -> float:
+    # Median milliseconds per order transaction
+    timings = []
+    for item_ids in orders:
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            write(db, item_ids)
+            db.commit()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(items: int, orders: int, order_size: int, workers: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_jobs.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(ShopItem), [{"title": f"Item {i}", "description": "Item", "price": 1.0} for i in range(items)])
+        db.commit()
+    baskets = [random.sample(range(1, items + 1), order_size) for _ in range(orders)]
+
+    print(f"orders: {orders}, order size: {order_size}, workers: {workers}")
+    inline_ms = write_orders(SessionLocal, baskets, lambda db, item_ids: apply_co_purchases(db, [{"item_ids": item_ids, "delta": 1}]))
+    queued_ms = write_orders(SessionLocal, baskets, lambda db, item_ids: record_co_purchases(db, item_ids, 1))
+    print(f"{'order write, inline scores':<28} {inline_ms:8.3f} ms")
+    print(f"{'order write, queued job':<28} {queued_ms:8.3f} ms")
+
+    with SessionLocal() as db:
+        lag = job_metrics(db)["kinds"][CO_PURCHASES_JOB]["lag_seconds"]
+    pool = WorkerPool(SessionLocal, workers=workers, poll_seconds=0.01)
+    started = time.perf_counter()
+    pool.start()
+    while True:
+        with SessionLocal() as db:
+            metrics = job_metrics(db)["kinds"][CO_PURCHASES_JOB]
+        if metrics["done"] == orders:
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    pool.stop()
+    print(f"{'lag before draining':<28} {lag:8.3f} s")
+    print(f"{'drain':<28} {elapsed:8.3f} s, {orders / elapsed:.0f} jobs/s")
+    engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--order-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    run(args.items, args.orders, args.order_size, args.workers)
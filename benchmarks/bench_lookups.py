@@ -0,0 +1,82 @@
+"""Primary key lookup benchmark.
+
+Times looking up items by ID with the legacy query, through get_by_id in a
+fresh session per lookup (a miss), and through get_by_id again in the same
+session (an identity map hit), plus get_by_ids for a whole order's worth
+of items against one lookup per item.
+
+    python -m benchmarks.bench_lookups --items 1000 --lookups 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.lookups import get_by_id, get_by_ids
+from app.migrations import migrate
+from app.models.models import ShopItem
+
+def timed(label: str, lookups: int, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / lookups * 1e6:8.1f} us per lookup")
+
+def run(items: int, lookups: int, order_size: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_lookups.db")
+    engine = create_engine(f"sqlite:///{path}")
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        db.add_all(ShopItem(title=f"Item {i}", description="Item", price=1.0, stock=100) for i in range(items))
+        db.commit()
+
+    ids = [random.randint(1, items) for _ in range(lookups)]
+
+    def legacy_query():
+        for id in ids:
+            with SessionLocal() as db:
+                db.query(ShopItem).filter(ShopItem.id == id).first()
+
+    def cold_get_by_id():
+        for id in ids:
+            with SessionLocal() as db:
+                get_by_id(db, ShopItem, id)
+
+    def warm_get_by_id():
+        with SessionLocal() as db:
+            for id in ids:
+                get_by_id(db, ShopItem, id)
+
+    orders = [ids[i:i + order_size] for i in range(0, len(ids), order_size)]
+
+    def per_line():
+        for order in orders:
+            with SessionLocal() as db:
+                for id in order:
+                    get_by_id(db, ShopItem, id)
+
+    def batched():
+        for order in orders:
+            with SessionLocal() as db:
+                get_by_ids(db, ShopItem, order)
+
+    print(f"items: {items}, lookups: {lookups}, order size: {order_size}")
+    timed("query().filter().first()", lookups, legacy_query)
+    timed("get_by_id, new session", lookups, cold_get_by_id)
+    timed("get_by_id, same session", lookups, warm_get_by_id)
+    timed("order lines one by one", lookups, per_line)
+    timed("order lines with get_by_ids", lookups, batched)
+    engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--order-size", type=int, default=10)
+    args = parser.parse_args()
+    run(args.items, args.lookups, args.order_size)
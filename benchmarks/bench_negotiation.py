@@ -0,0 +1,99 @@
+"""MessagePack against JSON for large list responses.
+
+Fills a temporary database with orders and items, then fetches the order
+and item lists as JSON and as MessagePack and compares payload size, the
+time to encode the response content, the time for a client to decode it,
+and the whole request.
+
+    python -m benchmarks.bench_negotiation --orders 2000 --lines 5 --runs 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import msgpack
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import get_db
+from app.main import app
+from app.migrations import migrate
+from app.models.models import Customer, Order, OrderItem, ShopItem, ShopItemCategory
+
+def seed(SessionLocal, orders: int, lines: int):
+    with SessionLocal() as db:
+        categories = [ShopItemCategory(title=f"Category {i}", description="Category") for i in range(10)]
+        items = [
+            ShopItem(title=f"Item {i}", description="A reasonably descriptive item description", price=9.99, categories=random.sample(categories, 2))
+            for i in range(200)
+        ]
+        customers = [Customer(name="Bench", surname=str(i), email=f"bench{i}@example.com") for i in range(100)]
+        db.add_all(categories + items + customers)
+        db.flush()
+        for _ in range(orders):
+            order_items = [OrderItem(shop_item_id=random.choice(items).id, quantity=1) for _ in range(lines)]
+            db.add(Order(customer_id=random.choice(customers).id, total=9.99 * lines, items=order_items))
+        db.commit()
+
+def median_ms(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def compare(client: TestClient, path: str, limit: int, runs: int):
+    json_body = client.get(path, params={"limit": limit}).content
+    msgpack_body = client.get(path, params={"limit": limit}, headers={"Accept": "application/msgpack"}).content
+    content = json.loads(json_body)
+    assert msgpack.unpackb(msgpack_body) == content
+
+    # The same encoding as JSONResponse.render
+    json_encode = median_ms(lambda: json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8"), runs)
+    msgpack_encode = median_ms(lambda: msgpack.packb(content), runs)
+    json_decode = median_ms(lambda: json.loads(json_body), runs)
+    msgpack_decode = median_ms(lambda: msgpack.unpackb(msgpack_body), runs)
+    json_request = median_ms(lambda: client.get(path, params={"limit": limit}), runs)
+    msgpack_request = median_ms(lambda: client.get(path, params={"limit": limit}, headers={"Accept": "application/msgpack"}), runs)
+
+    print(f"{path} ({len(content)} rows)")
+    print(f"  {'':10} {'bytes':>10} {'encode ms':>10} {'decode ms':>10} {'request ms':>11}")
+    print(f"  {'json':10} {len(json_body):>10} {json_encode:>10.2f} {json_decode:>10.2f} {json_request:>11.1f}")
+    print(f"  {'msgpack':10} {len(msgpack_body):>10} {msgpack_encode:>10.2f} {msgpack_decode:>10.2f} {msgpack_request:>11.1f}")
+
+def run(orders: int, lines: int, runs: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_negotiation.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(SessionLocal, orders, lines)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            compare(client, "/orders/", orders, runs)
+            compare(client, "/items/", 200, runs)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    run(args.orders, args.lines, args.runs)
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""Deleting a large category and a much-ordered item: inline cascade against soft delete and chunked purge.
+
+Fills a temporary database with one category holding every item and one
+item on many order lines, then deletes both the way the API used to (ORM
+delete loading the collections, one transaction) and the way it does now
+(mark deleted, then the purge jobs in chunks). A writer thread commits small
+updates throughout and records how long its commits wait for the lock.
+
+    python -m benchmarks.bench_purge --items 20000 --order-lines 20000 --chunk-size 1000
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+
+from app import config
+from app.database import get_db, request_session
+from app.jobs import WorkerPool
+from app.main import app
+from app.migrations import migrate
+from app.models.models import Customer, Order, OrderItem, ShopItem, ShopItemCategory, shop_item_category_association
+
+def seed(SessionLocal, items: int, order_lines: int):
+    with SessionLocal() as db:
+        db.execute(insert(ShopItemCategory), [{"title": "Everything", "description": "Category"}])
+        db.execute(insert(ShopItem), [{"title": f"Item {i}", "description": "Item", "price": 9.99} for i in range(items)])
+        db.execute(insert(shop_item_category_association), [{"shop_item_id": i, "category_id": 1} for i in range(1, items + 1)])
+        db.execute(insert(Customer), [{"name": "Bench", "surname": "Customer", "email": "bench@example.com"}])
+        db.execute(insert(Order), [{"customer_id": 1, "total": 9.99} for _ in range(order_lines)])
+        # Item 2 is on every order
+        db.execute(insert(OrderItem), [{"order_id": i, "shop_item_id": 2, "quantity": 1} for i in range(1, order_lines + 1)])
+        db.commit()
+
+class Writer(threading.Thread):
+    """Commits one small update after another and keeps the slowest commit"""
+
+    def __init__(self, SessionLocal):
+        super().__init__(daemon=True)
+        self.SessionLocal = SessionLocal
+        self.stop = threading.Event()
+        self.worst_ms = 0.0
+        self.commits = 0
+
+    def run(self):
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            with self.SessionLocal() as db:
+                db.execute(update(Customer).where(Customer.id == 1).values(order_count=Customer.order_count + 1))
+                db.commit()
+            self.worst_ms = max(self.worst_ms, (time.perf_counter() - started) * 1000)
+            self.commits += 1
+            time.sleep(0.002)
+
+def inline_delete(SessionLocal):
+    # What the endpoints did before: load the collections and cascade in one transaction
+    with SessionLocal() as db:
+        category = db.get(ShopItemCategory, 1)
+        [item.id for item in category.shop_items]
+        db.delete(category)
+        db.commit()
+        item = db.get(ShopItem, 2)
+        db.delete(item)
+        db.commit()
+
+def run_mode(mode: str, items: int, order_lines: int):
+    path = os.path.join(tempfile.mkdtemp(), f"bench_purge_{mode}.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+    migrate(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed(SessionLocal, items, order_lines)
+
+    def override_get_db(request: Request):
+        yield from request_session(request, SessionLocal)
+
+    writer = Writer(SessionLocal)
+    writer.start()
+    time.sleep(0.1)
+    try:
+        if mode == "inline":
+            started = time.perf_counter()
+            inline_delete(SessionLocal)
+            response_ms = total_ms = (time.perf_counter() - started) * 1000
+            chunks = 1
+        else:
+            app.dependency_overrides[get_db] = override_get_db
+            with TestClient(app) as client:
+                started = time.perf_counter()
+                client.delete("/categories/1").raise_for_status()
+                client.delete("/items/2").raise_for_status()
+                response_ms = (time.perf_counter() - started) * 1000
+            pool = WorkerPool(SessionLocal, workers=0)
+            chunks = 0
+            while pool.run_once():
+                chunks += 1
+            total_ms = (time.perf_counter() - started) * 1000
+        time.sleep(0.1)
+    finally:
+        writer.stop.set()
+        writer.join()
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+    print(f"{mode:<8} {response_ms:>12.1f} {total_ms:>10.1f} {chunks:>7} {writer.worst_ms:>16.1f} {writer.commits:>8}")
+
+def run(items: int, order_lines: int, chunk_size: int):
+    config.PURGE_CHUNK_SIZE = chunk_size
+    print(f"items in the category: {items}, order lines of the item: {order_lines}, chunk size: {chunk_size}")
+    print(f"{'mode':<8} {'response ms':>12} {'total ms':>10} {'chunks':>7} {'worst commit ms':>16} {'commits':>8}")
+    for mode in ("inline", "purge"):
+        run_mode(mode, items, order_lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--order-lines", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.items, args.order_lines, args.chunk_size)
@@ -0,0 +1,65 @@
+"""Cold start benchmark: time from importing app.main to the app being ready.
+
+Each run is a fresh interpreter. The framework imports (FastAPI, SQLAlchemy,
+pydantic) are timed separately from the application's own import and
+startup, and the statements sent to the database during startup are counted.
+
+    python -m benchmarks.bench_startup --runs 20
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Runs in the child interpreter and prints its timings as JSON
+CHILD = """
+import json, time
+started = time.perf_counter()
+import fastapi, pydantic, sqlalchemy, sqlalchemy.orm, starlette.applications
+frameworks_done = time.perf_counter()
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+import asyncio
+import app.main
+
+async def start():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        pass
+
+imported = time.perf_counter()
+asyncio.run(start())
+ready = time.perf_counter()
+print(json.dumps({
+    "frameworks_ms": (frameworks_done - started) * 1000,
+    "import_ms": (imported - frameworks_done) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "statements": len(statements)
+}))
+"""
+
+def run(runs: int):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    def median(key):
+        return statistics.median(result[key] for result in results)
+
+    print(f"runs:                {runs}")
+    print(f"framework imports:   {median('frameworks_ms'):.1f} ms (median)")
+    print(f"app import:          {median('import_ms'):.1f} ms (median)")
+    print(f"app startup:         {median('startup_ms'):.1f} ms (median)")
+    print(f"import-to-ready:     {median('import_ms') + median('startup_ms'):.1f} ms (median, excluding frameworks)")
+    print(f"startup statements:  {max(result['statements'] for result in results)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    run(args.runs)
@@ -0,0 +1,64 @@
+"""Concurrency benchmark for stock reservation on a single hot item.
+
+Fires concurrent POST /orders/ requests for one item with limited stock and
+checks that exactly the available stock was sold.
+
+    python -m benchmarks.bench_stock --stock 500 --orders 2000 --threads 16
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, get_db
+from app.main import app
+
+def run(stock: int, orders: int, threads: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_stock.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        customer = {"name": "Bench", "surname": "Mark", "email": "bench@example.com"}
+        customer_id = client.post("/customers/", json=customer).json()["id"]
+        item = {"title": "Hot item", "description": "Hot item", "price": 1.0, "stock": stock, "category_ids": []}
+        item_id = client.post("/items/", json=item).json()["id"]
+        order = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]}
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            statuses = list(executor.map(lambda _: client.post("/orders/", json=order).status_code, range(orders)))
+        elapsed = time.perf_counter() - started
+
+        remaining = client.get(f"/items/{item_id}").json()["stock"]
+    app.dependency_overrides.pop(get_db, None)
+
+    sold = statuses.count(200)
+    print(f"requests:    {orders} on {threads} threads in {elapsed:.2f}s ({orders / elapsed:.0f} req/s)")
+    print(f"sold:        {sold} (stock {stock}, remaining {remaining})")
+    print(f"rejected:    {statuses.count(409)}")
+    print(f"errors:      {len(statuses) - sold - statuses.count(409)}")
+    assert sold == min(stock, orders) and remaining == stock - sold, "oversold or undersold"
+    print("no oversell")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    run(args.stock, args.orders, args.threads)
@@ -1,21 +1,22 @@
 import pytest
+from fastapi import Request
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.database import get_db, Base
+from contextlib import contextmanager
+from app.database import get_db, request_session, Base
+from app import catalog_engine, catalog_snapshot, config, facets
+from app.jobs import drain
+from app.query_guard import observe_requests
 
 # Create test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_shop.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+def override_get_db(request: Request):
+    yield from request_session(request, TestingSessionLocal)
 
 app.dependency_overrides[get_db] = override_get_db
 
@@ -25,5 +26,31 @@ def client():
     Base.metadata.create_all(bind=engine)
     with TestClient(app) as test_client:
         yield test_client
-    # Drop tables after test
-    Base.metadata.drop_all(bind=engine)
\ No newline at end of file
+    # Drop tables after test, once the caches (and background snapshot rebuilds) are done with them
+    facets.invalidate()
+    catalog_engine.invalidate()
+    catalog_snapshot.invalidate()
+    Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture(autouse=True)
+def strict_query_guard(monkeypatch):
+    # Fail any test whose requests break their query budget or lazy-load N+1
+    monkeypatch.setattr(config, "QUERY_GUARD_RAISE", True)
+
+@pytest.fixture
+def query_budget():
+    """Assert the requests made inside the block issue at most max_queries statements in total"""
+    @contextmanager
+    def budget(max_queries: int):
+        with observe_requests() as finished:
+            yield finished
+        issued = sum(request.count for request in finished)
+        assert issued <= max_queries, f"{issued} statements issued, budget is {max_queries}"
+    return budget
+
+@pytest.fixture
+def run_jobs():
+    """Run every due background job, as a worker would after the request"""
+    def run(now=None):
+        return drain(TestingSessionLocal, now)
+    return run
\ No newline at end of file
@@ -0,0 +1,73 @@
+import marshal
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    return "secret"
+
+def test_admin_requires_token(client: TestClient):
+    """Test that admin endpoints are closed without a configured token"""
+    response = client.get("/admin/profiles", headers=ADMIN_HEADERS)
+    assert response.status_code == 403
+
+def test_admin_rejects_wrong_token(client: TestClient, admin_token):
+    """Test that admin endpoints reject a wrong token"""
+    response = client.get("/admin/profiles", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+
+def test_maintenance_endpoints_require_token(client: TestClient, admin_token):
+    """Test that archiving, compaction and the related-items rebuild are admin only and gone from the public routers"""
+    maintenance = [
+        ("/orders/archive", {"before": "2000-01-01T00:00:00"}),
+        ("/changes/compact", {}),
+        ("/items/related/rebuild", {})
+    ]
+    for path, params in maintenance:
+        assert client.post(f"/admin{path}", params=params).status_code == 403
+        assert client.post(f"/admin{path}", params=params, headers={"X-Admin-Token": "wrong"}).status_code == 403
+        assert client.post(f"/admin{path}", params=params, headers=ADMIN_HEADERS).status_code == 200
+        assert client.post(path, params=params).status_code in (404, 405)
+
+def test_unprofiled_request(client: TestClient, admin_token):
+    """Test that requests without the profile header are not profiled"""
+    response = client.get("/orders/")
+    assert "x-profile-id" not in response.headers
+
+def test_profile_request(client: TestClient, admin_token):
+    """Test profiling a request and downloading the profile"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    
+    response = client.post("/orders/", json={"customer_id": customer_id, "items": []}, headers={"X-Profile": admin_token})
+    assert response.status_code == 200
+    profile_id = int(response.headers["x-profile-id"])
+    
+    profiles = client.get("/admin/profiles", headers=ADMIN_HEADERS).json()
+    assert profiles[0]["id"] == profile_id
+    assert profiles[0]["path"] == "/orders/"
+    assert profiles[0]["status_code"] == 200
+    
+    profile = client.get(f"/admin/profiles/{profile_id}", headers=ADMIN_HEADERS).json()
+    assert profile["query_count"] == len(profile["queries"]) > 0
+    assert any(query["statement"].startswith("INSERT INTO orders") for query in profile["queries"])
+    
+    response = client.get(f"/admin/profiles/{profile_id}/pstats", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    stats = marshal.loads(response.content)
+    assert any(function_name == "create_order" for filename, line, function_name in stats)
+    
+    speedscope = client.get(f"/admin/profiles/{profile_id}/speedscope", headers=ADMIN_HEADERS).json()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert len(speedscope["profiles"][0]["samples"]) == len(speedscope["profiles"][0]["weights"])
+
+def test_profile_not_found(client: TestClient, admin_token):
+    """Test downloading a non-existent profile"""
+    response = client.get("/admin/profiles/999999", headers=ADMIN_HEADERS)
+    assert response.status_code == 404
+    assert "Profile not found" in response.json()["detail"]
\ No newline at end of file
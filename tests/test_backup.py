@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.backup import CommitLatencyRecorder, backup_database
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+@pytest.fixture
+def backup_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(config, "BACKUP_DIR", str(tmp_path))
+    return tmp_path
+
+def count_customers(path) -> int:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT count(*) FROM customers").fetchone()[0]
+    finally:
+        connection.close()
+
+def test_backup_requires_admin(client: TestClient):
+    """Test that backups can only be started by an admin"""
+    response = client.post("/admin/backup")
+    assert response.status_code == 403
+
+def test_online_backup(client: TestClient, backup_dir):
+    """Test taking an online backup through the admin endpoint"""
+    client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"})
+    
+    response = client.post("/admin/backup", params={"pages": 1, "sleep_ms": 0}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["mode"] == "backup"
+    assert report["steps"] == report["pages"]
+    assert report["commit_latency"]["samples"] == 0
+    assert report["path"].startswith(str(backup_dir))
+    assert count_customers(report["path"]) == 1
+
+def test_vacuum_snapshot(client: TestClient, backup_dir):
+    """Test taking a compacted snapshot through the admin endpoint"""
+    client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"})
+    
+    response = client.post("/admin/backup", params={"mode": "vacuum"}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["mode"] == "vacuum"
+    assert report["bytes"] <= report["source_bytes"]
+    assert count_customers(report["path"]) == 1
+
+def test_backup_invalid_parameters(client: TestClient, backup_dir):
+    """Test backup parameter validation"""
+    response = client.post("/admin/backup", params={"mode": "copy"}, headers=ADMIN_HEADERS)
+    assert response.status_code == 422
+    response = client.post("/admin/backup", params={"pages": 0}, headers=ADMIN_HEADERS)
+    assert response.status_code == 400
+
+def test_backup_with_concurrent_writes(monkeypatch, tmp_path):
+    """Test that a backup restarted by writes falls back to a single step and stays consistent"""
+    monkeypatch.setattr(config, "BACKUP_MAX_RESTARTS", 0)
+    source = tmp_path / "source.db"
+    connection = sqlite3.connect(source, check_same_thread=False, timeout=30)
+    connection.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, email VARCHAR)")
+    connection.executemany("INSERT INTO customers (email) VALUES (?)", [(f"c{i}@example.com",) for i in range(5000)])
+    connection.commit()
+    
+    stop = threading.Event()
+    def write():
+        while not stop.wait(0.001):
+            connection.execute("INSERT INTO customers (email) VALUES ('writer@example.com')")
+            connection.commit()
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        report = backup_database(str(source), str(tmp_path / "backup.db"), pages=1, sleep=0.005)
+    finally:
+        stop.set()
+        writer.join()
+        connection.close()
+    
+    assert report["restarts"] == 1
+    assert report["single_step"] is True
+    assert count_customers(report["path"]) >= 5000
+
+
+def test_wal_backup_with_concurrent_writes(tmp_path):
+    """Test that a WAL database is copied in one step that concurrent commits do not restart"""
+    source = tmp_path / "source.db"
+    connection = sqlite3.connect(source, check_same_thread=False, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, email VARCHAR)")
+    connection.executemany("INSERT INTO customers (email) VALUES (?)", [(f"c{i}@example.com",) for i in range(5000)])
+    connection.commit()
+    
+    stop = threading.Event()
+    def write():
+        while not stop.wait(0.001):
+            connection.execute("INSERT INTO customers (email) VALUES ('writer@example.com')")
+            connection.commit()
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        report = backup_database(str(source), str(tmp_path / "backup.db"), pages=1, sleep=0.005)
+    finally:
+        stop.set()
+        writer.join()
+        connection.close()
+    
+    assert report["journal_mode"] == "wal"
+    assert (report["steps"], report["restarts"], report["single_step"]) == (1, 0, False)
+    assert count_customers(report["path"]) >= 5000
+
+def test_commit_latency_recorder(client: TestClient):
+    """Test that the recorder times the commits made while it is active"""
+    with CommitLatencyRecorder() as recorder:
+        client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"})
+    client.post("/customers/", json={"name": "Jane", "surname": "Doe", "email": "jane.doe@example.com"})
+    
+    summary = recorder.summary()
+    assert summary["samples"] == 1
+    assert 0 <= summary["p50_ms"] <= summary["max_ms"]
\ No newline at end of file
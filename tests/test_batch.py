@@ -0,0 +1,187 @@
+from fastapi.testclient import TestClient
+
+from app import catalog_snapshot, config
+from app.events import OrderEventBroker
+from app.routers import orders
+import tests.conftest
+
+CUSTOMER_DATA = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+ITEM_DATA = {"title": "Smartphone", "description": "Latest smartphone", "price": 10.0, "stock": 1, "category_ids": []}
+
+def _setup(client: TestClient):
+    customer_id = client.post("/customers/", json=CUSTOMER_DATA).json()["id"]
+    item_id = client.post("/items/", json=ITEM_DATA).json()["id"]
+    return customer_id, item_id
+
+def _order(customer_id: int, item_id: int, quantity: int = 1):
+    return {"method": "POST", "path": "/orders/", "body": {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": quantity}]}}
+
+def test_batch_reads_and_writes(client: TestClient):
+    """Test that a batch returns each sub-request's status and body in order"""
+    customer_id, item_id = _setup(client)
+
+    response = client.post("/batch/", json={"requests": [
+        {"method": "GET", "path": f"/customers/{customer_id}"},
+        {"method": "POST", "path": "/categories/", "body": {"title": "Electronics", "description": "Electronic devices"}},
+        {"method": "PUT", "path": f"/items/{item_id}", "body": {"category_ids": [1]}},
+        {"method": "GET", "path": "/items/?limit=5"},
+        {"method": "GET", "path": "/items/999"}
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rolled_back"] is False
+    assert [result["status"] for result in data["responses"]] == [200, 200, 200, 200, 404]
+    assert data["responses"][0]["body"]["email"] == CUSTOMER_DATA["email"]
+    # Later sub-requests see the writes of earlier ones
+    assert data["responses"][3]["body"][0]["categories"][0]["title"] == "Electronics"
+    assert data["responses"][4]["body"] == {"detail": "Item not found"}
+
+def test_batch_shares_one_session(client: TestClient, monkeypatch):
+    """Test that the sub-requests use the batch's session instead of opening their own"""
+    customer_id, item_id = _setup(client)
+    opened = []
+    session_factory = tests.conftest.TestingSessionLocal
+    monkeypatch.setattr(tests.conftest, "TestingSessionLocal", lambda: opened.append(1) or session_factory())
+
+    requests = [{"method": "GET", "path": f"/customers/{customer_id}"}, {"method": "GET", "path": f"/items/{item_id}"}] * 3
+    response = client.post("/batch/", json={"requests": requests})
+    assert [result["status"] for result in response.json()["responses"]] == [200] * 6
+    assert len(opened) == 1
+
+def test_failed_sub_request_does_not_stop_batch(client: TestClient):
+    """Test that without atomic a failed sub-request leaves the others committed"""
+    customer_id, item_id = _setup(client)
+
+    response = client.post("/batch/", json={"requests": [
+        _order(customer_id, item_id),
+        _order(customer_id, item_id),
+        {"method": "POST", "path": "/items/", "body": {**ITEM_DATA, "title": "Book"}}
+    ]})
+    assert [result["status"] for result in response.json()["responses"]] == [200, 409, 200]
+    assert response.json()["rolled_back"] is False
+    assert len(client.get("/orders/").json()) == 1
+    assert len(client.get("/items/").json()) == 2
+
+def test_atomic_batch_rolls_back(client: TestClient):
+    """Test that an atomic batch stops at the first failure and undoes every write"""
+    customer_id, item_id = _setup(client)
+
+    response = client.post("/batch/", json={"atomic": True, "requests": [
+        {"method": "POST", "path": "/items/", "body": {**ITEM_DATA, "title": "Book"}},
+        _order(customer_id, item_id),
+        _order(customer_id, item_id),
+        {"method": "DELETE", "path": f"/customers/{customer_id}"}
+    ]})
+    data = response.json()
+    assert data["rolled_back"] is True
+    assert [result["status"] for result in data["responses"]] == [200, 200, 409]
+    assert len(client.get("/items/").json()) == 1
+    assert client.get(f"/items/{item_id}").json()["stock"] == 1
+    assert client.get("/orders/").json() == []
+    assert client.get(f"/customers/{customer_id}").status_code == 200
+
+def test_atomic_batch_commits(client: TestClient):
+    """Test that an atomic batch without failures commits all its writes"""
+    customer_id, item_id = _setup(client)
+
+    response = client.post("/batch/", json={"atomic": True, "requests": [
+        {"method": "PUT", "path": f"/items/{item_id}", "body": {"stock": 5}},
+        _order(customer_id, item_id, 2),
+        _order(customer_id, item_id, 3)
+    ]})
+    assert response.json()["rolled_back"] is False
+    assert [result["status"] for result in response.json()["responses"]] == [200, 200, 200]
+    assert client.get(f"/items/{item_id}").json()["stock"] == 0
+    assert len(client.get("/orders/").json()) == 2
+
+def test_sub_request_headers(client: TestClient):
+    """Test that sub-requests carry their own headers, such as an Idempotency-Key"""
+    customer_id, item_id = _setup(client)
+    client.put(f"/items/{item_id}", json={"stock": 5})
+    order = {**_order(customer_id, item_id), "headers": {"Idempotency-Key": "order-1"}}
+
+    response = client.post("/batch/", json={"requests": [order, order]})
+    first, retry = response.json()["responses"]
+    assert retry["status"] == 200
+    assert retry["body"] == first["body"]
+    assert client.get(f"/items/{item_id}").json()["stock"] == 4
+
+def test_rejected_batches(client: TestClient, monkeypatch):
+    """Test that oversized batches and unbatchable paths are rejected before anything runs"""
+    item = {"method": "POST", "path": "/items/", "body": ITEM_DATA}
+    monkeypatch.setattr(config, "BATCH_MAX_REQUESTS", 2)
+    assert client.post("/batch/", json={"requests": [item] * 3}).status_code == 400
+
+    for path in ("/batch/", "/orders/events", "items/"):
+        response = client.post("/batch/", json={"requests": [item, {"method": "GET", "path": path}]})
+        assert response.status_code == 400
+    assert client.get("/items/").json() == []
+
+def test_atomic_batch_cached_reads(client: TestClient, monkeypatch):
+    """Test that cached reads in an atomic batch see its writes and leave nothing of them in the shared caches"""
+    monkeypatch.setattr(config, "CATALOG_ENGINE", True)
+    customer_id, item_id = _setup(client)
+    client.get("/catalog/snapshot")
+    client.get("/items/", params={"include": "total"})
+    reads = [
+        {"method": "GET", "path": "/catalog/snapshot"},
+        {"method": "GET", "path": "/items/?include=total"},
+        {"method": "GET", "path": "/items/?sort=-id"}
+    ]
+
+    response = client.post("/batch/", json={"atomic": True, "requests": [
+        {"method": "POST", "path": "/items/", "body": {**ITEM_DATA, "title": "Book"}},
+        *reads,
+        {"method": "DELETE", "path": "/customers/999"}
+    ]})
+    data = response.json()
+    assert [result["status"] for result in data["responses"]] == [200, 200, 200, 200, 404]
+    assert data["rolled_back"] is True
+    snapshot, total, items = (result["body"] for result in data["responses"][1:4])
+    assert [item["title"] for item in snapshot["items"]] == ["Smartphone", "Book"]
+    assert total["total"] == 2
+    assert [item["title"] for item in items] == ["Book", "Smartphone"]
+
+    catalog_snapshot.wait_for_rebuilds()
+    assert [item["title"] for item in client.get("/catalog/snapshot").json()["items"]] == ["Smartphone"]
+    assert client.get("/items/", params={"include": "total"}).json()["total"] == 1
+    assert [item["title"] for item in client.get("/items/", params={"sort": "-id"}).json()] == ["Smartphone"]
+
+    response = client.post("/batch/", json={"atomic": True, "requests": [
+        {"method": "POST", "path": "/items/", "body": {**ITEM_DATA, "title": "Book"}},
+        *reads
+    ]})
+    assert response.json()["rolled_back"] is False
+    client.get("/catalog/snapshot")
+    catalog_snapshot.wait_for_rebuilds()
+    assert [item["title"] for item in client.get("/catalog/snapshot").json()["items"]] == ["Smartphone", "Book"]
+    assert client.get("/items/", params={"include": "total"}).json()["total"] == 2
+    assert [item["title"] for item in client.get("/items/", params={"sort": "-id"}).json()] == ["Book", "Smartphone"]
+
+
+def test_atomic_batch_publishes_order_events_on_commit(client: TestClient, monkeypatch):
+    """Test that an atomic batch publishes its order events once it commits, and none when it rolls back"""
+    broker = OrderEventBroker()
+    monkeypatch.setattr(orders, "order_events", broker)
+    customer_id, item_id = _setup(client)
+    client.put(f"/items/{item_id}", json={"stock": 5})
+
+    response = client.post("/batch/", json={"atomic": True, "requests": [
+        _order(customer_id, item_id),
+        {"method": "DELETE", "path": "/customers/999"}
+    ]})
+    assert response.json()["rolled_back"] is True
+    assert broker.history_since(0) == []
+    # The rolled-back order's ID goes to the next order
+    order_id = client.post("/orders/", json=_order(customer_id, item_id)["body"]).json()["id"]
+    assert response.json()["responses"][0]["body"]["id"] == order_id
+    assert [(event.type, event.order_id) for event in broker.history_since(0)] == [("order.created", order_id)]
+
+    response = client.post("/batch/", json={"atomic": True, "requests": [
+        _order(customer_id, item_id),
+        {"method": "PUT", "path": f"/orders/{order_id}", "body": {"items": [{"shop_item_id": item_id, "quantity": 2}]}}
+    ]})
+    assert response.json()["rolled_back"] is False
+    new_order_id = response.json()["responses"][0]["body"]["id"]
+    events = [(event.type, event.order_id) for event in broker.history_since(0)]
+    assert events == [("order.created", order_id), ("order.created", new_order_id), ("order.updated", order_id)]
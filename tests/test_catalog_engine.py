@@ -0,0 +1,107 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import catalog_engine, config
+from app.catalog_engine import CatalogSnapshot
+
+@pytest.fixture(params=["sql", "engine"])
+def engine_mode(request, monkeypatch):
+    """Run a test against the SQL fallback and against the columnar snapshot"""
+    if request.param == "engine":
+        pytest.importorskip("numpy")
+    monkeypatch.setattr(config, "CATALOG_ENGINE", request.param == "engine")
+    return request.param
+
+def _create_catalog(client: TestClient):
+    electronics_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    books_id = client.post("/categories/", json={"title": "Books", "description": "Books"}).json()["id"]
+    items = [
+        {"title": "Smartphone", "description": "Phone", "price": 500.0, "category_ids": [electronics_id]},
+        {"title": "Laptop", "description": "Laptop", "price": 1000.0, "category_ids": [electronics_id]},
+        {"title": "Book", "description": "Book", "price": 20.0, "category_ids": [books_id]},
+        {"title": "E-reader", "description": "E-reader", "price": 100.0, "category_ids": [electronics_id, books_id]},
+        {"title": "Sticker", "description": "Sticker", "price": 20.0, "category_ids": []}
+    ]
+    ids = [client.post("/items/", json=item).json()["id"] for item in items]
+    return electronics_id, books_id, ids
+
+def _titles(client: TestClient, **params):
+    response = client.get("/items/", params=params)
+    assert response.status_code == 200
+    return [item["title"] for item in response.json()]
+
+def test_filter_and_sort_items(client: TestClient, engine_mode):
+    """Test price and category filters, sorts and pagination on the item list"""
+    electronics_id, books_id, ids = _create_catalog(client)
+
+    assert _titles(client) == ["Smartphone", "Laptop", "Book", "E-reader", "Sticker"]
+    assert _titles(client, sort="-id") == ["Sticker", "E-reader", "Book", "Laptop", "Smartphone"]
+    # Ties on price keep ID order in both directions
+    assert _titles(client, sort="price") == ["Book", "Sticker", "E-reader", "Smartphone", "Laptop"]
+    assert _titles(client, sort="-price") == ["Laptop", "Smartphone", "E-reader", "Book", "Sticker"]
+    assert _titles(client, min_price=50, max_price=500) == ["Smartphone", "E-reader"]
+    assert _titles(client, category_id=books_id) == ["Book", "E-reader"]
+    assert _titles(client, category_id=[books_id, electronics_id], sort="price") == ["Book", "E-reader", "Smartphone", "Laptop"]
+    assert _titles(client, category_id=999) == []
+    assert _titles(client, category_id=electronics_id, sort="-price", skip=1, limit=1) == ["Smartphone"]
+
+    response = client.get("/items/", params={"max_price": 100, "include": "total", "limit": 1})
+    assert response.json()["total"] == 3
+    assert [item["title"] for item in response.json()["items"]] == ["Book"]
+    assert client.get("/items/", params={"include": "total", "limit": 1}).json()["total"] == 5
+
+    assert client.get("/items/", params={"sort": "title"}).status_code == 422
+
+def test_engine_follows_writes(client: TestClient, engine_mode):
+    """Test that item and category writes show up in filtered lists"""
+    electronics_id, books_id, ids = _create_catalog(client)
+    assert _titles(client, category_id=books_id) == ["Book", "E-reader"]
+
+    client.put(f"/items/{ids[0]}", json={"price": 15.0, "category_ids": [books_id]})
+    client.delete(f"/items/{ids[2]}")
+    client.post("/items/", json={"title": "Cookbook", "description": "Recipes", "price": 30.0, "category_ids": [books_id]})
+    assert _titles(client, category_id=books_id, sort="price") == ["Smartphone", "Cookbook", "E-reader"]
+
+    client.post("/items/bulk", json={"category_ids": [books_id], "price_mode": "absolute", "price_value": 50})
+    assert _titles(client, min_price=50, max_price=50) == ["Smartphone", "E-reader", "Cookbook"]
+
+    client.delete(f"/categories/{electronics_id}")
+    assert _titles(client, category_id=electronics_id) == []
+
+def test_engine_refreshes_incrementally(client: TestClient, monkeypatch):
+    """Test that the snapshot reloads changed items instead of rebuilding"""
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(config, "CATALOG_ENGINE", True)
+    electronics_id, books_id, ids = _create_catalog(client)
+    assert _titles(client, min_price=500) == ["Smartphone", "Laptop"]
+
+    builds = []
+    build = CatalogSnapshot.build.__func__
+    monkeypatch.setattr(CatalogSnapshot, "build", classmethod(lambda cls, db, seq: builds.append(seq) or build(cls, db, seq)))
+    client.put(f"/items/{ids[2]}", json={"price": 750.0})
+    assert _titles(client, min_price=500, sort="price") == ["Smartphone", "Book", "Laptop"]
+    assert builds == []
+
+    # Writes to anything but items move the change log position without reloading items
+    client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"})
+    assert _titles(client, min_price=500) == ["Smartphone", "Laptop", "Book"]
+    assert builds == []
+
+    catalog_engine.invalidate()
+    assert _titles(client, min_price=500) == ["Smartphone", "Laptop", "Book"]
+    assert len(builds) == 1
+
+def test_snapshot_category_bitsets():
+    """Test category filters across more categories than fit in one bitset word"""
+    np = pytest.importorskip("numpy")
+    category_bits = {category_id: category_id for category_id in range(130)}
+    categories = np.zeros((3, 3), dtype=np.uint64)
+    categories[0, 0] = 1 << 5
+    categories[1, 1] = 1 << (70 - 64)
+    categories[2, 2] = 1 << (129 - 128)
+    snapshot = CatalogSnapshot(np.array([1, 2, 3]), np.array([10.0, np.nan, 30.0]), categories, category_bits, 0)
+
+    assert snapshot.search(category_ids=[70, 129]) == ([2, 3], 2)
+    assert snapshot.search(category_ids=[5], max_price=5) == ([], 0)
+    assert snapshot.search(sort="price") == ([2, 1, 3], 3)
+    assert snapshot.search(sort="-price", limit=2) == ([3, 1], 3)
@@ -0,0 +1,152 @@
+import gzip
+import json
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+from app import catalog_snapshot
+
+def _create_catalog(client: TestClient):
+    category_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    item_data = {"title": "Smartphone", "description": "Latest smartphone", "price": 699.99, "stock": 5, "category_ids": [category_id]}
+    item_id = client.post("/items/", json=item_data).json()["id"]
+    return category_id, item_id
+
+def _get_snapshot(client: TestClient, **headers):
+    return client.get("/catalog/snapshot", headers={"Accept-Encoding": "identity", **headers})
+
+def _refreshed_snapshot(client: TestClient, **headers):
+    # The first request after a change is served the previous version and starts the rebuild
+    _get_snapshot(client)
+    catalog_snapshot.wait_for_rebuilds()
+    return _get_snapshot(client, **headers)
+
+def test_catalog_snapshot(client: TestClient):
+    """Test the full catalog document and its caching headers"""
+    category_id, item_id = _create_catalog(client)
+    
+    response = _get_snapshot(client)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert "content-encoding" not in response.headers
+    assert response.headers["cache-control"] == "public, max-age=60"
+    version = int(response.headers["x-catalog-version"])
+    assert response.headers["etag"] == f'"catalog-{version}"'
+    
+    data = response.json()
+    assert data["version"] == version
+    assert data["categories"] == [{"id": category_id, "title": "Electronics", "description": "Electronic devices", "item_count": 1}]
+    # Stock changes with every order, so it is not part of the snapshot
+    assert data["items"] == [{"id": item_id, "title": "Smartphone", "description": "Latest smartphone", "price": 699.99, "category_ids": [category_id]}]
+
+def test_catalog_snapshot_gzip(client: TestClient):
+    """Test that gzip clients get the precompressed variant"""
+    _create_catalog(client)
+    plain = _get_snapshot(client)
+    
+    response = client.get("/catalog/snapshot", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    # The client decodes it transparently
+    assert response.content == plain.content
+    with client.stream("GET", "/catalog/snapshot", headers={"Accept-Encoding": "gzip"}) as response:
+        assert gzip.decompress(b"".join(response.iter_raw())) == plain.content
+
+def test_catalog_snapshot_brotli(client: TestClient):
+    """Test that brotli is preferred when the client accepts it"""
+    pytest.importorskip("brotli")
+    _create_catalog(client)
+    plain = _get_snapshot(client)
+    
+    response = client.get("/catalog/snapshot", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.content == plain.content
+    
+    response = client.get("/catalog/snapshot", headers={"Accept-Encoding": "gzip, br;q=0.5"})
+    assert response.headers["content-encoding"] == "gzip"
+
+def test_catalog_snapshot_not_modified(client: TestClient):
+    """Test revalidating with the ETag until the catalog changes"""
+    category_id, item_id = _create_catalog(client)
+    etag = _get_snapshot(client).headers["etag"]
+    
+    response = _get_snapshot(client, **{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    
+    # Orders change stock but not the snapshot
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    client.post("/orders/", json={"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]})
+    assert _refreshed_snapshot(client, **{"If-None-Match": etag}).status_code == 304
+    
+    client.put(f"/items/{item_id}", json={"price": 599.99})
+    response = _refreshed_snapshot(client, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["items"][0]["price"] == 599.99
+
+def test_catalog_snapshot_rebuilt_only_on_change(client: TestClient, monkeypatch):
+    """Test that the document is serialized once per catalog version"""
+    builds = []
+    build_document = catalog_snapshot.build_document
+    def counting_build(db, version, items=None):
+        builds.append(version)
+        return build_document(db, version, items)
+    monkeypatch.setattr(catalog_snapshot, "build_document", counting_build)
+    category_id, item_id = _create_catalog(client)
+    
+    for _ in range(3):
+        _get_snapshot(client)
+    client.get("/catalog/snapshot", headers={"Accept-Encoding": "gzip"})
+    assert len(builds) == 1
+    
+    # Stock changes are recorded as item changes but leave the document as it is
+    customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    client.post("/orders/", json={"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]})
+    _refreshed_snapshot(client)
+    assert len(builds) == 1
+    
+    client.put(f"/categories/{category_id}", json={"title": "Gadgets"})
+    assert _refreshed_snapshot(client).json()["categories"][0]["title"] == "Gadgets"
+    assert len(builds) == 2
+
+def test_catalog_snapshot_version_url(client: TestClient):
+    """Test that a versioned URL is immutable and old versions are gone"""
+    category_id, item_id = _create_catalog(client)
+    version = _get_snapshot(client).json()["version"]
+    
+    response = client.get("/catalog/snapshot", params={"version": version}, headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    
+    client.delete(f"/items/{item_id}")
+    assert json.loads(_refreshed_snapshot(client).content)["items"] == []
+    response = client.get("/catalog/snapshot", params={"version": version})
+    assert response.status_code == 404
+
+def test_catalog_snapshot_rebuilt_in_background(client: TestClient, monkeypatch):
+    """Test that requests after a change get the last finished version instead of waiting for the rebuild"""
+    category_id, item_id = _create_catalog(client)
+    version = _get_snapshot(client).json()["version"]
+    
+    release = threading.Event()
+    build_document = catalog_snapshot.build_document
+    def slow_build(db, version, items=None):
+        release.wait(5)
+        return build_document(db, version, items)
+    monkeypatch.setattr(catalog_snapshot, "build_document", slow_build)
+    
+    client.put(f"/items/{item_id}", json={"price": 599.99})
+    for _ in range(3):
+        response = _get_snapshot(client)
+        assert response.headers["x-catalog-version"] == str(version)
+        assert response.json()["items"][0]["price"] == 699.99
+    
+    release.set()
+    catalog_snapshot.wait_for_rebuilds()
+    response = _get_snapshot(client)
+    assert int(response.headers["x-catalog-version"]) > version
+    assert response.json()["items"][0]["price"] == 599.99
@@ -97,4 +97,50 @@ def test_delete_category_not_found(client: TestClient):
     """Test deleting a non-existent category"""
     response = client.delete("/categories/999")
     assert response.status_code == 404
-    assert "Category not found" in response.json()["detail"]
\ No newline at end of file
+    assert "Category not found" in response.json()["detail"]
+
+def test_get_category_items(client: TestClient):
+    """Test listing the items of a category with keyset pagination"""
+    category_response = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"})
+    category_id = category_response.json()["id"]
+    other_response = client.post("/categories/", json={"title": "Books", "description": "Books"})
+    other_id = other_response.json()["id"]
+    
+    item_ids = []
+    for title in ["Smartphone", "Laptop", "Tablet"]:
+        item_data = {"title": title, "description": title, "price": 99.99, "category_ids": [category_id]}
+        item_ids.append(client.post("/items/", json=item_data).json()["id"])
+    client.post("/items/", json={"title": "Novel", "description": "Novel", "price": 9.99, "category_ids": [other_id]})
+    
+    response = client.get(f"/categories/{category_id}/items", params={"limit": 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert [item["id"] for item in first_page] == item_ids[:2]
+    
+    response = client.get(f"/categories/{category_id}/items", params={"after_id": first_page[-1]["id"], "limit": 2})
+    assert [item["id"] for item in response.json()] == item_ids[2:]
+
+def test_get_category_items_not_found(client: TestClient):
+    """Test listing items of a non-existent category"""
+    response = client.get("/categories/999/items")
+    assert response.status_code == 404
+    assert "Category not found" in response.json()["detail"]
+
+def test_category_item_count(client: TestClient):
+    """Test that item counts follow item category assignments"""
+    category1_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    category2_id = client.post("/categories/", json={"title": "Mobile", "description": "Mobile devices"}).json()["id"]
+    assert client.get(f"/categories/{category1_id}").json()["item_count"] == 0
+    
+    item_data = {"title": "Smartphone", "description": "Latest smartphone", "price": 599.99, "category_ids": [category1_id]}
+    item_id = client.post("/items/", json=item_data).json()["id"]
+    client.post("/items/", json={**item_data, "title": "Laptop"})
+    assert client.get(f"/categories/{category1_id}").json()["item_count"] == 2
+    
+    client.put(f"/items/{item_id}", json={"category_ids": [category2_id]})
+    assert client.get(f"/categories/{category1_id}").json()["item_count"] == 1
+    assert client.get(f"/categories/{category2_id}").json()["item_count"] == 1
+    
+    client.delete(f"/items/{item_id}")
+    counts = {category["id"]: category["item_count"] for category in client.get("/categories/").json()}
+    assert counts == {category1_id: 1, category2_id: 0}
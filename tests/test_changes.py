@@ -0,0 +1,87 @@
+from fastapi.testclient import TestClient
+
+from app import config
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+def test_change_feed_records_writes(client: TestClient):
+    """Test that create/update/delete calls show up in the change feed"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    client.put(f"/customers/{customer_id}", json={"name": "Johnny"})
+    order_id = client.post("/orders/", json={"customer_id": customer_id, "items": []}).json()["id"]
+    client.delete(f"/orders/{order_id}")
+    
+    response = client.get("/changes/")
+    assert response.status_code == 200
+    data = response.json()
+    changes = [(change["entity_type"], change["entity_id"], change["operation"]) for change in data["changes"]]
+    assert changes == [
+        ("customer", customer_id, "create"),
+        ("customer", customer_id, "update"),
+        ("order", order_id, "create"),
+        ("order", order_id, "delete")
+    ]
+    seqs = [change["seq"] for change in data["changes"]]
+    assert seqs == sorted(seqs)
+    assert data["next_since"] == seqs[-1]
+
+def test_change_feed_since(client: TestClient):
+    """Test resuming the change feed from a sequence number"""
+    category_data = {"title": "Electronics", "description": "Electronic devices"}
+    category_id = client.post("/categories/", json=category_data).json()["id"]
+    next_since = client.get("/changes/").json()["next_since"]
+    
+    item_data = {"title": "Smartphone", "description": "Latest smartphone", "price": 599.99, "category_ids": [category_id]}
+    item_id = client.post("/items/", json=item_data).json()["id"]
+    
+    data = client.get("/changes/", params={"since": next_since}).json()
+    changes = {(change["entity_type"], change["entity_id"], change["operation"]) for change in data["changes"]}
+    assert changes == {("item", item_id, "create"), ("category", category_id, "update")}
+    
+    # Nothing new past the end of the feed
+    data = client.get("/changes/", params={"since": data["next_since"]}).json()
+    assert data["changes"] == []
+
+def test_change_feed_failed_write_not_recorded(client: TestClient):
+    """Test that rejected writes leave no change entries"""
+    client.post("/orders/", json={"customer_id": 999, "items": []})
+    assert client.get("/changes/").json()["changes"] == []
+
+def test_change_feed_records_stock_changes(client: TestClient):
+    """Test that orders taking or returning stock record an update of each stocked item"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    item_data = {"title": "Smartphone", "description": "Latest smartphone", "price": 10.0, "category_ids": []}
+    stocked_id = client.post("/items/", json={**item_data, "stock": 5}).json()["id"]
+    untracked_id = client.post("/items/", json={**item_data, "title": "E-book"}).json()["id"]
+    since = client.get("/changes/").json()["next_since"]
+    
+    lines = [{"shop_item_id": stocked_id, "quantity": 2}, {"shop_item_id": untracked_id, "quantity": 1}]
+    order_id = client.post("/orders/", json={"customer_id": customer_id, "items": lines}).json()["id"]
+    client.put(f"/orders/{order_id}", json={"items": [{"shop_item_id": stocked_id, "quantity": 1}]})
+    client.delete(f"/orders/{order_id}")
+    # A rejected order takes no stock and records nothing
+    assert client.post("/orders/", json={"customer_id": customer_id, "items": [{"shop_item_id": stocked_id, "quantity": 9}]}).status_code == 409
+    
+    changes = [(change["entity_type"], change["entity_id"], change["operation"]) for change in client.get("/changes/", params={"since": since}).json()["changes"]]
+    assert changes.count(("item", stocked_id, "update")) == 4
+    assert ("item", untracked_id, "update") not in changes
+    assert client.get(f"/items/{stocked_id}").json()["stock"] == 5
+
+def test_compact_changes(client: TestClient, monkeypatch):
+    """Test that compaction keeps only the latest change per entity"""
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    for name in ["Johnny", "Jon", "Jonathan"]:
+        client.put(f"/customers/{customer_id}", json={"name": name})
+    category_data = {"title": "Electronics", "description": "Electronic devices"}
+    category_id = client.post("/categories/", json=category_data).json()["id"]
+    
+    response = client.post("/admin/changes/compact", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json()["removed"] == 3
+    
+    changes = [(change["entity_type"], change["entity_id"], change["operation"]) for change in client.get("/changes/").json()["changes"]]
+    assert changes == [("customer", customer_id, "update"), ("category", category_id, "create")]
\ No newline at end of file
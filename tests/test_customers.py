@@ -1,6 +1,11 @@
+from datetime import datetime, timedelta
+
 import pytest
 from fastapi.testclient import TestClient
 
+from app.archive import archive_orders
+from tests.conftest import TestingSessionLocal
+
 def test_create_customer(client: TestClient):
     """Test creating a new customer"""
     customer_data = {
@@ -120,4 +125,134 @@ def test_delete_customer_not_found(client: TestClient):
     """Test deleting a non-existent customer"""
     response = client.delete("/customers/999")
     assert response.status_code == 404
-    assert "Customer not found" in response.json()["detail"]
\ No newline at end of file
+    assert "Customer not found" in response.json()["detail"]
+
+def test_get_customer_orders(client: TestClient):
+    """Test getting the orders of a customer"""
+    customer1_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    customer2_id = client.post("/customers/", json={"name": "Jane", "surname": "Smith", "email": "jane.smith@example.com"}).json()["id"]
+    
+    order_ids = [client.post("/orders/", json={"customer_id": customer1_id, "items": []}).json()["id"] for _ in range(3)]
+    client.post("/orders/", json={"customer_id": customer2_id, "items": []})
+    
+    response = client.get(f"/customers/{customer1_id}/orders")
+    assert response.status_code == 200
+    assert [order["id"] for order in response.json()] == order_ids
+    
+    response = client.get(f"/customers/{customer1_id}/orders", params={"skip": 1, "limit": 1})
+    assert [order["id"] for order in response.json()] == order_ids[1:2]
+
+def test_get_customer_orders_includes_archived(client: TestClient):
+    """Test that the order history lists archived orders, as the stats count them"""
+    customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    item_id = client.post("/items/", json={"title": "Book", "description": "Book", "price": 10.0, "category_ids": []}).json()["id"]
+    order = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]}
+    order_ids = [client.post("/orders/", json=order).json()["id"] for _ in range(2)]
+    with TestingSessionLocal() as db:
+        assert archive_orders(db, datetime.utcnow() + timedelta(days=1)) == 2
+    order_ids.append(client.post("/orders/", json=order).json()["id"])
+    
+    orders = client.get(f"/customers/{customer_id}/orders").json()
+    assert [order["id"] for order in orders] == order_ids
+    assert [order["items"][0]["shop_item"]["title"] for order in orders] == ["Book"] * 3
+    assert len(orders) == client.get(f"/customers/{customer_id}/stats").json()["order_count"]
+    response = client.get(f"/customers/{customer_id}/orders", params={"skip": 1, "limit": 2})
+    assert [order["id"] for order in response.json()] == order_ids[1:]
+
+def test_get_customer_orders_not_found(client: TestClient):
+    """Test getting orders of a non-existent customer"""
+    response = client.get("/customers/999/orders")
+    assert response.status_code == 404
+    assert "Customer not found" in response.json()["detail"]
+
+def test_get_customer_stats(client: TestClient):
+    """Test that customer stats follow order writes"""
+    customer1_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    customer2_id = client.post("/customers/", json={"name": "Jane", "surname": "Smith", "email": "jane.smith@example.com"}).json()["id"]
+    item_id = client.post("/items/", json={"title": "Book", "description": "A book", "price": 10.0, "category_ids": []}).json()["id"]
+    
+    response = client.get(f"/customers/{customer1_id}/stats")
+    assert response.status_code == 200
+    assert response.json() == {"customer_id": customer1_id, "order_count": 0, "total_spend": 0.0, "last_order_id": None}
+    
+    order1_id = client.post("/orders/", json={"customer_id": customer1_id, "items": [{"shop_item_id": item_id, "quantity": 2}]}).json()["id"]
+    order2_id = client.post("/orders/", json={"customer_id": customer1_id, "items": [{"shop_item_id": item_id, "quantity": 1}]}).json()["id"]
+    stats = client.get(f"/customers/{customer1_id}/stats").json()
+    assert stats["order_count"] == 2
+    assert stats["total_spend"] == 30.0
+    assert stats["last_order_id"] == order2_id
+    
+    client.put(f"/orders/{order1_id}", json={"items": [{"shop_item_id": item_id, "quantity": 5}]})
+    assert client.get(f"/customers/{customer1_id}/stats").json()["total_spend"] == 60.0
+    
+    client.put(f"/orders/{order2_id}", json={"customer_id": customer2_id})
+    stats = client.get(f"/customers/{customer1_id}/stats").json()
+    assert stats == {"customer_id": customer1_id, "order_count": 1, "total_spend": 50.0, "last_order_id": order1_id}
+    assert client.get(f"/customers/{customer2_id}/stats").json()["total_spend"] == 10.0
+    
+    client.delete(f"/orders/{order1_id}")
+    stats = client.get(f"/customers/{customer1_id}/stats").json()
+    assert stats == {"customer_id": customer1_id, "order_count": 0, "total_spend": 0.0, "last_order_id": None}
+
+def test_get_customer_stats_not_found(client: TestClient):
+    """Test getting stats of a non-existent customer"""
+    response = client.get("/customers/999/stats")
+    assert response.status_code == 404
+    assert "Customer not found" in response.json()["detail"]
+
+def test_bulk_upsert_customers(client: TestClient):
+    """Test bulk customer upsert keyed on email"""
+    existing = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()
+    client.post("/customers/", json={"name": "Jane", "surname": "Smith", "email": "jane.smith@example.com"})
+    
+    customers = [
+        {"name": "Johnny", "surname": "Doe", "email": "john.doe@example.com"},
+        {"name": "Jane", "surname": "Smith", "email": "jane.smith@example.com"},
+        {"name": "Bob", "surname": "Johnson", "email": "bob.johnson@example.com"},
+        {"name": "Alice", "surname": "Brown", "email": "alice.brown@example.com"},
+        {"name": "Alicia", "surname": "Brown", "email": "alice.brown@example.com"}
+    ]
+    response = client.post("/customers/bulk", json=customers, params={"batch_size": 2})
+    assert response.status_code == 200
+    assert response.json() == {"created": 2, "updated": 1, "unchanged": 1}
+    
+    data = {customer["email"]: customer for customer in client.get("/customers/").json()}
+    assert len(data) == 4
+    assert data["john.doe@example.com"]["id"] == existing["id"]
+    assert data["john.doe@example.com"]["name"] == "Johnny"
+    assert data["alice.brown@example.com"]["name"] == "Alicia"
+    
+    # Replaying the same payload changes nothing
+    response = client.post("/customers/bulk", json=customers)
+    assert response.json() == {"created": 0, "updated": 0, "unchanged": 4}
+
+def test_bulk_upsert_customers_records_changes(client: TestClient):
+    """Test that bulk upserts show up in the change feed"""
+    existing_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    since = client.get("/changes/").json()["next_since"]
+    
+    customers = [
+        {"name": "Johnny", "surname": "Doe", "email": "john.doe@example.com"},
+        {"name": "Bob", "surname": "Johnson", "email": "bob.johnson@example.com"}
+    ]
+    client.post("/customers/bulk", json=customers)
+    new_id = [customer["id"] for customer in client.get("/customers/").json() if customer["id"] != existing_id][0]
+    
+    changes = {(change["entity_id"], change["operation"]) for change in client.get("/changes/", params={"since": since}).json()["changes"]}
+    assert changes == {(existing_id, "update"), (new_id, "create")}
+
+def test_bulk_upsert_customers_batch_size(client: TestClient):
+    """Test that the bulk upsert batch size must be positive"""
+    customers = [{"name": "John", "surname": "Doe", "email": "john.doe@example.com"}]
+    for batch_size in (0, -1, 5001):
+        response = client.post("/customers/bulk", json=customers, params={"batch_size": batch_size})
+        assert response.status_code == 422
+    assert client.get("/customers/").json() == []
+
+def test_bulk_upsert_customers_query_budget(client: TestClient, query_budget):
+    """Test that a bulk upsert sends a few statements per batch, not one per customer"""
+    customers = [{"name": f"Name {n}", "surname": "Customer", "email": f"customer{n}@example.com"} for n in range(1000)]
+    with query_budget(12):
+        response = client.post("/customers/bulk", json=customers, params={"batch_size": 500})
+    assert response.json() == {"created": 1000, "updated": 0, "unchanged": 0}
+    assert len(client.get("/changes/", params={"limit": 1000}).json()["changes"]) == 1000
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+from app.events import OrderEventBroker, ORDER_CREATED, ORDER_UPDATED, ORDER_DELETED
+from app.main import app
+from app.routers import orders
+
+@pytest.fixture
+def broker(monkeypatch):
+    """A fresh broker in place of the process-wide one the order endpoints publish to"""
+    broker = OrderEventBroker()
+    monkeypatch.setattr(orders, "order_events", broker)
+    return broker
+
+async def _read_events(query: str, until: str, headers=(), timeout: float = 5):
+    """Call GET /orders/events and disconnect once the stream contains until"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/orders/events",
+        "raw_path": b"/orders/events",
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80)
+    }
+    requested = False
+    disconnected = asyncio.Event()
+    response = {"status": None, "headers": {}, "body": ""}
+    
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+    
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"").decode()
+            if until in response["body"]:
+                disconnected.set()
+    
+    await asyncio.wait_for(app(scope, receive, send), timeout)
+    return response
+
+def test_broker_delivers_from_threads():
+    """Test that events published from worker threads reach async subscribers"""
+    broker = OrderEventBroker()
+    
+    async def scenario():
+        subscription = broker.subscribe()
+        thread = threading.Thread(target=broker.publish, args=(ORDER_CREATED, 1, 10))
+        thread.start()
+        event = await asyncio.wait_for(subscription.get(), timeout=1)
+        thread.join()
+        return event
+    
+    event = asyncio.run(scenario())
+    assert event.type == ORDER_CREATED
+    assert event.data == {"order_id": 1, "customer_id": 10}
+    assert event.encode().startswith(f"id: {event.id}\nevent: order.created\ndata: ")
+
+def test_broker_filters_by_customer():
+    """Test per-customer subscriptions"""
+    broker = OrderEventBroker()
+    
+    async def scenario():
+        subscription = broker.subscribe(customer_id=2)
+        broker.publish(ORDER_CREATED, 1, 1)
+        broker.publish(ORDER_CREATED, 2, 2)
+        return await asyncio.wait_for(subscription.get(), timeout=1)
+    
+    assert asyncio.run(scenario()).order_id == 2
+
+def test_broker_resumes_from_last_event_id():
+    """Test replaying retained events after Last-Event-ID"""
+    broker = OrderEventBroker()
+    first = broker.publish(ORDER_CREATED, 1, 1)
+    broker.publish(ORDER_UPDATED, 1, 1)
+    broker.publish(ORDER_DELETED, 1, 1)
+    
+    async def scenario():
+        subscription = broker.subscribe(last_event_id=first.id)
+        return [(await subscription.get()).type for _ in range(2)]
+    
+    assert asyncio.run(scenario()) == [ORDER_UPDATED, ORDER_DELETED]
+
+def test_broker_cuts_off_slow_consumers():
+    """Test that a subscriber with a full queue is closed instead of buffering without bound"""
+    broker = OrderEventBroker(queue_size=2)
+    
+    async def scenario():
+        subscription = broker.subscribe()
+        for order_id in range(5):
+            broker.publish(ORDER_CREATED, order_id, 1)
+        await asyncio.sleep(0)
+        received = []
+        while True:
+            event = await subscription.get()
+            if event is None:
+                break
+            received.append(event.order_id)
+        return received
+    
+    assert asyncio.run(scenario()) == [0, 1]
+
+def test_order_writes_publish_events(client: TestClient, broker):
+    """Test that order writes publish lifecycle events after commit"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    
+    order_id = client.post("/orders/", json={"customer_id": customer_id, "items": []}).json()["id"]
+    client.put(f"/orders/{order_id}", json={"items": []})
+    client.delete(f"/orders/{order_id}")
+    client.post("/orders/", json={"customer_id": 999, "items": []})
+    
+    events = broker.history_since(0, customer_id)
+    assert [(event.type, event.order_id) for event in events] == [
+        (ORDER_CREATED, order_id),
+        (ORDER_UPDATED, order_id),
+        (ORDER_DELETED, order_id)
+    ]
+
+def test_moved_order_notifies_both_customers(client: TestClient, broker):
+    """Test that moving an order to another customer reaches subscribers of the old and the new customer"""
+    old_customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    new_customer_id = client.post("/customers/", json={"name": "Jane", "surname": "Doe", "email": "jane.doe@example.com"}).json()["id"]
+    order_id = client.post("/orders/", json={"customer_id": old_customer_id, "items": []}).json()["id"]
+    
+    async def scenario():
+        subscriptions = [broker.subscribe(customer_id=old_customer_id), broker.subscribe(customer_id=new_customer_id)]
+        await asyncio.to_thread(client.put, f"/orders/{order_id}", json={"customer_id": new_customer_id})
+        return [await asyncio.wait_for(subscription.get(), timeout=1) for subscription in subscriptions]
+    
+    received = asyncio.run(scenario())
+    assert [(event.type, event.order_id) for event in received] == [(ORDER_UPDATED, order_id)] * 2
+    assert received[0].data == {"order_id": order_id, "customer_id": new_customer_id, "previous_customer_id": old_customer_id, "total": 0.0}
+    assert broker.history_since(0, old_customer_id)[-1] is received[0]
+
+def test_event_stream_endpoint(broker):
+    """Test that GET /orders/events streams a customer's events as Server-Sent Events"""
+    async def scenario():
+        reader = asyncio.create_task(_read_events("customer_id=2", "order.deleted"))
+        while not broker._subscribers:
+            await asyncio.sleep(0.01)
+        broker.publish(ORDER_CREATED, 1, 1)
+        created = broker.publish(ORDER_CREATED, 2, 2, {"total": 10.0})
+        broker.publish(ORDER_DELETED, 2, 2)
+        return created, await reader
+    
+    created, response = asyncio.run(scenario())
+    assert response["status"] == 200
+    assert response["headers"]["content-type"].startswith("text/event-stream")
+    assert response["body"].startswith("retry: 1000\n\n")
+    assert f"id: {created.id}\nevent: order.created\ndata: " in response["body"]
+    assert '"order_id": 1' not in response["body"]
+    # Disconnecting unsubscribes
+    assert not broker._subscribers
+
+def test_event_stream_resume_and_keepalive(broker):
+    """Test that the stream replays events after Last-Event-ID and sends keep-alives while idle"""
+    first = broker.publish(ORDER_CREATED, 1, 1)
+    broker.publish(ORDER_UPDATED, 1, 1)
+    
+    response = asyncio.run(_read_events("keepalive=1", ": keep-alive", [("last-event-id", str(first.id))]))
+    assert "event: order.updated" in response["body"]
+    assert "event: order.created" not in response["body"]
+    assert response["body"].endswith(": keep-alive\n\n")
+
+def test_event_stream_keepalive_bounds(client: TestClient):
+    """Test that keep-alive intervals that would busy-loop or stall the stream are rejected"""
+    for keepalive in (0, -1, 301):
+        assert client.get("/orders/events", params={"keepalive": keepalive}).status_code == 422
\ No newline at end of file
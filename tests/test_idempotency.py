@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+
+from app import config
+from app.models.models import IdempotencyKey
+from tests.conftest import TestingSessionLocal
+
+CUSTOMER_DATA = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+
+def _key(value: str):
+    return {"Idempotency-Key": value}
+
+def _create_stocked_item(client: TestClient, stock: int, category_ids=()):
+    item_data = {"title": "Smartphone", "description": "Latest smartphone", "price": 10.0, "stock": stock, "category_ids": list(category_ids)}
+    return client.post("/items/", json=item_data).json()["id"]
+
+def _stored_keys():
+    with TestingSessionLocal() as db:
+        return db.query(IdempotencyKey).count()
+
+def test_create_customer_replay(client: TestClient):
+    """Test that a retried customer creation returns the first response"""
+    first = client.post("/customers/", json=CUSTOMER_DATA, headers=_key("customer-1"))
+    assert first.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+
+    # Without the key this would fail with "Email already registered"
+    retry = client.post("/customers/", json=CUSTOMER_DATA, headers=_key("customer-1"))
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert len(client.get("/customers/").json()) == 1
+    assert len(client.get("/changes/").json()["changes"]) == 1
+
+def test_create_order_replay(client: TestClient):
+    """Test that a retried order is created and takes stock only once"""
+    customer_id = client.post("/customers/", json=CUSTOMER_DATA).json()["id"]
+    item_id = _create_stocked_item(client, 5)
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 2}]}
+
+    first = client.post("/orders/", json=order_data, headers=_key("order-1"))
+    retry = client.post("/orders/", json=order_data, headers=_key("order-1"))
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.json()["items"][0]["shop_item"]["id"] == item_id
+    assert len(client.get("/orders/").json()) == 1
+    assert client.get(f"/items/{item_id}").json()["stock"] == 3
+
+    # A new key is a new order
+    assert client.post("/orders/", json=order_data, headers=_key("order-2")).json()["id"] != first.json()["id"]
+    assert client.get(f"/items/{item_id}").json()["stock"] == 1
+
+def test_key_reused_for_different_request(client: TestClient):
+    """Test that a key cannot be replayed for a different body"""
+    client.post("/customers/", json=CUSTOMER_DATA, headers=_key("customer-1"))
+
+    response = client.post("/customers/", json={**CUSTOMER_DATA, "email": "jane@example.com"}, headers=_key("customer-1"))
+    assert response.status_code == 422
+    assert "different request" in response.json()["detail"]
+
+def test_keys_are_scoped_to_endpoint(client: TestClient):
+    """Test that the same key on another endpoint is a separate request"""
+    client.post("/customers/", json=CUSTOMER_DATA, headers=_key("shared"))
+    item_data = {"title": "Book", "description": "A book", "price": 5.0, "category_ids": []}
+    response = client.post("/items/", json=item_data, headers=_key("shared"))
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+    assert _stored_keys() == 2
+
+def test_failed_request_does_not_store_key(client: TestClient):
+    """Test that a rejected write leaves its key free for the retry"""
+    customer_id = client.post("/customers/", json=CUSTOMER_DATA).json()["id"]
+    item_id = _create_stocked_item(client, 1)
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 2}]}
+
+    assert client.post("/orders/", json=order_data, headers=_key("order-1")).status_code == 409
+    assert _stored_keys() == 0
+
+    client.put(f"/items/{item_id}", json={"stock": 2})
+    response = client.post("/orders/", json=order_data, headers=_key("order-1"))
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+
+def test_item_write_replays(client: TestClient):
+    """Test replaying item creation, update and deletion"""
+    category_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    item_data = {"title": "Smartphone", "description": "Latest smartphone", "price": 10.0, "category_ids": [category_id]}
+
+    created = client.post("/items/", json=item_data, headers=_key("item-1")).json()
+    # The stored response already counts the new item in its category
+    assert created["categories"][0]["item_count"] == 1
+    assert client.post("/items/", json=item_data, headers=_key("item-1")).json() == created
+
+    item_id = created["id"]
+    updated = client.put(f"/items/{item_id}", json={"price": 12.0}, headers=_key("update-1")).json()
+    client.put(f"/items/{item_id}", json={"price": 15.0})
+    assert client.put(f"/items/{item_id}", json={"price": 12.0}, headers=_key("update-1")).json() == updated
+    assert client.get(f"/items/{item_id}").json()["price"] == 15.0
+
+    assert client.delete(f"/items/{item_id}", headers=_key("delete-1")).status_code == 200
+    retry = client.delete(f"/items/{item_id}", headers=_key("delete-1"))
+    assert retry.status_code == 200
+    assert retry.json() == {"message": "Item deleted successfully"}
+
+    bulk = {"item_ids": [item_id], "price_mode": "absolute", "price_value": 1.0}
+    result = client.post("/items/bulk", json=bulk, headers=_key("bulk-1")).json()
+    assert client.post("/items/bulk", json=bulk, headers=_key("bulk-1")).json() == result
+
+def test_expired_keys(client: TestClient, monkeypatch):
+    """Test that expired keys run the request again and are purged"""
+    monkeypatch.setattr(config, "IDEMPOTENCY_TTL_SECONDS", 0)
+    item_data = {"title": "Book", "description": "A book", "price": 5.0, "category_ids": []}
+
+    first = client.post("/items/", json=item_data, headers=_key("item-1")).json()
+    second = client.post("/items/", json=item_data, headers=_key("item-1")).json()
+    assert second["id"] != first["id"]
+    client.post("/items/", json=item_data, headers=_key("item-2"))
+    # Each stored response deletes the keys that have expired
+    assert _stored_keys() == 1
+
+def test_invalid_key(client: TestClient):
+    """Test that an overlong key is rejected"""
+    response = client.post("/customers/", json=CUSTOMER_DATA, headers=_key("k" * 300))
+    assert response.status_code == 400
+    assert len(client.get("/customers/").json()) == 0
+
+def test_concurrent_duplicates_wait_for_first(client: TestClient):
+    """Test that concurrent retries with one key create a single order"""
+    customer_id = client.post("/customers/", json=CUSTOMER_DATA).json()["id"]
+    item_id = _create_stocked_item(client, 10)
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: client.post("/orders/", json=order_data, headers=_key("order-1")), range(16)))
+
+    assert [response.status_code for response in responses] == [200] * 16
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum("idempotent-replayed" in response.headers for response in responses) == 15
+    assert client.get(f"/items/{item_id}").json()["stock"] == 9
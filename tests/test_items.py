@@ -1,6 +1,14 @@
+from datetime import datetime
 import pytest
 from fastapi.testclient import TestClient
 
+from app import config, jobs
+from app.models.models import ItemCoPurchase
+from app.recommendations import CO_PURCHASES_JOB
+from tests.conftest import TestingSessionLocal
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
 def test_create_item_without_categories(client: TestClient):
     """Test creating a new item without categories"""
     item_data = {
@@ -54,7 +62,7 @@ def test_create_item_with_invalid_category(client: TestClient):
     assert response.status_code == 400
     assert "One or more categories not found" in response.json()["detail"]
 
-def test_get_items(client: TestClient):
+def test_get_items(client: TestClient, query_budget):
     """Test getting all items"""
     items = [
         {"title": "Smartphone", "description": "Latest smartphone", "price": 599.99, "category_ids": []},
@@ -64,7 +72,8 @@ def test_get_items(client: TestClient):
     for item in items:
         client.post("/items/", json=item)
     
-    response = client.get("/items/")
+    with query_budget(2):
+        response = client.get("/items/")
     assert response.status_code == 200
     data = response.json()
     assert len(data) == 2
@@ -175,4 +184,182 @@ def test_delete_item_not_found(client: TestClient):
     """Test deleting a non-existent item"""
     response = client.delete("/items/999")
     assert response.status_code == 404
-    assert "Item not found" in response.json()["detail"]
\ No newline at end of file
+    assert "Item not found" in response.json()["detail"]
+
+def test_get_items_with_total_and_facets(client: TestClient):
+    """Test item listing with total and facet counts"""
+    category_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    items = [
+        {"title": "Cable", "description": "USB cable", "price": 9.99, "category_ids": [category_id]},
+        {"title": "Smartphone", "description": "Latest smartphone", "price": 599.99, "category_ids": [category_id]},
+        {"title": "Laptop", "description": "High-performance laptop", "price": 1299.99, "category_ids": []}
+    ]
+    for item in items:
+        client.post("/items/", json=item)
+    
+    response = client.get("/items/", params={"limit": 1, "include": "total,facets"})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["items"]) == 1
+    assert data["total"] == 3
+    assert data["facets"]["categories"] == [{"category_id": category_id, "title": "Electronics", "count": 2}]
+    price_counts = {bucket["min"]: bucket["count"] for bucket in data["facets"]["price"]}
+    assert price_counts[0] == 1
+    assert price_counts[500] == 1
+    assert price_counts[1000] == 1
+    assert sum(price_counts.values()) == 3
+    
+    # Local writes refresh the cached counts
+    client.post("/items/", json={"title": "Mouse", "description": "Wireless mouse", "price": 19.99, "category_ids": []})
+    data = client.get("/items/", params={"include": "total"}).json()
+    assert data["total"] == 4
+    assert data["facets"] is None
+
+def test_get_items_with_unknown_include(client: TestClient):
+    """Test item listing with an unsupported include value"""
+    response = client.get("/items/", params={"include": "everything"})
+    assert response.status_code == 400
+
+def _create_related_orders(client: TestClient):
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    item_ids = []
+    for title in ["Smartphone", "Case", "Charger", "Book"]:
+        item_data = {"title": title, "description": title, "price": 10.0, "category_ids": []}
+        item_ids.append(client.post("/items/", json=item_data).json()["id"])
+    phone, case, charger, book = item_ids
+    
+    baskets = [[phone, case, charger], [phone, case], [phone, book]]
+    order_ids = []
+    for basket in baskets:
+        order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1} for item_id in basket]}
+        order_ids.append(client.post("/orders/", json=order_data).json()["id"])
+    return item_ids, order_ids
+
+def test_get_related_items(client: TestClient, run_jobs):
+    """Test frequently-bought-together items maintained by order writes"""
+    (phone, case, charger, book), order_ids = _create_related_orders(client)
+    assert client.get(f"/items/{phone}/related").json() == []
+    assert run_jobs() == 3
+    
+    response = client.get(f"/items/{phone}/related")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [case, charger, book]
+    assert [item["id"] for item in client.get(f"/items/{book}/related").json()] == [phone]
+    
+    # Changing and deleting orders moves the scores with them
+    client.put(f"/orders/{order_ids[2]}", json={"items": [{"shop_item_id": book, "quantity": 1}]})
+    run_jobs()
+    assert client.get(f"/items/{book}/related").json() == []
+    client.delete(f"/orders/{order_ids[1]}")
+    run_jobs()
+    assert [item["id"] for item in client.get(f"/items/{phone}/related").json()] == [case, charger]
+
+def test_rebuild_related_items(client: TestClient, run_jobs, monkeypatch):
+    """Test rebuilding the co-purchase index from order history"""
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    (phone, case, charger, book), order_ids = _create_related_orders(client)
+    run_jobs()
+    before = {item_id: client.get(f"/items/{item_id}/related").json() for item_id in [phone, case, charger, book]}
+    
+    response = client.post("/admin/items/related/rebuild", params={"batch_size": 2}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json()["pairs"] == 8
+    for item_id, related in before.items():
+        assert client.get(f"/items/{item_id}/related").json() == related
+    
+    # Top-K pruning keeps only the best related items
+    client.post("/admin/items/related/rebuild", params={"top_k": 1}, headers=ADMIN_HEADERS)
+    assert [item["id"] for item in client.get(f"/items/{phone}/related").json()] == [case]
+    
+    for params in ({"batch_size": 0}, {"batch_size": -1}, {"top_k": 0}):
+        assert client.post("/admin/items/related/rebuild", params=params, headers=ADMIN_HEADERS).status_code == 422
+
+def _co_purchase_scores():
+    with TestingSessionLocal() as db:
+        return {(row.item_id, row.related_item_id): row.score for row in db.query(ItemCoPurchase)}
+
+def test_rebuild_counts_queued_orders_once(client: TestClient, run_jobs, monkeypatch):
+    """Test that orders whose score changes are queued or being applied during a rebuild count once"""
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    (phone, case, charger, book), order_ids = _create_related_orders(client)
+    # A worker has claimed the orders' jobs and applies them after the rebuild
+    kind = jobs._kinds[CO_PURCHASES_JOB]
+    claimed_at = datetime.utcnow()
+    with TestingSessionLocal() as db:
+        claimed = jobs._claim(db, kind, claimed_at, max_attempts=3)
+    assert len(claimed) == 3
+    customer_id = client.get("/customers/").json()[0]["id"]
+    client.post("/orders/", json={"customer_id": customer_id, "items": [{"shop_item_id": phone, "quantity": 1}, {"shop_item_id": case, "quantity": 1}]})
+    
+    assert client.post("/admin/items/related/rebuild", params={"batch_size": 2}, headers=ADMIN_HEADERS).status_code == 200
+    with TestingSessionLocal() as db:
+        jobs._run(db, kind, claimed, claimed_at, max_attempts=3)
+    run_jobs()
+    scores = _co_purchase_scores()
+    assert scores[(phone, case)] == scores[(case, phone)] == 3
+    assert scores[(phone, book)] == 1
+    
+    # The same scores as a rebuild with nothing queued
+    client.post("/admin/items/related/rebuild", headers=ADMIN_HEADERS)
+    assert _co_purchase_scores() == scores
+
+def test_get_related_items_not_found(client: TestClient):
+    """Test related items of a non-existent item"""
+    response = client.get("/items/999/related")
+    assert response.status_code == 404
+    assert "Item not found" in response.json()["detail"]
+
+def test_bulk_update_prices(client: TestClient):
+    """Test bulk repricing by category and by ID"""
+    electronics_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    items = [
+        {"title": "Smartphone", "description": "Latest smartphone", "price": 500.0, "category_ids": [electronics_id]},
+        {"title": "Laptop", "description": "High-performance laptop", "price": 1000.0, "category_ids": [electronics_id]},
+        {"title": "Book", "description": "A book", "price": 20.0, "category_ids": []}
+    ]
+    phone_id, laptop_id, book_id = [client.post("/items/", json=item).json()["id"] for item in items]
+    
+    response = client.post("/items/bulk", json={"category_ids": [electronics_id], "price_mode": "percentage", "price_value": -10})
+    assert response.status_code == 200
+    assert response.json() == {"matched": 2, "prices_updated": 2, "categories_added": 0, "categories_removed": 0}
+    assert client.get(f"/items/{phone_id}").json()["price"] == 450.0
+    assert client.get(f"/items/{laptop_id}").json()["price"] == 900.0
+    assert client.get(f"/items/{book_id}").json()["price"] == 20.0
+    
+    response = client.post("/items/bulk", json={"item_ids": [book_id], "price_mode": "absolute", "price_value": 15})
+    assert response.json()["prices_updated"] == 1
+    assert client.get(f"/items/{book_id}").json()["price"] == 15.0
+
+def test_bulk_update_categories(client: TestClient):
+    """Test bulk category assignment and removal"""
+    electronics_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    sale_id = client.post("/categories/", json={"title": "Sale", "description": "Items on sale"}).json()["id"]
+    items = [
+        {"title": "Smartphone", "description": "Latest smartphone", "price": 500.0, "category_ids": [electronics_id, sale_id]},
+        {"title": "Laptop", "description": "High-performance laptop", "price": 1000.0, "category_ids": [electronics_id]}
+    ]
+    phone_id, laptop_id = [client.post("/items/", json=item).json()["id"] for item in items]
+    since = client.get("/changes/").json()["next_since"]
+    
+    response = client.post("/items/bulk", json={"category_ids": [electronics_id], "add_category_ids": [sale_id]})
+    assert response.json() == {"matched": 2, "prices_updated": 0, "categories_added": 1, "categories_removed": 0}
+    assert client.get(f"/categories/{sale_id}").json()["item_count"] == 2
+    assert len(client.get(f"/items/{laptop_id}").json()["categories"]) == 2
+    changes = {(change["entity_type"], change["entity_id"]) for change in client.get("/changes/", params={"since": since}).json()["changes"]}
+    assert changes == {("item", phone_id), ("item", laptop_id), ("category", sale_id)}
+    
+    response = client.post("/items/bulk", json={"item_ids": [phone_id, laptop_id], "remove_category_ids": [electronics_id]})
+    assert response.json()["categories_removed"] == 2
+    assert client.get(f"/categories/{electronics_id}").json()["item_count"] == 0
+    assert client.get(f"/categories/{electronics_id}/items").json() == []
+
+def test_bulk_update_validation(client: TestClient):
+    """Test bulk update requests that are rejected"""
+    response = client.post("/items/bulk", json={"price_mode": "absolute", "price_value": 1})
+    assert response.status_code == 400
+    response = client.post("/items/bulk", json={"item_ids": [1], "price_mode": "absolute"})
+    assert response.status_code == 400
+    response = client.post("/items/bulk", json={"item_ids": [1], "add_category_ids": [999]})
+    assert response.status_code == 400
+    assert "One or more categories not found" in response.json()["detail"]
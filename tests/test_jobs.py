@@ -0,0 +1,166 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config, jobs
+from app.jobs import DONE, FAILED, PENDING, WorkerPool, enqueue, job_handler
+from app.models.models import Job
+from tests.conftest import TestingSessionLocal
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+@pytest.fixture
+def register_kind():
+    """Register test job handlers and remove them afterwards"""
+    names = []
+    def register(name, handler, **options):
+        job_handler(name, **options)(handler)
+        names.append(name)
+    yield register
+    for name in names:
+        jobs._kinds.pop(name, None)
+
+def _enqueue(kind, payloads):
+    with TestingSessionLocal() as db:
+        for payload in payloads:
+            enqueue(db, kind, payload)
+        db.commit()
+
+def _statuses(kind):
+    with TestingSessionLocal() as db:
+        return [job.status for job in db.query(Job).filter(Job.kind == kind).order_by(Job.id)]
+
+def _create_order(client: TestClient, stock: int = 5):
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    item_ids = [
+        client.post("/items/", json={"title": title, "description": title, "price": 10.0, "stock": stock, "category_ids": []}).json()["id"]
+        for title in ("Smartphone", "Case")
+    ]
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 2} for item_id in item_ids]}
+    return client.post("/orders/", json=order_data), item_ids
+
+def test_order_enqueues_job(client: TestClient, run_jobs):
+    """Test that an order queues its co-purchase update instead of applying it"""
+    response, item_ids = _create_order(client)
+    assert response.status_code == 200
+    assert _statuses("co_purchases") == [PENDING]
+    
+    assert run_jobs() == 1
+    assert _statuses("co_purchases") == [DONE]
+    assert [item["id"] for item in client.get(f"/items/{item_ids[0]}/related").json()] == [item_ids[1]]
+
+def test_rejected_order_enqueues_nothing(client: TestClient, run_jobs):
+    """Test that a job rolls back with the order that queued it"""
+    response, item_ids = _create_order(client, stock=1)
+    assert response.status_code == 409
+    assert _statuses("co_purchases") == []
+    assert run_jobs() == 0
+
+def test_jobs_run_in_batches(client: TestClient, run_jobs, register_kind):
+    """Test that due jobs of one kind are handed to the handler together"""
+    batches = []
+    register_kind("test_batch", lambda db, payloads: batches.append([payload["n"] for payload in payloads]), batch_size=3)
+    _enqueue("test_batch", [{"n": n} for n in range(5)])
+    
+    assert run_jobs() == 5
+    assert batches == [[0, 1, 2], [3, 4]]
+    assert _statuses("test_batch") == [DONE] * 5
+
+def test_failed_job_is_retried_with_backoff(client: TestClient, run_jobs, register_kind, monkeypatch):
+    """Test that a failing job waits longer after each attempt and fails after the last"""
+    monkeypatch.setattr(config, "JOB_RETRY_SECONDS", 10)
+    calls = []
+    def handler(db, payloads):
+        calls.append(payloads)
+        raise ValueError("unavailable")
+    register_kind("test_retry", handler, max_attempts=3)
+    _enqueue("test_retry", [{}])
+    
+    now = datetime.utcnow()
+    assert run_jobs(now) == 1
+    assert _statuses("test_retry") == [PENDING]
+    # Not due again before its backoff has passed
+    assert run_jobs(now + timedelta(seconds=5)) == 0
+    assert run_jobs(now + timedelta(seconds=11)) == 1
+    assert run_jobs(now + timedelta(seconds=25)) == 0
+    assert run_jobs(now + timedelta(seconds=31)) == 1
+    assert len(calls) == 3
+    
+    with TestingSessionLocal() as db:
+        job = db.query(Job).filter(Job.kind == "test_retry").one()
+        assert job.status == FAILED
+        assert job.attempts == 3
+        assert "unavailable" in job.last_error
+    assert run_jobs(now + timedelta(days=1)) == 0
+
+def test_failing_job_does_not_block_batch(client: TestClient, run_jobs, register_kind):
+    """Test that the other jobs of a failed batch still complete"""
+    done = []
+    def handler(db, payloads):
+        if any(payload["n"] == 2 for payload in payloads):
+            raise ValueError("bad payload")
+        done.extend(payload["n"] for payload in payloads)
+    register_kind("test_poison", handler)
+    _enqueue("test_poison", [{"n": n} for n in range(4)])
+    
+    assert run_jobs() == 4
+    assert sorted(done) == [0, 1, 3]
+    assert _statuses("test_poison") == [DONE, DONE, PENDING, DONE]
+
+def test_expired_lease_is_claimed_again(client: TestClient, run_jobs, register_kind, monkeypatch):
+    """Test that a job left running by a lost worker runs again after its lease"""
+    monkeypatch.setattr(config, "JOB_LEASE_SECONDS", 60)
+    register_kind("test_lease", lambda db, payloads: None)
+    _enqueue("test_lease", [{}])
+    now = datetime.utcnow()
+    with TestingSessionLocal() as db:
+        db.query(Job).update({Job.status: "running", Job.started_at: now, Job.attempts: 1})
+        db.commit()
+    
+    assert run_jobs(now + timedelta(seconds=30)) == 0
+    assert run_jobs(now + timedelta(seconds=61)) == 1
+    assert _statuses("test_lease") == [DONE]
+
+def test_kind_concurrency_limit(client: TestClient, register_kind):
+    """Test that a kind never runs more batches at once than its concurrency"""
+    running = []
+    peak = []
+    lock = threading.Lock()
+    def handler(db, payloads):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+    register_kind("test_concurrency", handler, batch_size=1, concurrency=2)
+    _enqueue("test_concurrency", [{} for _ in range(12)])
+    
+    pool = WorkerPool(TestingSessionLocal, workers=4, poll_seconds=0.01)
+    pool.start()
+    deadline = time.monotonic() + 10
+    while _statuses("test_concurrency").count(DONE) < 12 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    pool.stop()
+    
+    assert _statuses("test_concurrency") == [DONE] * 12
+    assert max(peak) <= 2
+
+def test_job_metrics(client: TestClient, run_jobs, monkeypatch):
+    """Test queue depth and throughput reported by the admin endpoint"""
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    _create_order(client)
+    
+    metrics = client.get("/admin/jobs", headers=ADMIN_HEADERS).json()
+    assert metrics["kinds"]["co_purchases"]["pending"] == 1
+    assert metrics["kinds"]["co_purchases"]["lag_seconds"] >= 0
+    
+    run_jobs()
+    metrics = client.get("/admin/jobs", headers=ADMIN_HEADERS).json()["kinds"]["co_purchases"]
+    assert metrics["pending"] == 0
+    assert metrics["done"] == 1
+    assert metrics["done_last_minute"] == 1
+    assert metrics["latency_seconds"] >= 0
@@ -0,0 +1,72 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.lookups import get_by_id, get_by_ids
+from app.models.models import Customer, ShopItem
+from tests.conftest import TestingSessionLocal, engine
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(engine, "before_cursor_execute", self)
+
+def test_get_by_id_uses_identity_map(client: TestClient):
+    """Test that looking up the same row twice in a session costs one query"""
+    customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    db = TestingSessionLocal()
+    try:
+        with StatementCounter() as statements:
+            first = get_by_id(db, Customer, customer_id)
+            second = get_by_id(db, Customer, customer_id)
+            assert get_by_id(db, Customer, customer_id + 1) is None
+        assert first is second
+        assert first.email == "john.doe@example.com"
+        assert statements.count == 2
+    finally:
+        db.close()
+
+def test_get_by_ids_loads_only_missing_rows(client: TestClient):
+    """Test batch lookups by primary key"""
+    item_ids = [
+        client.post("/items/", json={"title": title, "description": title, "price": 1.0, "category_ids": []}).json()["id"]
+        for title in ["Smartphone", "Laptop", "Book"]
+    ]
+    db = TestingSessionLocal()
+    try:
+        with StatementCounter() as statements:
+            get_by_id(db, ShopItem, item_ids[0])
+            items = get_by_ids(db, ShopItem, item_ids + [item_ids[1], 999])
+            assert set(items) == set(item_ids)
+            assert [items[item_id].id for item_id in item_ids] == item_ids
+            assert get_by_ids(db, ShopItem, item_ids) == items
+        # One query for the first item, one for the other two, none for the repeat
+        assert statements.count == 2
+    finally:
+        db.close()
+
+def test_create_order_loads_items_once(client: TestClient):
+    """Test that each extra order line costs its insert, not another item lookup"""
+    customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    item_ids = [
+        client.post("/items/", json={"title": f"Item {n}", "description": "Item", "price": 1.0, "category_ids": []}).json()["id"]
+        for n in range(10)
+    ]
+    
+    counts = []
+    for lines in (item_ids[:2], item_ids):
+        order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1} for item_id in lines]}
+        with StatementCounter() as statements:
+            response = client.post("/orders/", json=order_data)
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == len(lines)
+        counts.append(statements.count)
+    assert counts[1] - counts[0] <= 8
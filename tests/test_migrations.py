@@ -0,0 +1,103 @@
+import sqlite3
+import pytest
+from sqlalchemy import create_engine, inspect
+from app.database import Base
+from app.migrations import LATEST_VERSION, migrate
+
+# Schema created by the first release, before migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE customers (id INTEGER NOT NULL, name VARCHAR, surname VARCHAR, email VARCHAR, PRIMARY KEY (id));
+CREATE INDEX ix_customers_id ON customers (id);
+CREATE INDEX ix_customers_name ON customers (name);
+CREATE INDEX ix_customers_surname ON customers (surname);
+CREATE UNIQUE INDEX ix_customers_email ON customers (email);
+CREATE TABLE shop_item_categories (id INTEGER NOT NULL, title VARCHAR, description VARCHAR, PRIMARY KEY (id));
+CREATE INDEX ix_shop_item_categories_id ON shop_item_categories (id);
+CREATE INDEX ix_shop_item_categories_title ON shop_item_categories (title);
+CREATE TABLE shop_items (id INTEGER NOT NULL, title VARCHAR, description VARCHAR, price FLOAT, PRIMARY KEY (id));
+CREATE INDEX ix_shop_items_id ON shop_items (id);
+CREATE INDEX ix_shop_items_title ON shop_items (title);
+CREATE TABLE shop_item_category_association (
+    shop_item_id INTEGER NOT NULL, category_id INTEGER NOT NULL, PRIMARY KEY (shop_item_id, category_id),
+    FOREIGN KEY(shop_item_id) REFERENCES shop_items (id), FOREIGN KEY(category_id) REFERENCES shop_item_categories (id)
+);
+CREATE TABLE orders (id INTEGER NOT NULL, customer_id INTEGER, PRIMARY KEY (id), FOREIGN KEY(customer_id) REFERENCES customers (id));
+CREATE INDEX ix_orders_id ON orders (id);
+CREATE TABLE order_items (
+    id INTEGER NOT NULL, shop_item_id INTEGER, quantity INTEGER, order_id INTEGER, PRIMARY KEY (id),
+    FOREIGN KEY(shop_item_id) REFERENCES shop_items (id), FOREIGN KEY(order_id) REFERENCES orders (id)
+);
+CREATE INDEX ix_order_items_id ON order_items (id);
+INSERT INTO customers VALUES (1, 'John', 'Doe', 'john.doe@example.com'), (2, 'Jane', 'Smith', 'jane.smith@example.com');
+INSERT INTO shop_item_categories VALUES (1, 'Electronics', 'Electronic devices'), (2, 'Books', 'Books');
+INSERT INTO shop_items VALUES (1, 'Laptop', 'Laptop', 1000.0), (2, 'Book', 'Book', 20.0);
+INSERT INTO shop_item_category_association VALUES (1, 1), (2, 2);
+INSERT INTO orders VALUES (1, 1), (2, 1);
+INSERT INTO order_items VALUES (1, 1, 1, 1), (2, 2, 2, 1), (3, 2, 1, 2);
+"""
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "migrate.db"
+    engine = create_engine(f"sqlite:///{path}")
+    yield path, engine
+    engine.dispose()
+
+def assert_matches_models(engine):
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == {column.name for column in table.columns}, table.name
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+def test_migrate_new_database(database):
+    """Test that a new database is created from the models at the latest version"""
+    path, engine = database
+    assert migrate(engine) == LATEST_VERSION
+    assert_matches_models(engine)
+    assert migrate(engine) == LATEST_VERSION
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+
+def test_migrate_baseline_database(database):
+    """Test upgrading a database created before migrations existed"""
+    path, engine = database
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    connection.close()
+    
+    assert migrate(engine) == LATEST_VERSION
+    assert_matches_models(engine)
+    
+    connection = sqlite3.connect(path)
+    assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert connection.execute("SELECT id, total FROM orders ORDER BY id").fetchall() == [(1, 1040.0), (2, 20.0)]
+    assert connection.execute("SELECT count(*) FROM orders WHERE created_at IS NULL").fetchone() == (0,)
+    assert connection.execute(
+        "SELECT id, order_count, total_spend, last_order_id FROM customers ORDER BY id"
+    ).fetchall() == [(1, 2, 1060.0, 2), (2, 0, 0.0, None)]
+    assert connection.execute("SELECT id, item_count FROM shop_item_categories ORDER BY id").fetchall() == [(1, 1), (2, 1)]
+    # Rebuilt tables keep their rows and never reuse IDs
+    assert connection.execute("SELECT count(*) FROM order_items").fetchone() == (3,)
+    connection.execute("DELETE FROM orders WHERE id = 2")
+    connection.execute("INSERT INTO orders (customer_id, total) VALUES (1, 0)")
+    assert connection.execute("SELECT max(id) FROM orders").fetchone() == (3,)
+    connection.close()
+
+def test_migrate_is_idempotent(database):
+    """Test that re-running migrations on a partly upgraded database is safe"""
+    path, engine = database
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    # A column added by hand before the migration that introduces it ran
+    connection.execute("ALTER TABLE shop_items ADD COLUMN stock INTEGER")
+    connection.commit()
+    connection.close()
+    
+    assert migrate(engine) == LATEST_VERSION
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+        connection.commit()
+    assert migrate(engine) == LATEST_VERSION
+    assert_matches_models(engine)
@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.negotiation import prefers_msgpack
+
+msgpack = pytest.importorskip("msgpack")
+
+MSGPACK = {"Accept": "application/msgpack"}
+
+def test_prefers_msgpack():
+    """Test Accept header negotiation between MessagePack and JSON"""
+    assert prefers_msgpack("application/msgpack")
+    assert prefers_msgpack("application/x-msgpack, application/json;q=0.5")
+    assert not prefers_msgpack("")
+    assert not prefers_msgpack("*/*")
+    assert not prefers_msgpack("application/json, application/msgpack")
+    assert not prefers_msgpack("application/json, application/msgpack;q=0.9")
+    assert not prefers_msgpack("application/msgpack;q=0")
+
+def test_msgpack_responses(client: TestClient):
+    """Test list and detail endpoints answering in MessagePack"""
+    customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    item_id = client.post("/items/", json={"title": "Book", "description": "A book", "price": 20.0, "category_ids": []}).json()["id"]
+    order_id = client.post("/orders/", json={"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 2}]}).json()["id"]
+
+    for path in ["/items/", f"/items/{item_id}", "/orders/", f"/orders/{order_id}", f"/customers/{customer_id}/orders"]:
+        json_response = client.get(path)
+        msgpack_response = client.get(path, headers=MSGPACK)
+        assert msgpack_response.status_code == 200
+        assert msgpack_response.headers["content-type"] == "application/msgpack"
+        assert msgpack_response.headers["vary"] == "Accept"
+        assert json_response.headers["content-type"] == "application/json"
+        assert msgpack.unpackb(msgpack_response.content) == json_response.json()
+
+def test_msgpack_errors_stay_json(client: TestClient):
+    """Test that error responses are not negotiated"""
+    response = client.get("/items/999", headers=MSGPACK)
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Item not found"}
+
+def test_msgpack_request_bodies(client: TestClient):
+    """Test bulk writes with MessagePack request bodies"""
+    customers = [{"name": "John", "surname": "Doe", "email": f"john{i}@example.com"} for i in range(3)]
+    response = client.post(
+        "/customers/bulk",
+        content=msgpack.packb(customers),
+        headers={"Content-Type": "application/msgpack", **MSGPACK}
+    )
+    assert response.status_code == 200
+    assert msgpack.unpackb(response.content)["created"] == 3
+
+    item_id = client.post("/items/", json={"title": "Book", "description": "A book", "price": 20.0, "category_ids": []}).json()["id"]
+    response = client.post(
+        "/items/bulk",
+        content=msgpack.packb({"item_ids": [item_id], "price_mode": "absolute", "price_value": 15}),
+        headers={"Content-Type": "application/msgpack"}
+    )
+    assert response.status_code == 200
+    assert response.json()["prices_updated"] == 1
+
+    # Validation errors are reported as for JSON bodies
+    response = client.post("/customers/bulk", content=msgpack.packb([{"name": "John"}]), headers={"Content-Type": "application/msgpack"})
+    assert response.status_code == 422
+
+    response = client.post("/customers/bulk", content=b"\xc1", headers={"Content-Type": "application/msgpack"})
+    assert response.status_code == 400
+
+def test_openapi_schema(client: TestClient):
+    """Test that negotiated routes still produce an OpenAPI schema"""
+    response = client.get("/openapi.json")
+    assert response.status_code == 200
+    assert "200" in response.json()["paths"]["/items/"]["get"]["responses"]
\ No newline at end of file
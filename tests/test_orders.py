@@ -1,6 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 from fastapi.testclient import TestClient
 
+from app import config
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
 def test_create_order_empty(client: TestClient):
     """Test creating an order with no items"""
     # First create a customer
@@ -73,7 +78,7 @@ def test_create_order_invalid_item(client: TestClient):
     assert response.status_code == 400
     assert "Shop item with ID 999 not found" in response.json()["detail"]
 
-def test_get_orders(client: TestClient):
+def test_get_orders(client: TestClient, query_budget):
     """Test getting all orders"""
     # Create customer
     customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
@@ -89,7 +94,8 @@ def test_get_orders(client: TestClient):
     for order in orders:
         client.post("/orders/", json=order)
     
-    response = client.get("/orders/")
+    with query_budget(5):
+        response = client.get("/orders/")
     assert response.status_code == 200
     data = response.json()
     assert len(data) == 2
@@ -212,4 +218,116 @@ def test_delete_order_not_found(client: TestClient):
     """Test deleting a non-existent order"""
     response = client.delete("/orders/999")
     assert response.status_code == 404
-    assert "Order not found" in response.json()["detail"]
\ No newline at end of file
+    assert "Order not found" in response.json()["detail"]
+
+def test_archive_orders(client: TestClient, monkeypatch):
+    """Test archiving old orders and reading them back"""
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    item_data = {"title": "Smartphone", "description": "Latest smartphone", "price": 599.99, "category_ids": []}
+    item_id = client.post("/items/", json=item_data).json()["id"]
+    
+    order_ids = []
+    for quantity in [1, 2, 3]:
+        order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": quantity}]}
+        order_ids.append(client.post("/orders/", json=order_data).json()["id"])
+    
+    response = client.post("/admin/orders/archive", params={"before": "2999-01-01T00:00:00", "batch_size": 2}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json()["archived"] == 3
+    
+    # Archived orders leave the hot tables but stay readable by ID
+    assert client.get("/orders/").json() == []
+    response = client.get(f"/orders/{order_ids[1]}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["id"] == order_ids[1]
+    assert data["customer"]["id"] == customer_id
+    assert data["items"][0]["quantity"] == 2
+    assert data["items"][0]["shop_item"]["id"] == item_id
+    
+    # New orders never reuse archived IDs
+    new_order = client.post("/orders/", json={"customer_id": customer_id, "items": []}).json()
+    assert new_order["id"] > max(order_ids)
+
+def test_archive_orders_keeps_recent(client: TestClient, monkeypatch):
+    """Test that orders newer than the cutoff stay in the hot tables"""
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    client.post("/orders/", json={"customer_id": customer_id, "items": []})
+    
+    response = client.post("/admin/orders/archive", params={"before": "2000-01-01T00:00:00"}, headers=ADMIN_HEADERS)
+    assert response.json()["archived"] == 0
+    assert len(client.get("/orders/").json()) == 1
+
+def _create_stocked_item(client: TestClient, title: str, stock: int):
+    item_data = {"title": title, "description": title, "price": 10.0, "stock": stock, "category_ids": []}
+    return client.post("/items/", json=item_data).json()["id"]
+
+def test_create_order_reserves_stock(client: TestClient):
+    """Test that orders take stock and are rejected when it runs out"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    phone_id = _create_stocked_item(client, "Smartphone", 5)
+    case_id = _create_stocked_item(client, "Case", 1)
+    
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": phone_id, "quantity": 2}, {"shop_item_id": phone_id, "quantity": 1}]}
+    assert client.post("/orders/", json=order_data).status_code == 200
+    assert client.get(f"/items/{phone_id}").json()["stock"] == 2
+    
+    # One short line rejects the whole order and reserves nothing
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": phone_id, "quantity": 1}, {"shop_item_id": case_id, "quantity": 2}]}
+    response = client.post("/orders/", json=order_data)
+    assert response.status_code == 409
+    assert "Insufficient stock" in response.json()["detail"]
+    assert client.get(f"/items/{phone_id}").json()["stock"] == 2
+    assert client.get(f"/items/{case_id}").json()["stock"] == 1
+    assert len(client.get("/orders/").json()) == 1
+
+def test_update_and_delete_order_release_stock(client: TestClient):
+    """Test that changing or deleting an order gives its stock back"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    item_id = _create_stocked_item(client, "Smartphone", 3)
+    
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 2}]}
+    order_id = client.post("/orders/", json=order_data).json()["id"]
+    
+    response = client.put(f"/orders/{order_id}", json={"items": [{"shop_item_id": item_id, "quantity": 3}]})
+    assert response.status_code == 200
+    assert client.get(f"/items/{item_id}").json()["stock"] == 0
+    
+    response = client.put(f"/orders/{order_id}", json={"items": [{"shop_item_id": item_id, "quantity": 4}]})
+    assert response.status_code == 409
+    assert client.get(f"/orders/{order_id}").json()["items"][0]["quantity"] == 3
+    
+    client.delete(f"/orders/{order_id}")
+    assert client.get(f"/items/{item_id}").json()["stock"] == 3
+
+def test_create_order_invalid_quantity(client: TestClient):
+    """Test creating an order with a non-positive quantity"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    item_id = _create_stocked_item(client, "Smartphone", 3)
+    
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": -1}]}
+    response = client.post("/orders/", json=order_data)
+    assert response.status_code == 400
+    assert client.get(f"/items/{item_id}").json()["stock"] == 3
+
+def test_concurrent_orders_do_not_oversell(client: TestClient):
+    """Test that concurrent orders for one hot item never oversell it"""
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    item_id = _create_stocked_item(client, "Smartphone", 10)
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]}
+    
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(lambda _: client.post("/orders/", json=order_data).status_code, range(30)))
+    
+    assert statuses.count(200) == 10
+    assert statuses.count(409) == 20
+    assert client.get(f"/items/{item_id}").json()["stock"] == 0
+    assert len(client.get("/orders/").json()) == 10
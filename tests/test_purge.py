@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app import config
+from app.archive import archive_orders
+from app.jobs import WorkerPool
+from app.models.models import ItemCoPurchase, ShopItem, ShopItemCategory, shop_item_category_association
+from tests.conftest import TestingSessionLocal
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+def _create_category(client: TestClient, title: str = "Electronics"):
+    return client.post("/categories/", json={"title": title, "description": title}).json()["id"]
+
+def _create_item(client: TestClient, title: str, category_ids=(), price: float = 10.0):
+    item_data = {"title": title, "description": title, "price": price, "category_ids": list(category_ids)}
+    return client.post("/items/", json=item_data).json()["id"]
+
+def _count(*criteria, table=shop_item_category_association):
+    with TestingSessionLocal() as db:
+        return db.execute(select(func.count()).select_from(table).where(*criteria)).scalar()
+
+def _row_exists(model, id: int) -> bool:
+    with TestingSessionLocal() as db:
+        return db.get(model, id) is not None
+
+def test_delete_item_hides_it_until_purged(client: TestClient, run_jobs):
+    """Test that a deleted item disappears from reads at once and its rows go with the purge"""
+    category_id = _create_category(client)
+    item_id = _create_item(client, "Smartphone", [category_id])
+    other_id = _create_item(client, "Case", [category_id])
+
+    assert client.delete(f"/items/{item_id}").status_code == 200
+    assert client.get(f"/items/{item_id}").status_code == 404
+    assert client.put(f"/items/{item_id}", json={"price": 5.0}).status_code == 404
+    assert client.delete(f"/items/{item_id}").status_code == 404
+    assert [item["id"] for item in client.get("/items/").json()] == [other_id]
+    assert [item["id"] for item in client.get(f"/categories/{category_id}/items").json()] == [other_id]
+    assert client.get(f"/categories/{category_id}").json()["item_count"] == 1
+    assert client.get("/items/", params={"include": "total"}).json()["total"] == 1
+
+    # Marked, not removed, until the purge job runs
+    assert _row_exists(ShopItem, item_id)
+    assert _count(shop_item_category_association.c.shop_item_id == item_id) == 1
+    run_jobs()
+    assert not _row_exists(ShopItem, item_id)
+    assert _count(shop_item_category_association.c.shop_item_id == item_id) == 0
+    assert client.get(f"/categories/{category_id}").json()["item_count"] == 1
+
+def test_ordered_item_is_kept_for_order_history(client: TestClient, run_jobs):
+    """Test that purging an ordered item removes its links and scores but keeps the row orders refer to"""
+    category_id = _create_category(client)
+    item_id = _create_item(client, "Smartphone", [category_id])
+    other_id = _create_item(client, "Case")
+    customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}, {"shop_item_id": other_id, "quantity": 1}]}
+    order_id = client.post("/orders/", json=order_data).json()["id"]
+    run_jobs()
+    assert _count(table=ItemCoPurchase.__table__) == 2
+
+    client.delete(f"/items/{item_id}")
+    assert client.get(f"/items/{other_id}/related").json() == []
+    run_jobs()
+    assert _count(table=ItemCoPurchase.__table__) == 0
+    assert _count(shop_item_category_association.c.shop_item_id == item_id) == 0
+    assert _row_exists(ShopItem, item_id)
+
+    order = client.get(f"/orders/{order_id}").json()
+    assert order["items"][0]["shop_item"]["title"] == "Smartphone"
+    assert order["items"][0]["shop_item"]["categories"] == []
+    # Deleted items cannot be ordered again
+    assert client.post("/orders/", json=order_data).status_code == 400
+
+def test_item_on_archived_orders_is_kept(client: TestClient, run_jobs):
+    """Test that purging an item only archived orders refer to keeps the row as well"""
+    item_id = _create_item(client, "Smartphone")
+    customer_id = client.post("/customers/", json={"name": "John", "surname": "Doe", "email": "john.doe@example.com"}).json()["id"]
+    order_id = client.post("/orders/", json={"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]}).json()["id"]
+    with TestingSessionLocal() as db:
+        assert archive_orders(db, datetime.utcnow() + timedelta(days=1)) == 1
+
+    client.delete(f"/items/{item_id}")
+    run_jobs()
+    assert _row_exists(ShopItem, item_id)
+    assert client.get(f"/orders/{order_id}").json()["items"][0]["shop_item"]["title"] == "Smartphone"
+
+def test_delete_category_hides_it_until_purged(client: TestClient, run_jobs):
+    """Test that a deleted category drops out of categories, items, filters and the snapshot at once"""
+    category_id = _create_category(client)
+    books_id = _create_category(client, "Books")
+    item_id = _create_item(client, "E-reader", [category_id, books_id])
+
+    assert client.delete(f"/categories/{category_id}").status_code == 200
+    assert client.get(f"/categories/{category_id}").status_code == 404
+    assert [category["id"] for category in client.get("/categories/").json()] == [books_id]
+    assert [category["id"] for category in client.get(f"/items/{item_id}").json()["categories"]] == [books_id]
+    assert client.get("/items/", params={"category_id": category_id}).json() == []
+    assert [category["category_id"] for category in client.get("/items/", params={"include": "facets"}).json()["facets"]["categories"]] == [books_id]
+    snapshot = client.get("/catalog/snapshot").json()
+    assert [category["id"] for category in snapshot["categories"]] == [books_id]
+    assert snapshot["items"][0]["category_ids"] == [books_id]
+    # It can no longer be assigned
+    assert client.put(f"/items/{item_id}", json={"category_ids": [category_id]}).status_code == 400
+
+    assert _count(shop_item_category_association.c.category_id == category_id) == 1
+    run_jobs()
+    assert _count(shop_item_category_association.c.category_id == category_id) == 0
+    assert not _row_exists(ShopItemCategory, category_id)
+    assert [category["id"] for category in client.get(f"/items/{item_id}").json()["categories"]] == [books_id]
+
+def test_delete_category_with_catalog_engine(client: TestClient, monkeypatch):
+    """Test that the columnar snapshot stops matching a deleted category"""
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(config, "CATALOG_ENGINE", True)
+    category_id = _create_category(client)
+    item_id = _create_item(client, "Smartphone", [category_id])
+    assert [item["id"] for item in client.get("/items/", params={"category_id": category_id}).json()] == [item_id]
+
+    client.delete(f"/categories/{category_id}")
+    assert client.get("/items/", params={"category_id": category_id}).json() == []
+    assert [item["id"] for item in client.get("/items/").json()] == [item_id]
+
+def test_purge_runs_in_chunks_with_progress(client: TestClient, monkeypatch):
+    """Test that a large purge runs as several small jobs and reports its progress"""
+    monkeypatch.setattr(config, "PURGE_CHUNK_SIZE", 2)
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    category_id = _create_category(client)
+    for n in range(5):
+        _create_item(client, f"Item {n}", [category_id])
+
+    assert client.delete(f"/categories/{category_id}").status_code == 200
+    progress = client.get("/admin/purges", headers=ADMIN_HEADERS).json()["purges"]
+    assert progress == [{"entity": "category", "id": category_id, "rows_removed": 0, "chunks": 0, "status": "pending", "attempts": 0, "last_error": None}]
+
+    # One chunk per job, each in its own transaction
+    pool = WorkerPool(TestingSessionLocal, workers=0)
+    assert pool.run_once() == 1
+    assert _count(shop_item_category_association.c.category_id == category_id) == 3
+    progress = client.get("/admin/purges", headers=ADMIN_HEADERS).json()["purges"]
+    assert [(purge["rows_removed"], purge["chunks"]) for purge in progress] == [(2, 1)]
+
+    while pool.run_once():
+        pass
+    assert _count(shop_item_category_association.c.category_id == category_id) == 0
+    assert not _row_exists(ShopItemCategory, category_id)
+    assert client.get("/admin/purges", headers=ADMIN_HEADERS).json()["purges"] == []
+    assert len(client.get("/items/").json()) == 5
+
+def test_delete_category_query_budget(client: TestClient, query_budget):
+    """Test that deleting a category costs the same few statements however many items it has"""
+    category_id = _create_category(client)
+    for n in range(50):
+        _create_item(client, f"Item {n}", [category_id])
+
+    with query_budget(8):
+        assert client.delete(f"/categories/{category_id}").status_code == 200
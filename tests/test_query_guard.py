@@ -0,0 +1,63 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import query_guard
+from app.models.models import Order as OrderModel
+from app.query_guard import QueryGuardMiddleware, QueryBudgetExceeded
+from tests.conftest import TestingSessionLocal
+
+def _create_orders(client: TestClient, count: int):
+    customer_data = {"name": "John", "surname": "Doe", "email": "john.doe@example.com"}
+    customer_id = client.post("/customers/", json=customer_data).json()["id"]
+    category_id = client.post("/categories/", json={"title": "Electronics", "description": "Electronic devices"}).json()["id"]
+    item_ids = []
+    for index in range(count):
+        item_data = {"title": f"Item {index}", "description": "Item", "price": 10.0, "category_ids": [category_id]}
+        item_ids.append(client.post("/items/", json=item_data).json()["id"])
+    for item_id in item_ids:
+        order_data = {"customer_id": customer_id, "items": [{"shop_item_id": item_id, "quantity": 1}]}
+        client.post("/orders/", json=order_data)
+    return customer_id
+
+def test_list_endpoints_query_count_is_constant(client: TestClient, query_budget):
+    """Test that list endpoints load nested data without per-row queries"""
+    customer_id = _create_orders(client, 8)
+    
+    with query_budget(5):
+        assert len(client.get("/orders/").json()) == 8
+    with query_budget(6):
+        assert len(client.get(f"/customers/{customer_id}/orders").json()) == 8
+    with query_budget(2):
+        assert len(client.get("/items/").json()) == 8
+
+def test_route_budget_exceeded(client: TestClient, monkeypatch):
+    """Test that a route over its statement budget fails in test mode"""
+    monkeypatch.setitem(query_guard.ROUTE_QUERY_BUDGETS, "read_orders", 0)
+    with pytest.raises(QueryBudgetExceeded, match="budget of 0"):
+        client.get("/orders/")
+
+def test_query_budget_fixture_fails(client: TestClient, query_budget):
+    """Test that the query_budget fixture catches requests over budget"""
+    with pytest.raises(AssertionError, match="budget is 0"):
+        with query_budget(0):
+            client.get("/orders/")
+
+def test_n_plus_one_detected(client: TestClient):
+    """Test that repeated lazy loads of one relationship are reported"""
+    _create_orders(client, 6)
+    
+    lazy_app = FastAPI()
+    lazy_app.add_middleware(QueryGuardMiddleware)
+    
+    @lazy_app.get("/lazy-orders")
+    def lazy_orders():
+        db = TestingSessionLocal()
+        try:
+            return [len(order.items) for order in db.query(OrderModel).all()]
+        finally:
+            db.close()
+    
+    with TestClient(lazy_app) as lazy_client:
+        with pytest.raises(QueryBudgetExceeded, match=r"Order.items lazy-loaded 6 times \(N\+1\)"):
+            lazy_client.get("/lazy-orders")
\ No newline at end of file